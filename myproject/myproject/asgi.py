@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.PRECALENTAR_AL_INICIAR:
+    from usuarios.arranque import precalentar  # noqa: E402
+    # en ASGI las vistas sync corren en otro hilo: abrir la conexión en este no sirve
+    precalentar(conexiones=False)
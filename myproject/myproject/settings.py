@@ -11,13 +11,14 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 import os #Asegúrate de tener este import
 from pathlib import Path
-from dotenv import load_dotenv
 from datetime import timedelta
-import os
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 # CARGAR EL ARCHIVO .ENV
-load_dotenv(BASE_DIR / '.env')
+# en los contenedores las variables ya vienen del entorno: sin .env no se importa dotenv
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 
@@ -36,6 +37,13 @@ ALLOWED_HOSTS = []
 
 
 AUTH_USER_MODEL = "usuarios.Usuario"
+
+# igual que ModelBackend pero con los permisos cacheados entre requests
+AUTHENTICATION_BACKENDS = [
+    'usuarios.backends.PermisosCacheBackend',
+]
+# los permisos solo se cachean entre requests con una caché compartida, ver usuarios/permisos.py
+PERMISOS_CACHE_TIMEOUT = 3600
 # Application definition
 
 INSTALLED_APPS = [
@@ -53,6 +61,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'usuarios.middleware.PerfilMemoriaMiddleware',
+    'usuarios.middleware.ConsultasLentasMiddleware',
+    # el resto depende de la ruta, ver MIDDLEWARE_POR_RUTA
+    'usuarios.middleware.MiddlewarePorRuta',
+]
+
+# pila completa: admin y cualquier ruta que no sea de la API
+MIDDLEWARE_POR_DEFECTO = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,6 +77,51 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# /api/ solo usa JWT: sin sesión, CSRF, auth de Django ni mensajes
+MIDDLEWARE_POR_RUTA = [
+    ('/api/', [
+        'django.middleware.common.CommonMiddleware',
+    ]),
+]
+
+# perfil de memoria con tracemalloc; desactivado no agrega overhead
+PERFIL_MEMORIA = {
+    'ACTIVO': os.getenv('PERFIL_MEMORIA') == 'True',
+    'MUESTREO': float(os.getenv('PERFIL_MEMORIA_MUESTREO', '0.01')),
+    'DIRECTORIO': os.getenv('PERFIL_MEMORIA_DIRECTORIO'),
+    'MAX_SNAPSHOTS': int(os.getenv('PERFIL_MEMORIA_MAX_SNAPSHOTS', '20')),
+}
+
+# log de consultas lentas con EXPLAIN, ver usuarios/consultas_lentas.py
+CONSULTAS_LENTAS = {
+    'ACTIVO': os.getenv('CONSULTAS_LENTAS') == 'True',
+    'UMBRAL_MS': float(os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', '100')),
+}
+
+# cálculos compartidos coalescidos con caché corta, ver usuarios/coalescencia.py
+COALESCENCIA = {
+    'ACTIVO': os.getenv('COALESCENCIA', 'True') == 'True',
+    'TTL_S': float(os.getenv('COALESCENCIA_TTL_S', '1')),
+    'OBSOLETO_S': float(os.getenv('COALESCENCIA_OBSOLETO_S', '5')),
+}
+
+# índices de autocompletado en memoria, ver usuarios/autocompletado.py
+AUTOCOMPLETADO = {
+    # se reconstruyen desde la BD: ven lo que escribieron otros workers y los bulk
+    'TTL_S': float(os.getenv('AUTOCOMPLETADO_TTL_S', '60')),
+}
+
+# feed de cambios, ver usuarios/cambios.py
+CAMBIOS = {
+    # solo fuera de Postgres, que ordena el feed por transacción
+    'MARGEN_S': 5,
+    'RETENCION_DIAS': 30,
+}
+
+# el admin revisa que sesión, auth y mensajes estén en MIDDLEWARE; están en
+# MIDDLEWARE_POR_DEFECTO, que es la pila que corre para /admin/
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
@@ -92,8 +153,45 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD"),
         'HOST': os.getenv("DB_HOST"),
         'PORT': os.getenv("DB_PORT"),
+        # conexiones persistentes solo con WSGI, donde cada worker atiende en el mismo
+        # hilo: wsgi.py pone 60 por defecto. En ASGI cada request corre en otro hilo
+        # y una conexión persistente por hilo no se reutiliza ni se cierra a tiempo
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+
+# shards de usuarios además de default, ver usuarios/sharding.py. Con
+# DB_SHARDS=shard1,shard2 cada alias toma DB_SHARD1_NAME, DB_SHARD1_HOST, etc.;
+# lo que no se defina sale de default.
+for _alias in [a.strip() for a in os.getenv('DB_SHARDS', '').split(',') if a.strip()]:
+    _prefijo = f'DB_{_alias.upper()}_'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        **{clave: os.environ[_prefijo + clave] for clave in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+           if _prefijo + clave in os.environ},
+    }
+
+SHARDING = {
+    'ACTIVO': os.getenv('SHARDING') == 'True',
+    'SHARDS': list(DATABASES),
+    # lo escribe rebalancear_shards; mientras exista manda sobre SHARDS
+    'MAPA': os.getenv('SHARDING_MAPA', os.path.join(BASE_DIR, 'shards.json')),
+}
+DATABASE_ROUTERS = ['usuarios.routers.ShardRouter']
+
+# caché compartida entre workers; sin REDIS_URL cada proceso usa su LocMemCache
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# cargar URLs/vistas y hashers al importar wsgi/asgi, ver usuarios/arranque.py. Las
+# conexiones no se abren aquí: se abren por worker con arranque.post_worker_init
+PRECALENTAR_AL_INICIAR = os.getenv('PRECALENTAR_AL_INICIAR') == 'True'
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -112,6 +210,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashers: el primero es el preferido. Sus iteraciones salen de
+# `python manage.py calibrar_hash`, que escribe PASSWORD_HASHER_CONFIG.
+PASSWORD_HASHERS = [
+    'usuarios.hashers.PBKDF2CalibradoPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHER_CONFIG = os.getenv('PASSWORD_HASHER_CONFIG', os.path.join(BASE_DIR, 'hasher_config.json'))
+
+# en login, rehashear contraseñas desactualizadas sin bloquear la respuesta
+REHASH_EN_SEGUNDO_PLANO = True
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -172,6 +285,8 @@ LOGGING = {
             "class": "logging.FileHandler",
             "filename": os.path.join(BASE_DIR, "api.log"),
             "formatter": "verbose",
+            # el archivo se abre con el primer log, no al configurar logging
+            "delay": True,
         },
     },
     "loggers": {
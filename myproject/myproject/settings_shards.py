@@ -0,0 +1,29 @@
+"""
+Settings para probar el sharding en local con tres bases SQLite.
+
+Uso:
+    python manage.py migrate --settings=myproject.settings_shards
+    python manage.py migrate --database=shard1 --settings=myproject.settings_shards
+    python manage.py migrate --database=shard2 --settings=myproject.settings_shards
+    SHARDING=True python manage.py runserver --settings=myproject.settings_shards
+    python manage.py test usuarios --settings=myproject.settings_shards
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, SECRET_KEY, SHARDING, os
+
+SECRET_KEY = SECRET_KEY or 'solo-para-pruebas-locales-no-usar-en-produccion'
+
+DATABASES = {
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{alias}.sqlite3',
+    }
+    for alias in ('default', 'shard1', 'shard2')
+}
+
+SHARDING = {
+    **SHARDING,
+    'SHARDS': list(DATABASES),
+    'MAPA': os.path.join(BASE_DIR, 'shards-local.json'),
+}
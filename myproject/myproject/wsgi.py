@@ -12,5 +12,14 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# conexiones persistentes: el worker no reconecta en cada request (ver settings.py)
+os.environ.setdefault('DB_CONN_MAX_AGE', '60')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.PRECALENTAR_AL_INICIAR:
+    from usuarios.arranque import precalentar  # noqa: E402
+    # sin conexiones: esto puede correr en el maestro (--preload), ver usuarios/arranque.py
+    precalentar(conexiones=False)
@@ -1,3 +1,149 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import Usuario, PerfilUniversitario, PerfilSecundaria, Universidad, Carrera, Instituto, Curso
+from .periodos import avanzar_periodo
+from . import cambios
+
+# desde aquí el COUNT(*) exacto es lento y se usa la estimación de Postgres
+UMBRAL_CONTEO_ESTIMADO = 100_000
+CHUNK_ACCIONES = 1000
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginador que evita ``COUNT(*)`` sobre tablas grandes sin filtros.
+
+    En Postgres usa ``pg_class.reltuples``; con filtros, tablas chicas u
+    otros motores cuenta de forma exacta.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimado = self.conteo_estimado()
+            if estimado is not None and estimado > UMBRAL_CONTEO_ESTIMADO:
+                return estimado
+        return super().count
+
+    def conteo_estimado(self):
+        modelo = self.object_list.model
+        conexion = connections[self.object_list.db]
+        if conexion.vendor != 'postgresql':
+            return None
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [modelo._meta.db_table],
+            )
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+
+class AdminEscalable(admin.ModelAdmin):
+    paginator = ConteoEstimadoPaginator
+    # evita el segundo COUNT(*) sin filtros del changelist
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_actions(self, request):
+        # delete_selected arma la página de confirmación con todos los objetos
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+def actualizar_por_chunks(queryset, **valores) -> int:
+    """UPDATE en bloques de ids para no bloquear la tabla en una sola sentencia."""
+    total = 0
+    ultimo_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=ultimo_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_ACCIONES]
+        )
+        if not ids:
+            return total
+        # con sharding el queryset es de un shard: update y cambios van a esa misma BD
+        with transaction.atomic(using=queryset.db):
+            total += queryset.model.objects.using(queryset.db).filter(pk__in=ids).update(**valores)
+            cambios.registrar(queryset.model, ids, using=queryset.db)
+        ultimo_pk = ids[-1]
+
+
+@admin.action(description="Activar usuarios seleccionados")
+def activar_usuarios(modeladmin, request, queryset):
+    total = actualizar_por_chunks(queryset, is_active=True)
+    modeladmin.message_user(request, f"{total} usuarios activados.", messages.SUCCESS)
+
+
+@admin.action(description="Desactivar usuarios seleccionados")
+def desactivar_usuarios(modeladmin, request, queryset):
+    total = actualizar_por_chunks(queryset, is_active=False)
+    modeladmin.message_user(request, f"{total} usuarios desactivados.", messages.SUCCESS)
+
+
+@admin.action(description="Avanzar un periodo a los perfiles seleccionados")
+def avanzar_periodo_action(modeladmin, request, queryset):
+    resultado = avanzar_periodo(queryset.model, queryset=queryset)
+    modeladmin.message_user(
+        request,
+        f"{resultado['avanzados']} perfiles avanzados, {resultado['finalizados']} finalizados.",
+        messages.SUCCESS,
+    )
+
+
+@admin.register(Usuario)
+class UsuarioAdmin(AdminEscalable):
+    list_display = ['email', 'nombre', 'apellido', 'tipo_estudiante', 'genero', 'perfil', 'is_active', 'is_staff']
+    list_select_related = ['perfil_universitario__universidad', 'perfil_secundaria__instituto']
+    list_filter = ['tipo_estudiante', 'genero', 'is_active']
+    # solo email: buscar por nombre o apellido recorre toda la tabla
+    search_fields = ['^email']
+    ordering = ['-id']
+    readonly_fields = ['password', 'last_login']
+    filter_horizontal = ['groups', 'user_permissions']
+    actions = [activar_usuarios, desactivar_usuarios]
+
+    def has_add_permission(self, request):
+        # sin formulario de contraseña crearía usuarios sin password usable:
+        # se dan de alta con registro/ o createsuperuser
+        return False
+
+    @admin.display(description="Perfil")
+    def perfil(self, obj):
+        # con list_select_related un perfil ausente no hace otra consulta
+        if hasattr(obj, 'perfil_universitario'):
+            return obj.perfil_universitario.universidad
+        if hasattr(obj, 'perfil_secundaria'):
+            return obj.perfil_secundaria.instituto
+        return "-"
+
+
+@admin.register(PerfilUniversitario)
+class PerfilUniversitarioAdmin(AdminEscalable):
+    list_display = ['usuario', 'universidad', 'carrera', 'semestre_actual', 'total_semestres', 'finalizado']
+    list_select_related = ['usuario', 'universidad', 'carrera']
+    list_filter = ['finalizado']
+    autocomplete_fields = ['usuario', 'universidad', 'carrera']
+    ordering = ['-id']
+    actions = [avanzar_periodo_action]
+
+
+@admin.register(PerfilSecundaria)
+class PerfilSecundariaAdmin(AdminEscalable):
+    list_display = ['usuario', 'instituto', 'curso', 'periodo_actual', 'total_de_periodos', 'finalizado']
+    list_select_related = ['usuario', 'instituto', 'curso']
+    list_filter = ['finalizado']
+    autocomplete_fields = ['usuario', 'instituto', 'curso']
+    ordering = ['-id']
+    actions = [avanzar_periodo_action]
+
+
+@admin.register(Universidad, Carrera, Instituto, Curso)
+class CatalogoAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'clave']
+    search_fields = ['nombre']
+    ordering = ['nombre']
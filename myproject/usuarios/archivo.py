@@ -0,0 +1,284 @@
+"""
+Archivo y restauración de usuarios inactivos.
+
+Los usuarios con ``is_active=False`` y sus perfiles se escriben a un archivo
+NDJSON comprimido con gzip (una línea por usuario) y luego se borran por
+bloques, cada bloque en su propia transacción corta.
+
+Cada bloque es un miembro gzip completo y el orden es: escribir el miembro,
+cerrarlo, sincronizar a disco, borrar. Si el proceso se corta a mitad de un
+miembro, ese bloque todavía no se borró: la siguiente corrida recorta la cola
+incompleta antes de agregar y vuelve a archivarlo, y restaurar se detiene en
+ella sin perder los bloques anteriores. Restaurar ignora los usuarios que ya
+existen, así que las líneas repetidas no hacen daño.
+
+Con sharding se archiva un shard por vez (``queryset`` de ese shard) y cada
+usuario se restaura en el shard que le corresponde por id.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import cambios, catalogos, sharding
+from .models import Usuario, PerfilUniversitario, PerfilSecundaria
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+# bytes comprimidos por lectura al buscar el final del último miembro gzip
+LECTURA = 64 * 1024
+
+# perfil -> (nombre en el archivo, campos FK a catálogos)
+PERFILES = {
+    PerfilUniversitario: ('perfil_universitario', ['universidad', 'carrera']),
+    PerfilSecundaria: ('perfil_secundaria', ['instituto', 'curso']),
+}
+
+
+def _campos(modelo) -> list:
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _serializar_perfil(perfil, campos_catalogo) -> dict:
+    datos = {attname: getattr(perfil, attname) for attname in _campos(type(perfil))}
+    # los catálogos se guardan por nombre: los ids podrían no existir al restaurar
+    for campo in campos_catalogo:
+        del datos[f'{campo}_id']
+        datos[campo] = getattr(perfil, campo).nombre
+    return datos
+
+
+def _lineas_bloque(usuarios, db: str) -> list:
+    ids = [usuario.pk for usuario in usuarios]
+    grupos, permisos = {}, {}
+    for usuario_id, grupo_id in Usuario.groups.through.objects.using(db).filter(
+            usuario_id__in=ids).values_list('usuario_id', 'group_id'):
+        grupos.setdefault(usuario_id, []).append(grupo_id)
+    for usuario_id, permiso_id in Usuario.user_permissions.through.objects.using(db).filter(
+            usuario_id__in=ids).values_list('usuario_id', 'permission_id'):
+        permisos.setdefault(usuario_id, []).append(permiso_id)
+
+    lineas = []
+    for usuario in usuarios:
+        registro = {
+            'usuario': {attname: getattr(usuario, attname) for attname in _campos(Usuario)},
+            'grupos': grupos.get(usuario.pk, []),
+            'permisos': permisos.get(usuario.pk, []),
+        }
+        for nombre, campos_catalogo in PERFILES.values():
+            perfil = getattr(usuario, nombre, None)
+            if perfil is not None:
+                registro[nombre] = _serializar_perfil(perfil, campos_catalogo)
+        lineas.append(json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+    return lineas
+
+
+def _fin_ultimo_miembro(ruta: str) -> int:
+    """Offset donde termina el último miembro gzip completo de ``ruta``."""
+    fin = posicion = 0
+    descompresor = zlib.decompressobj(wbits=31)
+    with open(ruta, 'rb') as archivo:
+        while trozo := archivo.read(LECTURA):
+            while trozo:
+                try:
+                    descompresor.decompress(trozo)
+                except zlib.error:
+                    return fin
+                if not descompresor.eof:
+                    posicion += len(trozo)
+                    break
+                posicion += len(trozo) - len(descompresor.unused_data)
+                fin = posicion
+                trozo = descompresor.unused_data
+                descompresor = zlib.decompressobj(wbits=31)
+    return fin
+
+
+def _recortar_cola(ruta: str) -> None:
+    """Quita un miembro incompleto al final, que dejaría ilegible lo que se agregue después."""
+    if not os.path.exists(ruta):
+        return
+    fin = _fin_ultimo_miembro(ruta)
+    if fin < os.path.getsize(ruta):
+        logger.warning("Se descartan %s bytes incompletos al final de %s", os.path.getsize(ruta) - fin, ruta)
+        with open(ruta, 'r+b') as archivo:
+            archivo.truncate(fin)
+
+
+def _borrar_bloque(ids, db: str) -> None:
+    with cambios.borrado_en_bloque():
+        # se vuelve a exigir is_active=False por si lo reactivaron mientras tanto
+        ids = list(
+            Usuario.objects.using(db).select_for_update().filter(pk__in=ids, is_active=False)
+            .values_list('pk', flat=True)
+        )
+        perfiles = {
+            modelo: list(modelo.objects.using(db).filter(usuario_id__in=ids).values_list('pk', flat=True))
+            for modelo in PERFILES
+        }
+        Usuario.objects.using(db).filter(pk__in=ids).delete()
+        cambios.registrar(Usuario, ids, operacion='D', using=db)
+        for modelo, ids_perfiles in perfiles.items():
+            cambios.registrar(modelo, ids_perfiles, operacion='D', using=db)
+
+
+def archivar_inactivos(ruta: str, queryset=None, chunk_size: int = CHUNK_SIZE,
+                       filas_por_segundo: float = None, dry_run: bool = False,
+                       al_terminar_chunk=None) -> int:
+    """
+    Archiva y borra los usuarios inactivos por bloques.
+
+    Args:
+        ruta: Archivo ``.ndjson.gz`` de salida; si existe se agrega al final.
+        queryset: Usuarios candidatos (por defecto todos los de ``default``). Solo se toman los inactivos.
+        chunk_size: Usuarios por bloque/transacción.
+        filas_por_segundo: Límite de velocidad; ``None`` sin límite.
+        dry_run: Solo cuenta, no escribe ni borra.
+        al_terminar_chunk: Callback con la cantidad acumulada de archivados.
+
+    Returns:
+        int: Cantidad de usuarios archivados.
+    """
+    if queryset is None:
+        queryset = Usuario.objects.all()
+    inactivos = queryset.filter(is_active=False)
+    if dry_run:
+        return inactivos.count()
+
+    select_related = [
+        f'{nombre}__{campo}'
+        for nombre, campos_catalogo in PERFILES.values()
+        for campo in campos_catalogo
+    ]
+
+    _recortar_cola(ruta)
+    total = 0
+    ultimo_pk = 0
+    with open(ruta, 'ab') as crudo:
+        while True:
+            inicio = time.monotonic()
+            usuarios = list(
+                inactivos.filter(pk__gt=ultimo_pk).order_by('pk').select_related(*select_related)[:chunk_size]
+            )
+            if not usuarios:
+                break
+
+            # un miembro por bloque: cerrado (con su trailer) y en disco antes de borrarlo
+            with gzip.GzipFile(fileobj=crudo, mode='ab') as comprimido:
+                comprimido.write(''.join(_lineas_bloque(usuarios, inactivos.db)).encode('utf-8'))
+            crudo.flush()
+            os.fsync(crudo.fileno())
+
+            ids = [usuario.pk for usuario in usuarios]
+            with transaction.atomic(using=inactivos.db):
+                _borrar_bloque(ids, inactivos.db)
+
+            total += len(usuarios)
+            ultimo_pk = ids[-1]
+            if al_terminar_chunk:
+                al_terminar_chunk(total)
+            if filas_por_segundo:
+                espera = len(usuarios) / filas_por_segundo - (time.monotonic() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+    return total
+
+
+def _restaurar_bloque(registros, db: str = 'default') -> dict:
+    ids = [registro['usuario']['id'] for registro in registros]
+    emails = [registro['usuario']['email'] for registro in registros]
+    existentes = set(Usuario.objects.using(db).filter(pk__in=ids).values_list('pk', flat=True))
+    # el email es único entre todos los shards
+    emails_tomados = set()
+    for alias in sharding.shards():
+        emails_tomados.update(
+            Usuario.objects.using(alias).filter(email__in=emails).exclude(pk__in=ids).values_list('email', flat=True)
+        )
+
+    usuarios, grupos, permisos = [], [], []
+    perfiles = {modelo: [] for modelo in PERFILES}
+    vistos = set()
+    resultado = {'restaurados': 0, 'existentes': 0, 'conflictos': 0}
+    for registro in registros:
+        datos = registro['usuario']
+        if datos['id'] in existentes or datos['id'] in vistos:
+            resultado['existentes'] += 1
+            continue
+        if datos['email'] in emails_tomados:
+            # otro usuario se registró con ese email después de archivar
+            resultado['conflictos'] += 1
+            continue
+        vistos.add(datos['id'])
+        usuarios.append(Usuario(**datos))
+        grupos += [Usuario.groups.through(usuario_id=datos['id'], group_id=g) for g in registro['grupos']]
+        permisos += [
+            Usuario.user_permissions.through(usuario_id=datos['id'], permission_id=p)
+            for p in registro['permisos']
+        ]
+        for modelo, (nombre, campos_catalogo) in PERFILES.items():
+            datos_perfil = registro.get(nombre)
+            if datos_perfil is None:
+                continue
+            datos_perfil = dict(datos_perfil)
+            if sharding.activo():
+                # el archivo puede venir de antes del sharding: id global nuevo en lugar del viejo
+                datos_perfil['id'] = sharding.nuevo_id_perfil(modelo)
+            for campo in campos_catalogo:
+                relacionado = modelo._meta.get_field(campo).related_model
+                datos_perfil[campo] = catalogos.resolver(relacionado, datos_perfil[campo])
+            perfiles[modelo].append(modelo(**datos_perfil))
+
+    with transaction.atomic(using=db):
+        Usuario.objects.using(db).bulk_create(usuarios)
+        cambios.registrar(Usuario, [usuario.pk for usuario in usuarios], using=db)
+        for modelo, filas in perfiles.items():
+            modelo.objects.using(db).bulk_create(filas)
+            cambios.registrar(modelo, [perfil.pk for perfil in filas], using=db)
+        Usuario.groups.through.objects.using(db).bulk_create(grupos, ignore_conflicts=True)
+        Usuario.user_permissions.through.objects.using(db).bulk_create(permisos, ignore_conflicts=True)
+    resultado['restaurados'] = len(usuarios)
+    return resultado
+
+
+def restaurar_archivo(ruta: str, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Vuelve a cargar un archivo generado por ``archivar_inactivos``.
+
+    Los usuarios que ya existen se saltan; los que chocan por email con un
+    usuario nuevo se cuentan en ``conflictos`` y no se restauran. Si el
+    archivo termina en un miembro incompleto (corrida interrumpida) se
+    restaura todo lo anterior y se ignora la línea cortada.
+    """
+    resultado = {'restaurados': 0, 'existentes': 0, 'conflictos': 0}
+
+    def restaurar(bloque):
+        por_shard = sharding.agrupar(bloque, lambda registro: sharding.shard_de_id(registro['usuario']['id']))
+        for alias, registros in por_shard.items():
+            for clave, valor in _restaurar_bloque(registros, alias).items():
+                resultado[clave] += valor
+
+    bloque = []
+    with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+        try:
+            for linea in archivo:
+                # sin salto de línea es la última de un miembro cortado
+                if not linea.strip() or not linea.endswith('\n'):
+                    continue
+                bloque.append(json.loads(linea))
+                if len(bloque) >= chunk_size:
+                    restaurar(bloque)
+                    bloque = []
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            # los usuarios del miembro cortado no se llegaron a borrar
+            logger.warning("%s termina en un bloque incompleto; se restaura hasta ahí", ruta)
+    if bloque:
+        restaurar(bloque)
+    return resultado
@@ -0,0 +1,85 @@
+"""
+Precalentamiento del worker antes de aceptar requests.
+
+Lo que Django hace de forma perezosa en el primer request (importar el
+URLconf y todas las vistas, armar los diccionarios de ``reverse()``,
+instanciar los hashers y abrir la conexión a la BD) se hace aquí al
+arrancar, así el primer request de un worker nuevo no paga ese costo.
+
+Son dos partes:
+
+- URLconf y hashers: ``wsgi.py`` y ``asgi.py`` los cargan al importarse si
+  ``settings.PRECALENTAR_AL_INICIAR`` (desactivado por defecto). Con
+  ``gunicorn --preload`` eso pasa una sola vez en el maestro y los workers lo
+  heredan.
+- Conexiones: nunca al importar. Con ``--preload`` los workers heredarían el
+  socket del maestro, y las conexiones son por hilo, así que solo sirve
+  abrirlas en el hilo que atiende los requests. Para workers sync de gunicorn
+  eso es el hilo principal de cada worker ya creado::
+
+      # gunicorn.conf.py
+      from usuarios.arranque import post_worker_init
+
+  Con workers ``gthread`` o ASGI las vistas corren en otros hilos y no hay
+  conexión que precalentar.
+"""
+
+import logging
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.db import connections
+from django.urls import get_resolver
+
+from .hashers import cargar_configuracion
+
+logger = logging.getLogger(__name__)
+
+
+def precalentar(conexiones: bool = True) -> dict:
+    """
+    Inicializa URLconf, hashers y conexiones a la BD.
+
+    Args:
+        conexiones: Abrir una conexión por alias de ``DATABASES``.
+
+    Returns:
+        dict: Milisegundos de cada paso.
+    """
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    resolver = get_resolver()
+    # importa el URLconf y con él todas las vistas
+    resolver.url_patterns
+    # y arma los diccionarios que usa reverse()
+    resolver.reverse_dict
+    tiempos['urls'] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    get_hashers()
+    cargar_configuracion()
+    tiempos['hashers'] = (time.perf_counter() - inicio) * 1000
+
+    if conexiones:
+        inicio = time.perf_counter()
+        for alias in connections:
+            try:
+                connections[alias].ensure_connection()
+            except Exception:
+                # sin BD el worker igual puede arrancar; el primer request reintenta
+                logger.exception("No se pudo abrir la conexión '%s' al precalentar", alias)
+        tiempos['conexiones'] = (time.perf_counter() - inicio) * 1000
+
+    logger.info("Worker precalentado: %s", ', '.join(f'{paso} {ms:.1f} ms' for paso, ms in tiempos.items()))
+    return tiempos
+
+
+def post_worker_init(worker) -> None:
+    """
+    Hook de gunicorn: precalienta el worker ya creado, antes de aceptar requests.
+
+    Corre después de cargar la aplicación, con o sin ``--preload``. Solo abre
+    conexiones con workers sync, los únicos que atienden en este hilo.
+    """
+    precalentar(conexiones=getattr(worker.cfg, 'worker_class_str', 'sync') == 'sync')
@@ -0,0 +1,179 @@
+"""
+Índice en memoria para autocompletar universidad, carrera e instituto.
+
+Los valores se normalizan (sin tildes, sin mayúsculas, espacios simples) y se
+guardan en una lista ordenada; la búsqueda por prefijo es un ``bisect`` y no
+toca la base de datos. Cada índice se construye la primera vez que se usa y
+luego se mantiene con las señales de guardado de los perfiles.
+
+Las señales solo llegan al proceso que hizo la escritura, y ``bulk_create``,
+``update()``, ``catalogos.replicar`` o el sembrado no las disparan. Por eso
+cada índice se reconstruye desde la BD cuando pasan
+``settings.AUTOCOMPLETADO['TTL_S']`` segundos; mientras un hilo lo
+reconstruye, los demás siguen usando el anterior.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count
+
+from . import sharding
+from .models import PerfilUniversitario, PerfilSecundaria
+from .normalizacion import normalizar
+
+# nombre público del campo -> (modelo, campo del modelo)
+CAMPOS_AUTOCOMPLETADO = {
+    'universidad': (PerfilUniversitario, 'universidad'),
+    'carrera': (PerfilUniversitario, 'carrera'),
+    'instituto': (PerfilSecundaria, 'instituto'),
+}
+
+MAX_SUGERENCIAS = 20
+
+DEFAULTS = {
+    'TTL_S': 60.0,
+}
+
+
+def configuracion() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'AUTOCOMPLETADO', {})}
+
+
+class IndicePrefijos:
+    """
+    Lista ordenada de claves normalizadas con su frecuencia.
+
+    Varias escrituras del mismo nombre ("Universidad Nacional",
+    "universidad nacional") comparten clave; se sugiere la escritura
+    más usada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claves = []
+        # clave normalizada -> Counter(escritura original -> cantidad)
+        self._conteos = {}
+
+    def agregar(self, valor: str, cantidad: int = 1) -> None:
+        clave = normalizar(valor)
+        if not clave:
+            return
+        with self._lock:
+            if clave not in self._conteos:
+                self._conteos[clave] = Counter()
+                insort(self._claves, clave)
+            self._conteos[clave][valor.strip()] += cantidad
+
+    def quitar(self, valor: str, cantidad: int = 1) -> None:
+        clave = normalizar(valor)
+        with self._lock:
+            conteo = self._conteos.get(clave)
+            if conteo is None:
+                return
+            conteo[valor.strip()] -= cantidad
+            if conteo[valor.strip()] <= 0:
+                del conteo[valor.strip()]
+            if not conteo:
+                del self._conteos[clave]
+                del self._claves[bisect_left(self._claves, clave)]
+
+    def buscar(self, prefijo: str, limite: int = 10) -> list:
+        """
+        Devuelve hasta ``limite`` valores que empiezan por ``prefijo``,
+        ordenados por frecuencia descendente.
+        """
+        prefijo = normalizar(prefijo)
+        if not prefijo:
+            return []
+        with self._lock:
+            inicio = bisect_left(self._claves, prefijo)
+            # '\uffff' ordena después de cualquier continuación del prefijo
+            fin = bisect_left(self._claves, prefijo + '\uffff', inicio)
+            # más frecuentes primero; a igual frecuencia, orden alfabético
+            mejores = heapq.nsmallest(limite, (
+                (-sum(self._conteos[clave].values()), clave)
+                for clave in self._claves[inicio:fin]
+            ))
+            return [self._conteos[clave].most_common(1)[0][0] for _, clave in mejores]
+
+    def __len__(self):
+        return len(self._claves)
+
+
+# campo -> (índice, time.monotonic() al construirlo)
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def construir_indice(campo: str) -> IndicePrefijos:
+    """Arma el índice de ``campo`` a partir de los valores distintos en la BD."""
+    modelo, nombre_campo = CAMPOS_AUTOCOMPLETADO[campo]
+    catalogo = modelo._meta.get_field(nombre_campo).related_model
+    # se agrupa por el id del catálogo y luego se traen los nombres
+    conteos = Counter()
+    for alias in sharding.shards():
+        conteos.update(dict(
+            modelo.objects.using(alias).values_list(f'{nombre_campo}_id').annotate(n=Count('pk')).order_by()
+        ))
+    nombres = dict(catalogo.objects.filter(pk__in=conteos).values_list('pk', 'nombre'))
+    indice = IndicePrefijos()
+    for pk, cantidad in conteos.items():
+        indice.agregar(nombres[pk], cantidad)
+    return indice
+
+
+def _vigente(entrada) -> bool:
+    return entrada is not None and time.monotonic() - entrada[1] < configuracion()['TTL_S']
+
+
+def obtener_indice(campo: str) -> IndicePrefijos:
+    entrada = _indices.get(campo)
+    if _vigente(entrada):
+        return entrada[0]
+    # vencido: si otro hilo ya lo está reconstruyendo se sirve el anterior
+    if not _indices_lock.acquire(blocking=entrada is None):
+        return entrada[0]
+    try:
+        entrada = _indices.get(campo)
+        if not _vigente(entrada):
+            entrada = _indices[campo] = (construir_indice(campo), time.monotonic())
+    finally:
+        _indices_lock.release()
+    return entrada[0]
+
+
+def sugerir(campo: str, prefijo: str, limite: int = 10) -> list:
+    return obtener_indice(campo).buscar(prefijo, min(limite, MAX_SUGERENCIAS))
+
+
+def actualizar_valor(modelo, anterior: dict, nuevo: dict) -> None:
+    """
+    Refleja en los índices ya construidos el cambio de un perfil.
+
+    ``anterior``/``nuevo`` son ``{campo_del_modelo: nombre}``; vacíos para
+    altas y bajas. Los índices aún no construidos se ignoran porque al
+    construirse leerán la BD.
+    """
+    for campo, (modelo_campo, nombre_campo) in CAMPOS_AUTOCOMPLETADO.items():
+        entrada = _indices.get(campo)
+        if entrada is None or modelo_campo is not modelo:
+            continue
+        indice = entrada[0]
+        valor_anterior = anterior.get(nombre_campo)
+        valor_nuevo = nuevo.get(nombre_campo)
+        if valor_anterior == valor_nuevo:
+            continue
+        if valor_anterior:
+            indice.quitar(valor_anterior)
+        if valor_nuevo:
+            indice.agregar(valor_nuevo)
+
+
+def reiniciar_indices() -> None:
+    with _indices_lock:
+        _indices.clear()
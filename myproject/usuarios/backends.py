@@ -0,0 +1,22 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .permisos import obtener_permisos
+
+
+class PermisosCacheBackend(ModelBackend):
+    """
+    ``ModelBackend`` que comparte los permisos resueltos entre requests.
+
+    Dentro de un request se sigue usando ``_perm_cache`` del usuario, igual
+    que Django; entre requests los permisos salen de ``permisos``.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = obtener_permisos(
+                user_obj.pk, lambda: super(PermisosCacheBackend, self).get_all_permissions(user_obj),
+                superusuario=user_obj.is_superuser,
+            )
+        return user_obj._perm_cache
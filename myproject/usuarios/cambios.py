@@ -0,0 +1,239 @@
+"""
+Feed de cambios para sincronizar sistemas externos.
+
+Cada alta, modificación o borrado de ``Usuario``, ``PerfilUniversitario`` o
+``PerfilSecundaria`` agrega una fila a ``Cambio`` en la misma transacción que
+el cambio. El feed se lee en orden ``(transaccion, id)``: un consumidor pide lo que
+viene después de su cursor y guarda el último par como nuevo cursor
+(``'<transaccion>-<id>'``), así que el costo depende de la cantidad de
+cambios y no del tamaño de las tablas.
+
+Los ``save()``/``delete()`` se registran con señales; los ``update()`` y
+``bulk_create()`` no disparan señales, así que quien los usa llama
+``registrar`` (ver ``periodos``, ``creditos``, ``archivo`` y el admin). Los
+borrados masivos van dentro de ``borrado_en_bloque()`` y registran sus
+borrados con un solo ``registrar(..., operacion='D')`` en lugar de un insert
+por fila desde la señal.
+
+Los ids se asignan al insertar y no al confirmar: una transacción larga
+(``sumar_creditos``, una restauración o un rebalanceo) puede confirmar un id
+menor al último que ya leyó un consumidor. En Postgres ``transaccion`` es el
+id de la transacción que insertó la fila y solo se entregan las filas de
+transacciones anteriores al ``xmin`` del snapshot de la consulta, que ya
+terminaron todas: ninguna fila puede aparecer después detrás del cursor, sin
+importar cuánto tarde en confirmar. En otros motores ``transaccion`` es 0 y
+solo se entregan los cambios con más de ``MARGEN_S`` segundos; eso no
+alcanza para una transacción que confirma más tarde que eso después del
+insert (en SQLite no pasa: hay un solo escritor a la vez y los ids salen en
+orden de confirmación).
+
+Con sharding cada shard tiene su propia tabla ``Cambio`` (el cambio se
+registra en la misma transacción que el dato) y su propio cursor: el
+consumidor lee el feed de cada alias de ``sharding.shards()`` por separado.
+Los ids de usuario y de perfil son globales, así que ``(modelo, id)``
+identifica al objeto en cualquier shard. Cuando ``rebalancear_shards`` mueve
+un usuario, el destino entrega un ``upsert`` y el origen un ``movido`` (que
+para ese shard es un borrado): un consumidor por shard lo saca del origen y
+uno global, que no mira el shard, lo ignora sin importar en qué orden lea
+los dos feeds.
+
+Configuración en ``settings.CAMBIOS``::
+
+    MARGEN_S        antigüedad mínima de un cambio para entregarlo (fuera de Postgres)
+    RETENCION_DIAS  días que se guardan los cambios antes de compactarlos
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BigIntegerField, Exists, Func, OuterRef, Q
+from django.utils import timezone
+
+from .models import Cambio, Usuario, PerfilUniversitario, PerfilSecundaria
+
+DEFAULTS = {
+    'MARGEN_S': 5,
+    'RETENCION_DIAS': 30,
+}
+
+LIMITE = 500
+MAX_LIMITE = 2000
+CHUNK_SIZE = 1000
+
+MODELOS = {
+    'usuario': Usuario,
+    'perfil_universitario': PerfilUniversitario,
+    'perfil_secundaria': PerfilSecundaria,
+}
+NOMBRES = {modelo: nombre for nombre, modelo in MODELOS.items()}
+
+OPERACIONES_SIN_DATOS = {'D': 'borrado', 'M': 'movido'}
+
+# True dentro de borrado_en_bloque(): la señal de borrado no registra nada
+_en_bloque = ContextVar('cambios_en_bloque', default=False)
+
+# campos que se entregan; los catálogos van por nombre y la contraseña nunca
+CAMPOS = {
+    'usuario': ['id', 'email', 'nombre', 'apellido', 'edad', 'genero', 'tipo_estudiante',
+                'is_active', 'is_staff', 'last_login'],
+    'perfil_universitario': ['id', 'usuario_id', 'universidad__nombre', 'carrera__nombre', 'total_semestres',
+                             'semestre_actual', 'creditos_para_graduarse', 'creditos_aprobados', 'finalizado'],
+    'perfil_secundaria': ['id', 'usuario_id', 'instituto__nombre', 'curso__nombre', 'total_de_periodos',
+                          'periodo_actual', 'total_de_materias', 'total_de_materias_para_aprobacion',
+                          'finalizado'],
+}
+
+
+class HorizonteTransacciones(Func):
+    """Transacción más vieja que sigue abierta para el snapshot de la consulta (solo Postgres)."""
+    output_field = BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint', []
+
+
+def configuracion() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'CAMBIOS', {})}
+
+
+def leer_cursor(valor) -> tuple:
+    """``'<transaccion>-<id>'`` a ``(transaccion, id)``; un id solo (cursor viejo) es ``(0, id)``."""
+    transaccion, _, pk = str(valor).rpartition('-')
+    return int(transaccion or 0), int(pk)
+
+
+def _cursor(transaccion: int, pk: int) -> str:
+    return f'{transaccion}-{pk}'
+
+
+def registrar(modelo, ids, operacion: str = 'U', using: str = None) -> None:
+    """
+    Agrega un cambio por id. ``operacion`` es ``'U'`` (alta/modificación),
+    ``'D'`` (borrado) o ``'M'`` (movido a otro shard).
+
+    ``using`` es la BD donde se hizo el cambio (por defecto ``default``).
+    """
+    nombre = NOMBRES.get(modelo)
+    if nombre is None:
+        return
+    Cambio.objects.db_manager(using or 'default').bulk_create(
+        [Cambio(modelo=nombre, objeto_id=objeto_id, operacion=operacion) for objeto_id in ids],
+        batch_size=CHUNK_SIZE,
+    )
+
+
+def en_bloque() -> bool:
+    return _en_bloque.get()
+
+
+@contextmanager
+def borrado_en_bloque():
+    """Quien borra aquí dentro registra sus borrados por su cuenta, de una vez."""
+    token = _en_bloque.set(True)
+    try:
+        yield
+    finally:
+        _en_bloque.reset(token)
+
+
+def _datos_actuales(pendientes: dict, shard: str) -> dict:
+    datos = {}
+    for nombre, ids in pendientes.items():
+        for fila in MODELOS[nombre].objects.using(shard).filter(pk__in=ids).values(*CAMPOS[nombre]):
+            datos[(nombre, fila['id'])] = {campo.split('__')[0]: valor for campo, valor in fila.items()}
+    return datos
+
+
+def obtener_cambios(desde='0', limite: int = LIMITE, shard: str = 'default') -> dict:
+    """
+    Devuelve los cambios posteriores al cursor ``desde`` del feed de ``shard``.
+
+    Si un objeto cambió varias veces en la página solo se entrega la última
+    versión. Los borrados llegan como ``{'operacion': 'borrado', 'datos': None}``
+    y los objetos que pasaron a otro shard como ``{'operacion': 'movido', 'datos': None}``.
+
+    Returns:
+        dict: ``cambios``, ``cursor`` (pasarlo como ``desde`` en la siguiente
+        llamada) y ``hay_mas``.
+    """
+    config = configuracion()
+    transaccion, ultimo_pk = leer_cursor(desde)
+    cambios = Cambio.objects.using(shard).filter(transaccion__gte=transaccion).filter(
+        Q(transaccion__gt=transaccion) | Q(pk__gt=ultimo_pk)
+    )
+    if connections[shard].vendor == 'postgresql':
+        cambios = cambios.filter(transaccion__lt=HorizonteTransacciones())
+    elif config['MARGEN_S']:
+        cambios = cambios.filter(fecha__lte=timezone.now() - timedelta(seconds=config['MARGEN_S']))
+    filas = list(
+        cambios.order_by('transaccion', 'pk')
+        .values_list('transaccion', 'pk', 'modelo', 'objeto_id', 'operacion')[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    ultimos = {}
+    for id_transaccion, pk, nombre, objeto_id, operacion in filas:
+        # se reinserta para que quede en el orden de su último cambio
+        ultimos.pop((nombre, objeto_id), None)
+        ultimos[(nombre, objeto_id)] = (_cursor(id_transaccion, pk), operacion)
+
+    pendientes = {}
+    for (nombre, objeto_id), (_, operacion) in ultimos.items():
+        if operacion == 'U':
+            pendientes.setdefault(nombre, []).append(objeto_id)
+    datos = _datos_actuales(pendientes, shard)
+
+    resultado = []
+    for (nombre, objeto_id), (cursor, operacion) in ultimos.items():
+        if operacion in OPERACIONES_SIN_DATOS:
+            resultado.append({
+                'cursor': cursor, 'modelo': nombre, 'id': objeto_id,
+                'operacion': OPERACIONES_SIN_DATOS[operacion], 'datos': None,
+            })
+            continue
+        fila = datos.get((nombre, objeto_id))
+        if fila is None:
+            # se borró después: su borrado está más adelante en el feed
+            continue
+        resultado.append({'cursor': cursor, 'modelo': nombre, 'id': objeto_id, 'operacion': 'upsert', 'datos': fila})
+
+    return {
+        'shard': shard,
+        'cambios': resultado,
+        'cursor': _cursor(*filas[-1][:2]) if filas else _cursor(*leer_cursor(desde)),
+        'hay_mas': hay_mas,
+    }
+
+
+def compactar_cambios(dias: int = None, shard: str = 'default') -> int:
+    """
+    Borra, por bloques, los cambios con más de ``dias`` días que ya no aportan.
+
+    Se borran las filas reemplazadas por un cambio posterior del mismo objeto
+    y los borrados y movimientos viejos. Queda al menos un cambio por objeto existente, así
+    que leer desde ``desde=0`` siempre entrega el estado completo; un
+    consumidor que no leyó en ``dias`` días puede perder borrados y tiene que
+    volver a sincronizar desde cero.
+    """
+    if dias is None:
+        dias = configuracion()['RETENCION_DIAS']
+    limite = timezone.now() - timedelta(days=dias)
+    posterior = Cambio.objects.using(shard).filter(
+        modelo=OuterRef('modelo'), objeto_id=OuterRef('objeto_id'), pk__gt=OuterRef('pk')
+    )
+    viejos = Cambio.objects.using(shard).filter(fecha__lt=limite).filter(
+        Q(operacion__in=OPERACIONES_SIN_DATOS) | Q(Exists(posterior))
+    )
+
+    total = 0
+    ultimo_pk = 0
+    while True:
+        ids = list(viejos.filter(pk__gt=ultimo_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not ids:
+            return total
+        total += Cambio.objects.using(shard).filter(pk__in=ids).delete()[0]
+        ultimo_pk = ids[-1]
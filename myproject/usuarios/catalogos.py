@@ -0,0 +1,112 @@
+"""
+Resolución de nombres de catálogo a filas, con caché en memoria.
+
+Los serializadores siguen recibiendo nombres ("Universidad Nacional"); aquí
+se convierten en la fila del catálogo. Una vez conocido, un nombre se
+resuelve sin consultar la BD.
+
+Validar solo busca (``buscar``): un nombre nuevo se crea con ``resolver``
+recién al guardar el perfil, así un payload rechazado no deja filas en el
+catálogo ni en el autocompletado.
+"""
+
+import threading
+from functools import partial
+
+from django.db import IntegrityError, transaction
+
+from . import sharding
+from .normalizacion import normalizar
+
+_cache_lock = threading.Lock()
+# modelo -> {clave normalizada: (id, nombre)}
+_cache = {}
+# modelo -> {id: nombre}
+_nombres = {}
+
+
+def _guardar_en_cache(modelo, clave, pk, nombre):
+    with _cache_lock:
+        _cache.setdefault(modelo, {})[clave] = (pk, nombre)
+        _nombres.setdefault(modelo, {})[pk] = nombre
+
+
+def _cachear_al_confirmar(modelo, instancia):
+    # solo filas confirmadas: un rollback no deja ids inexistentes en la caché
+    transaction.on_commit(partial(_guardar_en_cache, modelo, instancia.clave, instancia.pk, instancia.nombre))
+
+
+def buscar(modelo, nombre: str):
+    """
+    Como ``resolver`` pero sin crear: si el nombre no existe devuelve una
+    instancia sin guardar (``pk`` en ``None``) para crearla después.
+    """
+    clave = normalizar(nombre)
+    encontrado = _cache.get(modelo, {}).get(clave)
+    if encontrado is not None:
+        pk, nombre_guardado = encontrado
+        return modelo(pk=pk, nombre=nombre_guardado, clave=clave)
+    instancia = modelo.objects.filter(clave=clave).first()
+    if instancia is None:
+        return modelo(nombre=' '.join(nombre.split()), clave=clave)
+    _cachear_al_confirmar(modelo, instancia)
+    return instancia
+
+
+def nombre_de(modelo, pk) -> str:
+    """Nombre de la fila ``pk`` de ``modelo``, desde la caché si ya se conoce."""
+    nombre = _nombres.get(modelo, {}).get(pk)
+    if nombre is None:
+        nombre = modelo.objects.filter(pk=pk).values_list('nombre', flat=True).get()
+        # sin esperar al commit: las filas de catálogo no se renombran ni se borran, y un
+        # borrado masivo dentro de una transacción consultaría una vez por perfil
+        with _cache_lock:
+            _nombres.setdefault(modelo, {})[pk] = nombre
+    return nombre
+
+
+def resolver(modelo, nombre: str):
+    """
+    Devuelve la fila de ``modelo`` para ``nombre``, creándola si no existe.
+
+    Los aciertos de caché devuelven una instancia armada en memoria, sin
+    consultar la BD. Solo se cachean filas confirmadas, así un rollback no
+    deja ids inexistentes en la caché.
+    """
+    clave = normalizar(nombre)
+    encontrado = _cache.get(modelo, {}).get(clave)
+    if encontrado is not None:
+        pk, nombre_guardado = encontrado
+        return modelo(pk=pk, nombre=nombre_guardado, clave=clave)
+
+    try:
+        with transaction.atomic():
+            instancia, _ = modelo.objects.get_or_create(
+                clave=clave, defaults={'nombre': ' '.join(nombre.split())}
+            )
+    except IntegrityError:
+        # otro proceso lo creó entre el get y el insert
+        instancia = modelo.objects.get(clave=clave)
+
+    # también si ya existía: repara una réplica que quedó a medias
+    replicar(modelo, [instancia])
+    _cachear_al_confirmar(modelo, instancia)
+    return instancia
+
+
+def replicar(modelo, filas, aliases=None) -> None:
+    """Copia ``filas`` (del catálogo en ``default``) a los shards que no las tengan."""
+    if not sharding.activo():
+        return
+    for alias in aliases or sharding.shards():
+        if alias != 'default':
+            modelo.objects.using(alias).bulk_create(
+                [modelo(pk=fila.pk, nombre=fila.nombre, clave=fila.clave) for fila in filas],
+                ignore_conflicts=True,
+            )
+
+
+def limpiar_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+        _nombres.clear()
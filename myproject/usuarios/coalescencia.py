@@ -0,0 +1,356 @@
+"""
+Coalescencia de cálculos repetidos ("single flight") con caché corta.
+
+Cuando muchos requests piden a la vez el mismo resultado caro y compartido
+(por ejemplo una página del listado de staff, que consulta todos los shards),
+solo el primero lo calcula; los demás esperan ese cálculo y reciben el mismo
+resultado. Funciona entre hilos (workers con threads) y entre corutinas de un
+mismo event loop. Es por proceso: cada worker calcula una vez.
+
+Encima hay una caché en memoria de pocos segundos con
+*stale-while-revalidate*: durante ``TTL_S`` se responde desde la caché; hasta
+``OBSOLETO_S`` después se sigue respondiendo el valor viejo mientras un solo
+cálculo en segundo plano lo renueva; pasado eso se vuelve a calcular.
+
+Configuración en ``settings.COALESCENCIA``::
+
+    ACTIVO      False: el decorador llama a la vista directamente
+    TTL_S       segundos en que un resultado se responde sin recalcular
+    OBSOLETO_S  segundos extra en que se responde el valor viejo mientras se renueva
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ACTIVO': True,
+    'TTL_S': 1.0,
+    'OBSOLETO_S': 5.0,
+}
+
+# entradas por caché; al pasarlo se descartan las vencidas y luego las más viejas
+MAX_ENTRADAS = 1000
+
+
+def configuracion() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'COALESCENCIA', {})}
+
+
+# ========== Métricas ==========
+
+_metricas_lock = threading.Lock()
+_metricas = {}
+
+CONTADORES = ('calculos', 'coalescidos', 'aciertos', 'obsoletos', 'errores')
+
+
+def _contar(nombre: str, contador: str) -> None:
+    with _metricas_lock:
+        metrica = _metricas.setdefault(nombre, dict.fromkeys(CONTADORES, 0))
+        metrica[contador] += 1
+
+
+def obtener_metricas() -> dict:
+    """
+    Contadores por nombre: ``calculos`` (ejecuciones reales), ``coalescidos``
+    (llamadas que esperaron un cálculo en curso), ``aciertos`` y ``obsoletos``
+    (respuestas desde la caché, vigentes o en renovación) y ``errores``.
+    """
+    with _metricas_lock:
+        resultado = {}
+        for nombre, metrica in _metricas.items():
+            llamadas = metrica['calculos'] + metrica['coalescidos'] + metrica['aciertos'] + metrica['obsoletos']
+            resultado[nombre] = {
+                **metrica,
+                'ahorrados_pct': round(100 * (llamadas - metrica['calculos']) / llamadas, 1) if llamadas else 0.0,
+            }
+        return resultado
+
+
+# ========== Single flight ==========
+
+class _Llamada:
+    __slots__ = ('evento', 'resultado', 'error')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Junta las llamadas concurrentes con la misma clave en una sola ejecución.
+
+    ``hacer`` es para hilos y ``ahacer`` para corutinas; un error del cálculo
+    le llega a todos los que lo estaban esperando.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        # (event loop, clave) -> Task: una tarea solo se puede esperar desde su loop
+        self._en_curso_async = {}
+
+    def hacer(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[clave] = _Llamada()
+
+        if not lider:
+            _contar(self.nombre, 'coalescidos')
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        _contar(self.nombre, 'calculos')
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except Exception as error:
+            _contar(self.nombre, 'errores')
+            llamada.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.evento.set()
+
+    async def ahacer(self, clave, funcion):
+        """
+        Como ``hacer``, con ``funcion`` una función async sin argumentos.
+
+        El cálculo corre en su propia tarea y todos la esperan con
+        ``asyncio.shield``: si cancelan al que la lanzó (el cliente se
+        desconectó) los demás siguen esperando el mismo resultado.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tarea = self._en_curso_async.get((loop, clave))
+            lider = tarea is None
+            if lider:
+                tarea = self._en_curso_async[(loop, clave)] = loop.create_task(funcion())
+                tarea.add_done_callback(lambda t: self._terminar_async(loop, clave, t))
+
+        _contar(self.nombre, 'calculos' if lider else 'coalescidos')
+        return await asyncio.shield(tarea)
+
+    def _terminar_async(self, loop, clave, tarea) -> None:
+        with self._lock:
+            del self._en_curso_async[(loop, clave)]
+        # exception() también la marca como leída aunque nadie la espere
+        if not tarea.cancelled() and tarea.exception() is not None:
+            _contar(self.nombre, 'errores')
+
+
+# ========== Caché corta con stale-while-revalidate ==========
+
+class CacheCorta:
+    """
+    Resultados recientes en memoria, calculados a través de un ``SingleFlight``.
+
+    Args:
+        nombre: Nombre para las métricas.
+        ttl: Segundos vigentes (por defecto ``TTL_S``).
+        obsoleto: Segundos extra sirviendo el valor viejo (por defecto ``OBSOLETO_S``).
+    """
+
+    def __init__(self, nombre: str, ttl: float = None, obsoleto: float = None):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.obsoleto = obsoleto
+        self.vuelo = SingleFlight(nombre)
+        self._lock = threading.Lock()
+        # clave -> (valor, time.monotonic() al guardarlo)
+        self._entradas = {}
+        self._renovando = set()
+        # referencias a las tareas async de renovación para que no las recolecte el GC
+        self._tareas = set()
+
+    def _tiempos(self) -> tuple:
+        config = configuracion()
+        ttl = config['TTL_S'] if self.ttl is None else self.ttl
+        obsoleto = config['OBSOLETO_S'] if self.obsoleto is None else self.obsoleto
+        return ttl, ttl + obsoleto
+
+    def _guardar(self, clave, valor) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._entradas.pop(clave, None)
+            self._entradas[clave] = (valor, ahora)
+            if len(self._entradas) > MAX_ENTRADAS:
+                limite = ahora - self._tiempos()[1]
+                for vieja in [c for c, (_, guardado) in self._entradas.items() if guardado < limite]:
+                    del self._entradas[vieja]
+                while len(self._entradas) > MAX_ENTRADAS:
+                    # el dict conserva el orden de inserción: la primera es la más vieja
+                    del self._entradas[next(iter(self._entradas))]
+
+    def _buscar(self, clave):
+        """Devuelve ``(valor, estado)`` con estado ``'vigente'``, ``'obsoleto'`` o ``None``."""
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None, None
+        valor, guardado = entrada
+        edad = time.monotonic() - guardado
+        vigente, obsoleto = self._tiempos()
+        if edad < vigente:
+            return valor, 'vigente'
+        if edad < obsoleto:
+            return valor, 'obsoleto'
+        return None, None
+
+    def _marcar_renovacion(self, clave) -> bool:
+        with self._lock:
+            if clave in self._renovando:
+                return False
+            self._renovando.add(clave)
+            return True
+
+    def obtener(self, clave, funcion, cachear=None):
+        """
+        Devuelve el valor de ``clave``, calculándolo con ``funcion()`` si hace falta.
+
+        Args:
+            cachear: Función que recibe el valor y dice si se guarda
+                (por ejemplo, solo respuestas exitosas). Por defecto todos.
+        """
+        valor, estado = self._buscar(clave)
+        if estado == 'vigente':
+            _contar(self.nombre, 'aciertos')
+            return valor
+        if estado == 'obsoleto':
+            _contar(self.nombre, 'obsoletos')
+            if self._marcar_renovacion(clave):
+                threading.Thread(
+                    target=self._renovar, args=(clave, funcion, cachear), daemon=True,
+                    name=f'coalescencia-{self.nombre}',
+                ).start()
+            return valor
+        return self.vuelo.hacer(clave, lambda: self._calcular(clave, funcion, cachear))
+
+    def _calcular(self, clave, funcion, cachear):
+        valor = funcion()
+        if cachear is None or cachear(valor):
+            self._guardar(clave, valor)
+        return valor
+
+    def _renovar(self, clave, funcion, cachear) -> None:
+        try:
+            self.vuelo.hacer(clave, lambda: self._calcular(clave, funcion, cachear))
+        except Exception:
+            # se sigue sirviendo el valor viejo hasta que venza
+            logger.exception("Falló la renovación en segundo plano de '%s'", self.nombre)
+        finally:
+            with self._lock:
+                self._renovando.discard(clave)
+            # este hilo no atiende requests: sus conexiones no las cierra nadie más
+            connections.close_all()
+
+    async def aobtener(self, clave, funcion, cachear=None):
+        """Como ``obtener``, con ``funcion`` una función async sin argumentos."""
+        valor, estado = self._buscar(clave)
+        if estado == 'vigente':
+            _contar(self.nombre, 'aciertos')
+            return valor
+        if estado == 'obsoleto':
+            _contar(self.nombre, 'obsoletos')
+            if self._marcar_renovacion(clave):
+                tarea = asyncio.get_running_loop().create_task(self._arenovar(clave, funcion, cachear))
+                self._tareas.add(tarea)
+                tarea.add_done_callback(self._tareas.discard)
+            return valor
+        return await self.vuelo.ahacer(clave, lambda: self._acalcular(clave, funcion, cachear))
+
+    async def _acalcular(self, clave, funcion, cachear):
+        valor = await funcion()
+        if cachear is None or cachear(valor):
+            self._guardar(clave, valor)
+        return valor
+
+    async def _arenovar(self, clave, funcion, cachear) -> None:
+        try:
+            await self.vuelo.ahacer(clave, lambda: self._acalcular(clave, funcion, cachear))
+        except Exception:
+            logger.exception("Falló la renovación en segundo plano de '%s'", self.nombre)
+        finally:
+            with self._lock:
+                self._renovando.discard(clave)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+
+_caches = {}
+
+
+def obtener_cache(nombre: str, ttl: float = None, obsoleto: float = None) -> CacheCorta:
+    cache = _caches.get(nombre)
+    if cache is None:
+        cache = _caches.setdefault(nombre, CacheCorta(nombre, ttl, obsoleto))
+    return cache
+
+
+def reiniciar() -> None:
+    """Vacía las cachés y las métricas."""
+    for cache in list(_caches.values()):
+        cache.limpiar()
+    with _metricas_lock:
+        _metricas.clear()
+
+
+# ========== Decorador para vistas ==========
+
+def _clave_request(request, args, kwargs) -> tuple:
+    # el resultado es compartido: la clave no incluye al usuario (los permisos ya se revisaron)
+    parametros = tuple(sorted((clave, tuple(valores)) for clave, valores in request.query_params.lists()))
+    return (request.method, request.path, parametros, args, tuple(sorted(kwargs.items())))
+
+
+def coalescer(nombre: str, ttl: float = None, obsoleto: float = None):
+    """
+    Decorador para métodos sync de ``APIView`` (``get``) cuyo resultado es
+    el mismo para todos los que pueden verlo.
+
+    Los requests concurrentes con la misma ruta y query string comparten un
+    cálculo; las respuestas 200 se cachean por ``ttl`` segundos. Solo se
+    guardan ``data`` y el status: los headers propios de la respuesta se
+    pierden.
+
+    ``APIView.dispatch`` no espera handlers async, así que no hay versión
+    async del decorador; el código async usa ``CacheCorta.aobtener`` o
+    ``SingleFlight.ahacer`` directamente.
+    """
+    cache = obtener_cache(nombre, ttl, obsoleto)
+
+    def exitosa(valor) -> bool:
+        return valor[1] == 200
+
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            if not configuracion()['ACTIVO']:
+                return metodo(self, request, *args, **kwargs)
+
+            def calcular():
+                respuesta = metodo(self, request, *args, **kwargs)
+                return respuesta.data, respuesta.status_code
+
+            data, estado = cache.obtener(_clave_request(request, args, kwargs), calcular, exitosa)
+            return Response(data, status=estado)
+        return envoltura
+    return decorador
@@ -0,0 +1,273 @@
+"""
+Estadísticas por cohorte de los perfiles, calculadas con NumPy.
+
+Las columnas se leen con ``values_list(...).iterator()`` en bloques; cada
+bloque se convierte a arreglos y se agrupa de forma vectorizada
+(``np.unique`` + ``np.bincount``). Por grupo solo se guardan acumuladores
+(cantidad, media, M2, mínimo y máximo) que se combinan entre bloques con la
+fórmula de Chan, así que la memoria depende de la cantidad de grupos y del
+tamaño del bloque, no de la cantidad de perfiles.
+
+Las métricas que son razones ignoran las filas con denominador 0. Con
+sharding se recorre cada shard y sus acumuladores se combinan igual que los
+bloques.
+"""
+
+import numpy as np
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import Usuario, PerfilUniversitario, PerfilSecundaria, Universidad, Carrera, Instituto, Curso
+
+CHUNK_SIZE = 50_000
+ANCHO_EDAD = 5
+
+# tipo -> (modelo, {dimensión: campo}, {métrica: (numerador, denominador)})
+TIPOS = {
+    'universitario': (
+        PerfilUniversitario,
+        {
+            'universidad': 'universidad_id',
+            'carrera': 'carrera_id',
+            'genero': 'usuario__genero',
+            'edad': 'usuario__edad',
+        },
+        {
+            'creditos_aprobados': ('creditos_aprobados', None),
+            'avance_creditos': ('creditos_aprobados', 'creditos_para_graduarse'),
+            'avance_semestres': ('semestre_actual', 'total_semestres'),
+        },
+    ),
+    'secundaria': (
+        PerfilSecundaria,
+        {
+            'instituto': 'instituto_id',
+            'curso': 'curso_id',
+            'genero': 'usuario__genero',
+            'edad': 'usuario__edad',
+        },
+        {
+            'proporcion_materias': ('total_de_materias_para_aprobacion', 'total_de_materias'),
+            'avance_periodos': ('periodo_actual', 'total_de_periodos'),
+        },
+    ),
+}
+
+# dimensiones que son ids de un catálogo
+CATALOGOS = {
+    'universidad': Universidad,
+    'carrera': Carrera,
+    'instituto': Instituto,
+    'curso': Curso,
+}
+
+ESTADISTICAS = ['media', 'desviacion', 'minimo', 'maximo']
+
+
+class Acumulador:
+    """Cantidad, media, M2, mínimo y máximo por grupo y métrica."""
+
+    def __init__(self, metricas: int):
+        self.metricas = metricas
+        self.indices = {}
+        self.filas = np.zeros(0, dtype=np.int64)
+        self.n = np.zeros((0, metricas), dtype=np.int64)
+        self.media = np.zeros((0, metricas))
+        self.m2 = np.zeros((0, metricas))
+        self.minimo = np.zeros((0, metricas))
+        self.maximo = np.zeros((0, metricas))
+
+    def _crecer(self, nuevos: int) -> None:
+        self.filas = np.concatenate([self.filas, np.zeros(nuevos, dtype=np.int64)])
+        self.n = np.vstack([self.n, np.zeros((nuevos, self.metricas), dtype=np.int64)])
+        self.media = np.vstack([self.media, np.zeros((nuevos, self.metricas))])
+        self.m2 = np.vstack([self.m2, np.zeros((nuevos, self.metricas))])
+        self.minimo = np.vstack([self.minimo, np.full((nuevos, self.metricas), np.inf)])
+        self.maximo = np.vstack([self.maximo, np.full((nuevos, self.metricas), -np.inf)])
+
+    def indices_de(self, claves) -> np.ndarray:
+        # el bucle es por grupo del bloque, no por fila
+        posiciones = []
+        nuevos = 0
+        for clave in map(tuple, claves.tolist()):
+            if clave not in self.indices:
+                self.indices[clave] = len(self.indices)
+                nuevos += 1
+            posiciones.append(self.indices[clave])
+        if nuevos:
+            self._crecer(nuevos)
+        return np.asarray(posiciones, dtype=np.int64)
+
+    def agregar(self, claves, valores) -> None:
+        """
+        Args:
+            claves: Matriz entera (filas x dimensiones) con el grupo de cada fila.
+            valores: Matriz (filas x métricas); ``nan`` donde la métrica no aplica.
+        """
+        unicas, inverso = np.unique(claves, axis=0, return_inverse=True)
+        inverso = inverso.reshape(-1)
+        grupos = len(unicas)
+        destino = self.indices_de(unicas)
+        self.filas[destino] += np.bincount(inverso, minlength=grupos)
+
+        for m in range(self.metricas):
+            columna = valores[:, m]
+            validos = ~np.isnan(columna)
+            g, x = inverso[validos], columna[validos]
+            n_b = np.bincount(g, minlength=grupos)
+            con_datos = n_b > 0
+            media_b = np.divide(np.bincount(g, weights=x, minlength=grupos), n_b,
+                                out=np.zeros(grupos), where=con_datos)
+            m2_b = np.bincount(g, weights=(x - media_b[g]) ** 2, minlength=grupos)
+            min_b = np.full(grupos, np.inf)
+            max_b = np.full(grupos, -np.inf)
+            np.minimum.at(min_b, g, x)
+            np.maximum.at(max_b, g, x)
+
+            # combinación de Chan: (n_a, media_a, M2_a) + (n_b, media_b, M2_b)
+            n_a = self.n[destino, m]
+            n = n_a + n_b
+            delta = media_b - self.media[destino, m]
+            proporcion = np.divide(n_b, n, out=np.zeros(grupos), where=n > 0)
+            self.media[destino, m] += delta * proporcion
+            self.m2[destino, m] += m2_b + delta ** 2 * n_a * proporcion
+            self.n[destino, m] = n
+            self.minimo[destino, m] = np.minimum(self.minimo[destino, m], min_b)
+            self.maximo[destino, m] = np.maximum(self.maximo[destino, m], max_b)
+
+
+def _claves(columnas: list, por: list, filas: int, ancho_edad: int) -> np.ndarray:
+    if not por:
+        # sin dimensiones todo cae en un mismo grupo
+        return np.zeros((filas, 1), dtype=np.int64)
+    claves = np.empty((filas, len(por)), dtype=np.int64)
+    for i, (dimension, columna) in enumerate(zip(por, columnas)):
+        if dimension == 'genero':
+            # un carácter -> su código unicode, '' queda en 0
+            claves[:, i] = np.array(columna, dtype='U1').view(np.int32)
+        elif dimension == 'edad':
+            edad = np.fromiter(columna, dtype=np.int64, count=len(columna))
+            claves[:, i] = np.where(edad >= 0, edad // ancho_edad * ancho_edad, -1)
+        else:
+            claves[:, i] = np.fromiter(columna, dtype=np.int64, count=len(columna))
+    return claves
+
+
+def _valores(columnas: list, metricas: dict) -> np.ndarray:
+    crudos = np.array(columnas, dtype=np.float64).T
+    valores = np.empty((len(crudos), len(metricas)))
+    campos = _campos_metricas(metricas)
+    for m, (numerador, denominador) in enumerate(metricas.values()):
+        num = crudos[:, campos.index(numerador)]
+        if denominador is None:
+            valores[:, m] = num
+        else:
+            den = crudos[:, campos.index(denominador)]
+            valores[:, m] = np.divide(num, den, out=np.full(len(num), np.nan), where=den != 0)
+    return valores
+
+
+def _campos_metricas(metricas: dict) -> list:
+    campos = []
+    for par in metricas.values():
+        for campo in par:
+            if campo is not None and campo not in campos:
+                campos.append(campo)
+    return campos
+
+
+def _etiquetas(por: list, claves, ancho_edad: int) -> list:
+    nombres = {}
+    for i, dimension in enumerate(por):
+        if dimension in CATALOGOS:
+            ids = {clave[i] for clave in claves}
+            nombres[dimension] = {
+                pk: nombre for pk, nombre in
+                CATALOGOS[dimension].objects.filter(pk__in=ids).values_list('pk', 'nombre')
+            }
+    generos = dict(Usuario.GENERO_CHOICES)
+
+    etiquetas = []
+    for clave in claves:
+        fila = []
+        for dimension, valor in zip(por, clave):
+            if dimension == 'genero':
+                fila.append(generos.get(chr(valor), '') if valor else '')
+            elif dimension == 'edad':
+                fila.append('' if valor < 0 else f'{valor}-{valor + ancho_edad - 1}')
+            else:
+                fila.append(nombres[dimension].get(valor, str(valor)))
+        etiquetas.append(fila)
+    return etiquetas
+
+
+def reporte_cohortes(tipo: str, por: list, queryset=None, chunk_size: int = CHUNK_SIZE,
+                     ancho_edad: int = ANCHO_EDAD) -> tuple:
+    """
+    Calcula las estadísticas de cada métrica agrupadas por las dimensiones ``por``.
+
+    Args:
+        tipo: ``'universitario'`` o ``'secundaria'``.
+        por: Dimensiones del tipo, ver ``TIPOS``. Vacío agrupa todo en una fila.
+        queryset: Restringe los perfiles (por defecto todos, de todos los shards).
+        chunk_size: Filas leídas y procesadas por bloque.
+        ancho_edad: Años por grupo de edad.
+
+    Returns:
+        tuple: (columnas, filas), filas ordenadas por las dimensiones.
+    """
+    modelo, dimensiones, metricas = TIPOS[tipo]
+    desconocidas = [dimension for dimension in por if dimension not in dimensiones]
+    if desconocidas:
+        raise ValueError(f"Dimensiones no válidas para {tipo}: {', '.join(desconocidas)}")
+    querysets = [queryset] if queryset is not None else [modelo.objects.using(a) for a in sharding.shards()]
+
+    campos_metricas = _campos_metricas(metricas)
+    expresiones = {
+        dimension: Coalesce(dimensiones[dimension], Value(-1)) if dimension == 'edad' else F(dimensiones[dimension])
+        for dimension in por
+    }
+    acumulador = Acumulador(len(metricas))
+
+    def procesar(filas):
+        columnas = list(zip(*filas))
+        claves = _claves(columnas[:len(por)], por, len(filas), ancho_edad)
+        acumulador.agregar(claves, _valores(columnas[len(por):], metricas))
+
+    for queryset in querysets:
+        consulta = queryset.order_by().annotate(
+            **{f'dim_{dimension}': expresion for dimension, expresion in expresiones.items()}
+        ).values_list(*[f'dim_{dimension}' for dimension in por], *campos_metricas)
+        bloque = []
+        for fila in consulta.iterator(chunk_size=chunk_size):
+            bloque.append(fila)
+            if len(bloque) >= chunk_size:
+                procesar(bloque)
+                bloque = []
+        if bloque:
+            procesar(bloque)
+
+    columnas = [*por, 'cantidad'] + [
+        f'{metrica}_{estadistica}' for metrica in metricas for estadistica in ESTADISTICAS
+    ]
+    claves = sorted(acumulador.indices)
+    etiquetas = _etiquetas(por, claves, ancho_edad) if claves else []
+
+    filas = []
+    for clave, etiqueta in zip(claves, etiquetas):
+        i = acumulador.indices[clave]
+        fila = [*etiqueta, int(acumulador.filas[i])]
+        for m in range(len(metricas)):
+            n = acumulador.n[i, m]
+            if n == 0:
+                fila += [None] * len(ESTADISTICAS)
+                continue
+            fila += [
+                float(acumulador.media[i, m]),
+                float(np.sqrt(acumulador.m2[i, m] / n)),
+                float(acumulador.minimo[i, m]),
+                float(acumulador.maximo[i, m]),
+            ]
+        filas.append(fila)
+    return columnas, filas
@@ -0,0 +1,216 @@
+"""
+Registro de consultas lentas con captura de EXPLAIN.
+
+``ConsultasLentasMiddleware`` instala un execute wrapper en las conexiones
+durante cada request. Las consultas que superan el umbral se encolan y un
+hilo aparte las agrupa por huella (el SQL normalizado), escribe el log con
+límite de frecuencia y captura el ``EXPLAIN`` una sola vez por huella. En
+el request solo se mide el tiempo y se encola.
+
+Configuración en ``settings.CONSULTAS_LENTAS``::
+
+    ACTIVO           False desactiva el middleware por completo
+    UMBRAL_MS        desde cuántos milisegundos una consulta es lenta
+    INTERVALO_LOG_S  como mucho un log por huella en este intervalo
+    SEGUNDO_PLANO    procesar la cola en un hilo (False: ``procesar_pendientes()``)
+"""
+
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ACTIVO': False,
+    'UMBRAL_MS': 100,
+    'INTERVALO_LOG_S': 60,
+    'SEGUNDO_PLANO': True,
+}
+
+PREFIJO_EXPLAIN = {
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+# vista que está ejecutando la consulta
+vista_actual = ContextVar('vista_actual', default=None)
+
+_cola = queue.Queue(maxsize=1000)
+_lock = threading.Lock()
+_reporte = {}
+_ultimo_log = {}
+_descartadas = 0
+
+_LISTA_PARAMS = re.compile(r'\((?:%s, )+%s\)')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_ESPACIOS = re.compile(r'\s+')
+
+
+def configuracion() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'CONSULTAS_LENTAS', {})}
+
+
+def huella(sql: str) -> tuple:
+    """
+    Normaliza el SQL para agrupar consultas iguales con distintos valores.
+
+    ``IN (%s, %s, %s)`` queda como ``IN (...)`` y los literales como ``?``.
+
+    Returns:
+        tuple: (SQL normalizado, huella de 12 caracteres)
+    """
+    normalizado = _LISTA_PARAMS.sub('(...)', sql)
+    normalizado = _LITERALES.sub('?', normalizado)
+    normalizado = _ESPACIOS.sub(' ', normalizado).strip()
+    return normalizado, hashlib.sha1(normalizado.encode('utf-8')).hexdigest()[:12]
+
+
+def huella_parametros(params) -> str:
+    # solo tipos y cantidad: los valores pueden ser datos personales
+    if params is None:
+        return '-'
+    if isinstance(params, dict):
+        forma = sorted((k, type(v).__name__) for k, v in params.items())
+    else:
+        forma = [type(v).__name__ for v in params]
+    return hashlib.sha1(repr(forma).encode('utf-8')).hexdigest()[:12]
+
+
+def crear_wrapper(umbral_ms: float):
+    def wrapper(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            if duracion_ms >= umbral_ms:
+                encolar(context['connection'].alias, sql, params, many, duracion_ms)
+    return wrapper
+
+
+def encolar(alias, sql, params, many, duracion_ms) -> None:
+    global _descartadas
+    try:
+        _cola.put_nowait((alias, sql, params, many, duracion_ms, vista_actual.get()))
+    except queue.Full:
+        # nunca bloquear el request por el log
+        with _lock:
+            _descartadas += 1
+
+
+def explicar(alias: str, sql: str, params) -> str:
+    conexion = connections[alias]
+    prefijo = PREFIJO_EXPLAIN.get(conexion.vendor)
+    if prefijo is None:
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute(prefijo + sql, params)
+        return '\n'.join(' '.join(str(columna) for columna in fila) for fila in cursor.fetchall())
+
+
+def procesar(alias, sql, params, many, duracion_ms, vista, config) -> None:
+    normalizado, clave = huella(sql)
+    with _lock:
+        datos = _reporte.setdefault(clave, {
+            'sql': normalizado, 'parametros': huella_parametros(params if not many else None),
+            'cantidad': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'vistas': set(), 'plan': None,
+        })
+        datos['cantidad'] += 1
+        datos['total_ms'] += duracion_ms
+        datos['max_ms'] = max(datos['max_ms'], duracion_ms)
+        if vista:
+            datos['vistas'].add(vista)
+        necesita_plan = datos['plan'] is None and not many and normalizado.upper().startswith('SELECT')
+        ahora = time.monotonic()
+        registrar = ahora - _ultimo_log.get(clave, -config['INTERVALO_LOG_S']) >= config['INTERVALO_LOG_S']
+        if registrar:
+            _ultimo_log[clave] = ahora
+
+    if necesita_plan:
+        try:
+            plan = explicar(alias, sql, params)
+        except Exception:
+            logger.exception("No se pudo obtener el EXPLAIN de %s", clave)
+            plan = ''
+        with _lock:
+            datos['plan'] = plan
+
+    if registrar:
+        logger.warning(
+            "Consulta lenta %s (%.1f ms) en %s: %s",
+            clave, duracion_ms, vista or '-', normalizado,
+        )
+
+
+def procesar_pendientes(config=None) -> None:
+    """Vacía la cola en el hilo actual."""
+    config = config or configuracion()
+    while True:
+        try:
+            item = _cola.get_nowait()
+        except queue.Empty:
+            return
+        procesar(*item, config)
+
+
+def _trabajador(config) -> None:
+    while True:
+        item = _cola.get()
+        try:
+            procesar(*item, config)
+        except Exception:
+            logger.exception("Error procesando una consulta lenta")
+        finally:
+            # este hilo no atiende requests: sus conexiones no las cierra nadie más
+            connections.close_all()
+
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar_trabajador(config) -> None:
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_trabajador, args=(config,), name='consultas-lentas', daemon=True)
+            _hilo.start()
+
+
+def obtener_reporte() -> dict:
+    """Huellas ordenadas por tiempo total, de la más costosa a la menos."""
+    with _lock:
+        huellas = [
+            {
+                'huella': clave,
+                'sql': datos['sql'],
+                'parametros': datos['parametros'],
+                'cantidad': datos['cantidad'],
+                'total_ms': round(datos['total_ms'], 3),
+                'max_ms': round(datos['max_ms'], 3),
+                'promedio_ms': round(datos['total_ms'] / datos['cantidad'], 3),
+                'vistas': sorted(datos['vistas']),
+                'plan': datos['plan'],
+            }
+            for clave, datos in _reporte.items()
+        ]
+        descartadas = _descartadas
+    huellas.sort(key=lambda h: h['total_ms'], reverse=True)
+    return {'descartadas': descartadas, 'huellas': huellas}
+
+
+def reiniciar() -> None:
+    global _descartadas
+    with _lock:
+        _reporte.clear()
+        _ultimo_log.clear()
+        _descartadas = 0
@@ -0,0 +1,126 @@
+"""
+Carga masiva de créditos aprobados.
+
+Los trabajos de publicación de notas suman créditos a muchos estudiantes a la
+vez. En lugar de leer, sumar y guardar cada perfil (lento y con condiciones
+de carrera), cada bloque se aplica con un único ``UPDATE`` con
+``F('creditos_aprobados') + delta`` y el resultado se limita en SQL a
+``[0, creditos_para_graduarse]``. Todo corre en una sola transacción: o se
+aplica la carga completa o nada. Con sharding es una transacción por shard.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest, Least
+
+from . import cambios, sharding
+from .models import Usuario, PerfilUniversitario
+
+CHUNK_SIZE = 500
+
+
+def _resolver_perfiles(movimientos, chunk_size: int) -> dict:
+    # (campo, valor) -> (shard, perfil id, usuario id, email)
+    claves = {'usuario': set(), 'email': set()}
+    for movimiento in movimientos:
+        campo = 'usuario' if 'usuario' in movimiento else 'email'
+        claves[campo].add(movimiento[campo])
+
+    perfiles = {}
+
+    def consultar(alias, campo, valores):
+        filtro = 'usuario_id__in' if campo == 'usuario' else 'usuario__email__in'
+        for inicio in range(0, len(valores), chunk_size):
+            bloque = valores[inicio:inicio + chunk_size]
+            for perfil_id, usuario_id, email in PerfilUniversitario.objects.using(alias).filter(
+                    **{filtro: bloque}).values_list('pk', 'usuario_id', 'usuario__email'):
+                perfiles[(campo, usuario_id if campo == 'usuario' else email)] = (alias, perfil_id, usuario_id, email)
+
+    respaldo = sharding.activo() and sharding.configuracion()['RESPALDO']
+    for campo, shard_de in (('usuario', sharding.shard_de_id), ('email', sharding.shard_de_email)):
+        for alias, valores in sharding.agrupar(sorted(claves[campo]), shard_de).items():
+            consultar(alias, campo, valores)
+        if respaldo:
+            # usuarios anteriores al sharding cuyo email no apunta a su shard
+            for alias in sharding.shards():
+                faltantes = [v for v in claves[campo] if (campo, v) not in perfiles and shard_de(v) != alias]
+                consultar(alias, campo, faltantes)
+    return perfiles
+
+
+def sumar_creditos(movimientos, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Suma ``delta`` créditos a cada perfil universitario indicado.
+
+    Args:
+        movimientos: Diccionarios con ``usuario`` (id) o ``email`` y ``delta``.
+            Varios movimientos del mismo usuario se suman en uno.
+        chunk_size: Perfiles por ``UPDATE``.
+
+    Returns:
+        dict: ``aplicados`` (cantidad de perfiles actualizados), ``recortados``
+        (perfiles cuyo total se limitó a ``[0, creditos_para_graduarse]``) y
+        ``rechazados`` (movimientos sin usuario o sin perfil universitario).
+    """
+    movimientos = [
+        {**movimiento, 'email': Usuario.objects.normalize_email(movimiento['email'])}
+        if 'email' in movimiento else movimiento
+        for movimiento in movimientos
+    ]
+    perfiles = _resolver_perfiles(movimientos, chunk_size)
+
+    deltas = {}
+    datos = {}
+    rechazados = []
+    for movimiento in movimientos:
+        campo = 'usuario' if 'usuario' in movimiento else 'email'
+        encontrado = perfiles.get((campo, movimiento[campo]))
+        if encontrado is None:
+            rechazados.append({campo: movimiento[campo], 'motivo': "Usuario sin perfil universitario."})
+            continue
+        alias, perfil_id, usuario_id, email = encontrado
+        # los ids de perfil son propios de cada shard
+        deltas.setdefault(alias, {})
+        deltas[alias][perfil_id] = deltas[alias].get(perfil_id, 0) + movimiento['delta']
+        datos[(alias, perfil_id)] = (usuario_id, email)
+
+    recortados = []
+    aplicados = 0
+    for alias, deltas_shard in deltas.items():
+        aplicados += len(deltas_shard)
+        recortados += _aplicar(alias, deltas_shard, datos, chunk_size)
+    return {'aplicados': aplicados, 'recortados': recortados, 'rechazados': rechazados}
+
+
+def _aplicar(alias: str, deltas: dict, datos: dict, chunk_size: int) -> list:
+    recortados = []
+    ids = sorted(deltas)
+    with transaction.atomic(using=alias):
+        for inicio in range(0, len(ids), chunk_size):
+            bloque = ids[inicio:inicio + chunk_size]
+            # se bloquean en orden de id: dos cargas a la vez no se interbloquean
+            actuales = PerfilUniversitario.objects.using(alias).select_for_update() \
+                .filter(pk__in=bloque).order_by('pk') \
+                .values_list('pk', 'creditos_aprobados', 'creditos_para_graduarse')
+            for perfil_id, creditos, tope in actuales:
+                delta = deltas[perfil_id]
+                resultado = min(max(creditos + delta, 0), tope)
+                if resultado != creditos + delta:
+                    usuario_id, email = datos[(alias, perfil_id)]
+                    recortados.append({
+                        'usuario': usuario_id, 'email': email, 'delta': delta,
+                        'aplicado': resultado - creditos, 'creditos_aprobados': resultado,
+                    })
+
+            suma = Case(
+                *[When(pk=perfil_id, then=Value(deltas[perfil_id])) for perfil_id in bloque],
+                output_field=IntegerField(),
+            )
+            PerfilUniversitario.objects.using(alias).filter(pk__in=bloque).update(
+                creditos_aprobados=Least(
+                    Greatest(F('creditos_aprobados') + suma, Value(0)),
+                    F('creditos_para_graduarse'),
+                )
+            )
+            cambios.registrar(PerfilUniversitario, bloque, using=alias)
+    return recortados
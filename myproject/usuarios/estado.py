@@ -0,0 +1,58 @@
+"""
+Consulta masiva de estado de usuarios para servicios internos.
+
+Responde "¿tiene tipo_estudiante y qué perfil existe?" para miles de ids o
+emails con una consulta con join por bloque, en formato columnar. Con
+sharding cada clave se busca en su shard y las que no aparecen ahí (usuarios
+anteriores al sharding) en los demás.
+"""
+
+from . import sharding
+from .models import Usuario
+
+CHUNK_SIZE = 500
+
+CAMPOS = ('id', 'email', 'tipo_estudiante', 'perfil_universitario__id', 'perfil_secundaria__id')
+
+
+def estado_usuarios(ids=None, emails=None) -> dict:
+    """
+    Devuelve el estado de los usuarios pedidos en columnas paralelas.
+
+    Las columnas siguen el orden de la petición; los que no existen van en
+    ``no_encontrados``. ``perfil`` es ``'U'``, ``'C'`` o ``None``.
+    """
+    if ids is not None:
+        campo, claves = 'id', list(dict.fromkeys(ids))
+    else:
+        campo, claves = 'email', list(dict.fromkeys(Usuario.objects.normalize_email(e) for e in emails))
+
+    filas = {}
+
+    def consultar(alias, pendientes):
+        for inicio in range(0, len(pendientes), CHUNK_SIZE):
+            bloque = pendientes[inicio:inicio + CHUNK_SIZE]
+            for fila in Usuario.objects.using(alias).filter(**{f'{campo}__in': bloque}).values_list(*CAMPOS):
+                filas[fila[0] if campo == 'id' else fila[1]] = fila
+
+    shard_de = sharding.shard_de_id if campo == 'id' else sharding.shard_de_email
+    for alias, pendientes in sharding.agrupar(claves, shard_de).items():
+        consultar(alias, pendientes)
+    if sharding.activo() and sharding.configuracion()['RESPALDO']:
+        faltantes = [clave for clave in claves if clave not in filas]
+        for alias in sharding.shards():
+            consultar(alias, [clave for clave in faltantes if shard_de(clave) != alias])
+            faltantes = [clave for clave in faltantes if clave not in filas]
+
+    resultado = {'id': [], 'email': [], 'tipo_estudiante': [], 'perfil': [], 'no_encontrados': []}
+    for clave in claves:
+        fila = filas.get(clave)
+        if fila is None:
+            resultado['no_encontrados'].append(clave)
+            continue
+        usuario_id, email, tipo_estudiante, perfil_universitario, perfil_secundaria = fila
+        resultado['id'].append(usuario_id)
+        resultado['email'].append(email)
+        resultado['tipo_estudiante'].append(tipo_estudiante)
+        resultado['perfil'].append('U' if perfil_universitario else 'C' if perfil_secundaria else None)
+    return resultado
@@ -0,0 +1,177 @@
+"""
+Prueba de estrés de las escrituras que compiten por una restricción única.
+
+Varios procesos mandan a la vez los mismos payloads a:
+
+1. ``registro/``: todos registran los mismos emails, cada proceso en otro
+   orden. Por email debe salir un 201 y el resto 400.
+2. ``perfil-universitario/``: todos crean el perfil de los mismos usuarios.
+   Por usuario debe salir un 201 y el resto 409.
+
+Ninguna respuesta puede ser 5xx y al final se revisa en la BD que haya un
+usuario por email y un perfil por usuario. Los procesos se crean con
+``fork`` y cada uno abre su propia conexión, así que la BD tiene que ser
+compartida entre procesos (Postgres o SQLite en archivo, no ``:memory:``).
+SQLite serializa las escrituras y bajo mucha concurrencia puede responder
+"database is locked"; los números que interesan son los de Postgres.
+
+Los requests pasan por la pila completa (middleware, vistas, serializers)
+con ``APIClient``, sin red de por medio.
+"""
+
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import sharding
+from .models import Usuario, PerfilUniversitario
+
+PASSWORD = 'Abc123!@'
+DOMINIO = 'estres.test'
+
+# hasher barato para que la prueba mida la BD y no PBKDF2; con --hash-real se usa el configurado
+HASHERS_RAPIDOS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# segundos que espera cada proceso a los demás antes de arrancar una fase
+ESPERA_BARRERA_S = 60
+
+
+def emails_de_prueba(n: int, dominio: str = DOMINIO) -> list:
+    return [f'estres{i}@{dominio}' for i in range(n)]
+
+
+def _registro(email: str) -> dict:
+    return {
+        'nombre': 'Carga', 'apellido': 'Prueba', 'edad': 20, 'genero': 'O',
+        'email': email, 'password': PASSWORD,
+    }
+
+
+def _perfil() -> dict:
+    return {
+        'universidad': 'Universidad Nacional', 'carrera': 'Ingeniería de Sistemas',
+        'total_semestres': 10, 'semestre_actual': 1, 'creditos_para_graduarse': 160,
+    }
+
+
+def _usuarios(emails: list) -> list:
+    return [u for alias in sharding.shards() for u in Usuario.objects.using(alias).filter(email__in=emails)]
+
+
+def _trabajador(numero, tareas, barrera, cola, hash_rapido):
+    # las conexiones heredadas del padre no se comparten: cada proceso abre la suya
+    connections.close_all()
+    ajustes = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+    if hash_rapido:
+        ajustes['PASSWORD_HASHERS'] = HASHERS_RAPIDOS
+    cliente = APIClient(raise_request_exception=False)
+    tareas = list(tareas)
+    random.Random(numero).shuffle(tareas)
+    estados = Counter()
+    try:
+        with override_settings(**ajustes):
+            barrera.wait(ESPERA_BARRERA_S)
+            inicio = time.perf_counter()
+            for url, datos, token in tareas:
+                cliente.credentials(**({'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}))
+                estados[cliente.post(url, datos, format='json').status_code] += 1
+            cola.put((numero, dict(estados), time.perf_counter() - inicio))
+    finally:
+        connections.close_all()
+
+
+def _correr_fase(procesos: int, tareas: list, hash_rapido: bool) -> dict:
+    contexto = multiprocessing.get_context('fork')
+    barrera = contexto.Barrier(procesos)
+    cola = contexto.Queue()
+    # sin conexiones abiertas al hacer fork
+    connections.close_all()
+    hijos = [
+        contexto.Process(target=_trabajador, args=(numero, tareas, barrera, cola, hash_rapido))
+        for numero in range(procesos)
+    ]
+    for hijo in hijos:
+        hijo.start()
+    # la cola se vacía antes del join, si no un hijo con datos pendientes no termina
+    resultados = [cola.get() for _ in hijos]
+    for hijo in hijos:
+        hijo.join()
+
+    estados = Counter()
+    for _, parcial, _ in resultados:
+        estados.update(parcial)
+    total = sum(estados.values())
+    segundos = max(duracion for _, _, duracion in resultados)
+    errores = sum(n for codigo, n in estados.items() if codigo >= 500)
+    return {
+        'requests': total,
+        'segundos': round(segundos, 3),
+        'requests_por_s': round(total / segundos, 1) if segundos else None,
+        'estados': dict(sorted(estados.items())),
+        'errores_5xx': errores,
+        'tasa_error_pct': round(errores * 100 / total, 2) if total else 0.0,
+    }
+
+
+def limpiar(emails: list) -> int:
+    """Borra los usuarios de la prueba (y sus perfiles) de todos los shards."""
+    borrados = 0
+    for alias in sharding.shards():
+        borrados += Usuario.objects.using(alias).filter(email__in=emails).delete()[1].get(
+            Usuario._meta.label, 0
+        )
+    return borrados
+
+
+def estresar(procesos: int = 8, emails: int = 50, hash_rapido: bool = True,
+             dominio: str = DOMINIO, conservar: bool = False) -> dict:
+    """
+    Corre las dos fases y devuelve sus métricas y las invariantes violadas.
+
+    Args:
+        procesos: Procesos que compiten por cada payload.
+        emails: Emails distintos; cada proceso manda todos.
+        hash_rapido: Hashear con MD5 en lugar del hasher configurado.
+        conservar: No borrar los usuarios creados al terminar.
+
+    Returns:
+        ``{'registro': {...}, 'perfil': {...}, 'violaciones': [...]}``
+    """
+    pool = emails_de_prueba(emails, dominio)
+    limpiar(pool)
+    try:
+        url = reverse('registro')
+        registro = _correr_fase(procesos, [(url, _registro(email), None) for email in pool], hash_rapido)
+
+        usuarios = _usuarios(pool)
+        for usuario in usuarios:
+            usuario.tipo_estudiante = 'U'
+            usuario.save(update_fields=['tipo_estudiante'])
+        url = reverse('perfil-universitario')
+        tareas = [(url, _perfil(), str(RefreshToken.for_user(u).access_token)) for u in usuarios]
+        perfil = _correr_fase(procesos, tareas, hash_rapido)
+
+        violaciones = []
+        por_email = Counter(u.email for u in _usuarios(pool))
+        violaciones += [f'{email}: {n} usuarios' for email, n in sorted(por_email.items()) if n != 1]
+        violaciones += [f'{email}: sin usuario' for email in pool if email not in por_email]
+        for usuario in usuarios:
+            n = PerfilUniversitario.objects.using(usuario._state.db).filter(usuario=usuario).count()
+            if n != 1:
+                violaciones.append(f'{usuario.email}: {n} perfiles universitarios')
+        if registro['estados'].get(201) != len(pool):
+            violaciones.append(f"registro: {registro['estados'].get(201, 0)} altas para {len(pool)} emails")
+        if perfil['estados'].get(201) != len(usuarios):
+            violaciones.append(f"perfil: {perfil['estados'].get(201, 0)} altas para {len(usuarios)} usuarios")
+    finally:
+        if not conservar:
+            limpiar(pool)
+    return {'registro': registro, 'perfil': perfil, 'violaciones': violaciones}
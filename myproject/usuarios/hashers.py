@@ -0,0 +1,156 @@
+"""
+Hashers de contraseñas con costo calibrado para este servidor.
+
+El número de iteraciones de PBKDF2 se lee del archivo generado por
+``manage.py calibrar_hash`` (ver ``settings.PASSWORD_HASHER_CONFIG``). Si el
+archivo no existe se usa el valor por defecto de Django, que es también el
+mínimo: la calibración solo puede subir el costo, y un hash existente nunca
+se rehashea a menos iteraciones de las que ya tiene.
+
+También lleva métricas de tiempo por hasher para poder revisar la latencia
+real de hashing en producción.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, must_update_salt
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Nunca bajamos del default de Django aunque el servidor sea lento
+MIN_ITERATIONS = PBKDF2PasswordHasher.iterations
+
+
+@lru_cache(maxsize=1)
+def cargar_configuracion() -> dict:
+    """
+    Lee la configuración de hashing escrita por ``calibrar_hash``.
+
+    Returns:
+        dict: Configuración calibrada, o un dict vacío si no hay archivo.
+    """
+    ruta = getattr(settings, 'PASSWORD_HASHER_CONFIG', None)
+    if not ruta:
+        return {}
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        logger.exception("No se pudo leer la configuración de hashing en %s", ruta)
+        return {}
+
+
+@receiver(setting_changed)
+def limpiar_configuracion(*, setting, **kwargs):
+    if setting == 'PASSWORD_HASHER_CONFIG':
+        cargar_configuracion.cache_clear()
+
+
+# ========== Métricas de tiempo ==========
+
+_metricas_lock = threading.Lock()
+_metricas = {}
+
+
+def registrar_tiempo(algoritmo: str, duracion_ms: float) -> None:
+    """Acumula una medición de hashing para el algoritmo indicado."""
+    with _metricas_lock:
+        metrica = _metricas.setdefault(
+            algoritmo, {'llamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        )
+        metrica['llamadas'] += 1
+        metrica['total_ms'] += duracion_ms
+        metrica['max_ms'] = max(metrica['max_ms'], duracion_ms)
+
+
+def obtener_metricas() -> dict:
+    """Devuelve una copia de las métricas con el promedio por algoritmo."""
+    with _metricas_lock:
+        resultado = {}
+        for algoritmo, metrica in _metricas.items():
+            resultado[algoritmo] = {
+                'llamadas': metrica['llamadas'],
+                'total_ms': round(metrica['total_ms'], 3),
+                'max_ms': round(metrica['max_ms'], 3),
+                'promedio_ms': round(metrica['total_ms'] / metrica['llamadas'], 3),
+            }
+        return resultado
+
+
+def reiniciar_metricas() -> None:
+    with _metricas_lock:
+        _metricas.clear()
+
+
+class PBKDF2CalibradoPasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 con iteraciones calibradas para el hardware del servidor.
+
+    Mantiene el mismo ``algorithm`` que el hasher de Django, así que los
+    hashes existentes siguen verificando y se actualizan solos al hacer login.
+    """
+
+    @property
+    def iterations(self):
+        # un archivo viejo o editado a mano tampoco baja del mínimo
+        return max(MIN_ITERATIONS, cargar_configuracion().get('iteraciones', MIN_ITERATIONS))
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        # solo hacia arriba: un hash más fuerte que la configuración actual se conserva
+        return decoded['iterations'] < self.iterations or must_update_salt(decoded['salt'], self.salt_entropy)
+
+    def encode(self, password, salt, iterations=None):
+        inicio = time.perf_counter()
+        try:
+            return super().encode(password, salt, iterations)
+        finally:
+            registrar_tiempo(self.algorithm, (time.perf_counter() - inicio) * 1000)
+
+
+# ========== Rehash en segundo plano ==========
+
+# un solo hilo: el rehash es CPU intensivo y no debe competir con los logins
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+
+
+def _rehash(usuario_id: int, hash_anterior: str, password: str, alias: str = 'default') -> None:
+    # import local para evitar importar modelos al cargar los hashers
+    from .models import Usuario
+
+    try:
+        nuevo_hash = make_password(password)
+        # solo actualizamos si nadie cambió la contraseña mientras tanto
+        Usuario.objects.using(alias).filter(pk=usuario_id, password=hash_anterior).update(password=nuevo_hash)
+    except Exception:
+        logger.exception("Falló el rehash de la contraseña del usuario %s", usuario_id)
+    finally:
+        if getattr(settings, 'REHASH_EN_SEGUNDO_PLANO', True):
+            connections[alias].close()
+
+
+def programar_rehash(usuario, password: str) -> None:
+    """
+    Vuelve a hashear la contraseña con los parámetros actuales.
+
+    Se usa como ``setter`` de ``check_password``: Django solo lo llama cuando
+    la contraseña es correcta y el hash quedó desactualizado. Por defecto
+    corre en un hilo aparte para que el login no espere. Con sharding se
+    escribe en la BD de la que salió el usuario.
+    """
+    alias = usuario._state.db or 'default'
+    if getattr(settings, 'REHASH_EN_SEGUNDO_PLANO', True):
+        _executor.submit(_rehash, usuario.pk, usuario.password, password, alias)
+    else:
+        _rehash(usuario.pk, usuario.password, password, alias)
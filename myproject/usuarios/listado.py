@@ -0,0 +1,44 @@
+"""
+Listado paginado de usuarios para staff.
+
+Pagina por id (``id > desde``) en lugar de ``OFFSET``: cada página cuesta lo
+mismo sin importar cuán adelante esté. Con sharding cada shard devuelve sus
+primeros ``limite`` usuarios después del cursor y se mezclan en orden de id,
+así una página nunca lee más de ``limite + 1`` filas por shard.
+"""
+
+from django.db.models import Q
+
+from . import sharding
+from .models import Usuario
+
+LIMITE = 50
+MAX_LIMITE = 500
+
+CAMPOS = ('id', 'email', 'nombre', 'apellido', 'edad', 'genero', 'tipo_estudiante', 'is_active', 'is_staff')
+
+
+def listar_usuarios(desde: int = 0, limite: int = LIMITE, tipo_estudiante: str = None, activo: bool = None) -> dict:
+    """
+    Devuelve los usuarios con id mayor a ``desde``, en orden de id.
+
+    Returns:
+        dict: ``usuarios``, ``cursor`` (pasarlo como ``desde`` en la siguiente
+        llamada) y ``hay_mas``.
+    """
+    filtro = Q(pk__gt=desde)
+    if tipo_estudiante is not None:
+        filtro &= Q(tipo_estudiante=tipo_estudiante)
+    if activo is not None:
+        filtro &= Q(is_active=activo)
+
+    filas = sharding.fan_out_ordenado(
+        lambda alias: Usuario.objects.using(alias).filter(filtro).values(*CAMPOS), 'id', limite + 1
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    return {
+        'usuarios': filas,
+        'cursor': filas[-1]['id'] if filas else desde,
+        'hay_mas': hay_mas,
+    }
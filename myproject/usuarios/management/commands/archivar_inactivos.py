@@ -0,0 +1,84 @@
+"""
+Archiva a disco y borra los usuarios inactivos, o los restaura.
+
+Uso:
+    python manage.py archivar_inactivos --dry-run
+    python manage.py archivar_inactivos --salida archivo/inactivos.ndjson.gz --filas-por-segundo 2000
+    python manage.py archivar_inactivos --restaurar archivo/inactivos.ndjson.gz
+
+Si se interrumpe, basta con volver a correrlo: los usuarios ya borrados no
+se repiten y restaurar ignora las líneas duplicadas. Con sharding se archiva
+cada shard por turno en el mismo archivo.
+"""
+
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from usuarios import sharding
+from usuarios.archivo import CHUNK_SIZE, archivar_inactivos, restaurar_archivo
+from usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = "Mueve los usuarios inactivos y sus perfiles a un archivo NDJSON comprimido."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default=None,
+                            help="Archivo .ndjson.gz (default archivo/inactivos-<fecha>.ndjson.gz).")
+        parser.add_argument('--chunk', type=int, default=CHUNK_SIZE,
+                            help=f"Usuarios por transacción (default {CHUNK_SIZE}).")
+        parser.add_argument('--filas-por-segundo', type=float, default=None,
+                            help="Límite de velocidad para no saturar la BD.")
+        parser.add_argument('--sin-login-dias', type=int, default=None,
+                            help="Solo usuarios sin login en los últimos N días.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta, no escribe ni borra.")
+        parser.add_argument('--restaurar', metavar='ARCHIVO', default=None,
+                            help="Restaura los usuarios de un archivo generado antes.")
+
+    def handle(self, *args, **options):
+        if options['chunk'] < 1:
+            raise CommandError("--chunk debe ser al menos 1")
+        if options['filas_por_segundo'] is not None and options['filas_por_segundo'] <= 0:
+            raise CommandError("--filas-por-segundo debe ser mayor a 0")
+
+        if options['restaurar']:
+            if not os.path.exists(options['restaurar']):
+                raise CommandError(f"No existe {options['restaurar']}")
+            resultado = restaurar_archivo(options['restaurar'], chunk_size=options['chunk'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{resultado['restaurados']} restaurados, {resultado['existentes']} ya existían, "
+                f"{resultado['conflictos']} con email en uso"
+            ))
+            return
+
+        filtro = Q()
+        if options['sin_login_dias'] is not None:
+            limite = timezone.now() - timedelta(days=options['sin_login_dias'])
+            filtro = Q(last_login__isnull=True) | Q(last_login__lt=limite)
+
+        salida = options['salida']
+        if salida is None:
+            fecha = timezone.now().strftime('%Y%m%d-%H%M%S')
+            salida = os.path.join(settings.BASE_DIR, 'archivo', f'inactivos-{fecha}.ndjson.gz')
+        if not options['dry_run']:
+            os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+
+        total = 0
+        for alias in sharding.shards():
+            total += archivar_inactivos(
+                salida,
+                queryset=Usuario.objects.using(alias).filter(filtro),
+                chunk_size=options['chunk'],
+                filas_por_segundo=options['filas_por_segundo'],
+                dry_run=options['dry_run'],
+                al_terminar_chunk=lambda n, previos=total: self.stdout.write(f"{previos + n} archivados", ending='\r'),
+            )
+        if options['dry_run']:
+            self.stdout.write(f"[dry-run] {total} usuarios inactivos por archivar")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"\n{total} usuarios archivados en {salida}"))
@@ -0,0 +1,107 @@
+"""
+Avanza el semestre/periodo de todos los estudiantes al cierre del periodo.
+
+Uso:
+    python manage.py avanzar_periodo --dry-run
+    python manage.py avanzar_periodo
+    python manage.py avanzar_periodo --reanudar   # tras una corrida interrumpida
+
+El avance de cada modelo se guarda en ``AvancePeriodo`` en la misma
+transacción que cada bloque (ver ``usuarios.periodos``), así reanudar nunca
+repite un bloque ya confirmado. Con sharding se procesa cada shard por
+turno y cada shard guarda su propio avance.
+
+Una corrida nueva crea al empezar las filas de todos los (shard, modelo) sin
+terminar y con el mismo id de corrida, así un corte entre modelos o entre
+shards deja la corrida incompleta y no se confunde con una terminada.
+"""
+
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from usuarios import sharding
+from usuarios.models import AvancePeriodo, PerfilUniversitario, PerfilSecundaria
+from usuarios.periodos import CHUNK_SIZE, avanzar_periodo
+
+MODELOS = {
+    'universitario': PerfilUniversitario,
+    'secundaria': PerfilSecundaria,
+}
+
+
+class Command(BaseCommand):
+    help = "Avanza un periodo a todos los perfiles y marca como finalizados a los que terminan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=[*MODELOS, 'todos'], default='todos')
+        parser.add_argument('--chunk', type=int, default=CHUNK_SIZE,
+                            help=f"Filas por transacción (default {CHUNK_SIZE}).")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta, no modifica nada.")
+        parser.add_argument('--reanudar', action='store_true',
+                            help="Continúa una corrida interrumpida.")
+
+    def handle(self, *args, **options):
+        if options['chunk'] < 1:
+            raise CommandError("--chunk debe ser al menos 1")
+
+        dry_run = options['dry_run']
+        nombres = list(MODELOS) if options['modelo'] == 'todos' else [options['modelo']]
+        aliases = sharding.shards()
+        avances = {
+            alias: {avance.modelo: avance for avance in AvancePeriodo.objects.using(alias).filter(modelo__in=nombres)}
+            for alias in aliases
+        }
+        # la corrida termina cuando todas sus filas, creadas al empezar, están terminadas
+        pendientes = [
+            avance for por_alias in avances.values() for avance in por_alias.values() if not avance.terminado
+        ]
+        incompleta = bool(pendientes)
+        corrida = None
+        if not dry_run:
+            if incompleta and not options['reanudar']:
+                # sin esto una segunda corrida avanzaría dos veces a los ya procesados
+                raise CommandError("Hay una corrida incompleta. Usa --reanudar para terminarla.")
+            if options['reanudar'] and not incompleta:
+                raise CommandError("No hay una corrida incompleta para reanudar")
+            if options['reanudar']:
+                corrida = max(pendientes, key=lambda avance: avance.actualizado).corrida
+            else:
+                corrida = uuid.uuid4().hex
+                for alias in aliases:
+                    with transaction.atomic(using=alias):
+                        AvancePeriodo.objects.using(alias).filter(modelo__in=nombres).delete()
+                        avances[alias] = {
+                            avance.modelo: avance for avance in AvancePeriodo.objects.using(alias).bulk_create(
+                                [AvancePeriodo(modelo=nombre, corrida=corrida) for nombre in nombres]
+                            )
+                        }
+
+        prefijo = "[dry-run] " if dry_run else ""
+        for alias in aliases:
+            for nombre in nombres:
+                clave = nombre if aliases == ['default'] else f'{nombre}@{alias}'
+                avance = avances[alias].get(nombre)
+                if not dry_run and (avance is None or avance.corrida != corrida):
+                    # la corrida se cortó antes de crear la fila de este par: no se avanzó nada
+                    avance, _ = AvancePeriodo.objects.using(alias).update_or_create(
+                        modelo=nombre, defaults={'ultimo_pk': 0, 'terminado': False, 'corrida': corrida},
+                    )
+                if avance is not None and avance.terminado and not dry_run:
+                    self.stdout.write(f"{clave}: ya estaba terminado")
+                    continue
+                resultado = avanzar_periodo(
+                    MODELOS[nombre],
+                    chunk_size=options['chunk'],
+                    desde_pk=avance.ultimo_pk if avance is not None and not dry_run else 0,
+                    dry_run=dry_run,
+                    using=alias,
+                    checkpoint=nombre,
+                )
+                self.stdout.write(
+                    f"{prefijo}{clave}: {resultado['avanzados']} avanzados, "
+                    f"{resultado['finalizados']} finalizados"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Listo"))
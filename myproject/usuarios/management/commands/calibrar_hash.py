@@ -0,0 +1,85 @@
+"""
+Calibra las iteraciones de PBKDF2 para este servidor.
+
+Uso:
+    python manage.py calibrar_hash --objetivo-ms 250
+"""
+
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.hashers import MIN_ITERATIONS, cargar_configuracion
+
+ITERACIONES_MUESTRA = 100_000
+REDONDEO = 10_000
+
+
+class Command(BaseCommand):
+    help = "Mide el costo de PBKDF2 en este servidor y escribe la configuración del hasher."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objetivo-ms', type=float, default=250.0,
+                            help="Latencia objetivo de un hash en milisegundos (default 250).")
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help="Número de mediciones; se usa la mediana.")
+        parser.add_argument('--salida', default=None,
+                            help="Archivo de configuración (default settings.PASSWORD_HASHER_CONFIG).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo muestra el resultado, no escribe el archivo.")
+
+    def medir(self, iteraciones: int, repeticiones: int) -> float:
+        """Mediana en milisegundos de ``repeticiones`` hashes con ``iteraciones``."""
+        hasher = PBKDF2PasswordHasher()
+        salt = hasher.salt()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            hasher.encode('calibracion-Abc123!@', salt, iteraciones)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return tiempos[len(tiempos) // 2]
+
+    def handle(self, *args, **options):
+        objetivo_ms = options['objetivo_ms']
+        repeticiones = options['repeticiones']
+        salida = options['salida'] or getattr(settings, 'PASSWORD_HASHER_CONFIG', None)
+
+        if objetivo_ms <= 0:
+            raise CommandError("--objetivo-ms debe ser mayor a 0")
+        if repeticiones < 1:
+            raise CommandError("--repeticiones debe ser al menos 1")
+        if not salida and not options['dry_run']:
+            raise CommandError("No hay archivo de salida: usa --salida o define PASSWORD_HASHER_CONFIG")
+
+        # PBKDF2 escala lineal con las iteraciones, basta una muestra
+        muestra_ms = self.medir(ITERACIONES_MUESTRA, repeticiones)
+        iteraciones = int(ITERACIONES_MUESTRA * objetivo_ms / muestra_ms)
+        iteraciones = max(MIN_ITERATIONS, iteraciones // REDONDEO * REDONDEO)
+        medido_ms = self.medir(iteraciones, repeticiones)
+
+        configuracion = {
+            'algoritmo': PBKDF2PasswordHasher.algorithm,
+            'iteraciones': iteraciones,
+            'objetivo_ms': objetivo_ms,
+            'medido_ms': round(medido_ms, 3),
+        }
+
+        self.stdout.write(
+            f"{iteraciones} iteraciones -> {medido_ms:.1f} ms (objetivo {objetivo_ms:.1f} ms)"
+        )
+        if iteraciones == MIN_ITERATIONS and medido_ms > objetivo_ms:
+            self.stdout.write(self.style.WARNING(
+                f"El servidor no alcanza el objetivo con el mínimo de {MIN_ITERATIONS} iteraciones"
+            ))
+
+        if options['dry_run']:
+            return
+
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(configuracion, archivo, indent=2)
+        cargar_configuracion.cache_clear()
+        self.stdout.write(self.style.SUCCESS(f"Configuración escrita en {salida}"))
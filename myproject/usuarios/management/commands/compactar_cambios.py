@@ -0,0 +1,30 @@
+"""
+Compacta el feed de cambios.
+
+Borra los cambios más viejos que la retención que ya fueron reemplazados por
+otro cambio del mismo objeto, y los borrados viejos. Pensado para un cron
+diario. Con sharding se compacta el feed de cada shard.
+
+Uso:
+    python manage.py compactar_cambios --dias 30
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios import sharding
+from usuarios.cambios import compactar_cambios, configuracion
+
+
+class Command(BaseCommand):
+    help = "Borra los cambios viejos que ya no aportan al feed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help="Retención en días (default CAMBIOS['RETENCION_DIAS']).")
+
+    def handle(self, *args, **options):
+        dias = options['dias'] if options['dias'] is not None else configuracion()['RETENCION_DIAS']
+        if dias < 0:
+            raise CommandError("--dias no puede ser negativo")
+        total = sum(compactar_cambios(dias, shard=alias) for alias in sharding.shards())
+        self.stdout.write(self.style.SUCCESS(f"{total} cambios borrados"))
@@ -0,0 +1,64 @@
+"""
+Compara snapshots de tracemalloc guardados por el perfil de memoria.
+
+Con ``PERFIL_MEMORIA['DIRECTORIO']`` definido, cada request muestreado deja
+un snapshot (hasta ``MAX_SNAPSHOTS`` por vista, conservando el primero). Este
+comando compara, por vista, el snapshot más viejo con el más nuevo y muestra
+los sitios que más crecieron.
+
+Uso:
+    python manage.py diff_memoria
+    python manage.py diff_memoria --vista login --top 20
+    python manage.py diff_memoria --archivos viejo.tracemalloc nuevo.tracemalloc
+"""
+
+import glob
+import os
+import tracemalloc
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.memoria import configuracion
+
+
+class Command(BaseCommand):
+    help = "Muestra las diferencias entre snapshots de memoria de una misma vista."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directorio', default=None, help="Default PERFIL_MEMORIA['DIRECTORIO'].")
+        parser.add_argument('--vista', default=None, help="Solo la vista indicada.")
+        parser.add_argument('--top', type=int, default=10, help="Sitios por comparación.")
+        parser.add_argument('--archivos', nargs=2, metavar=('VIEJO', 'NUEVO'), default=None,
+                            help="Compara dos snapshots concretos.")
+
+    def handle(self, *args, **options):
+        if options['archivos']:
+            self.comparar(*options['archivos'], options['top'])
+            return
+
+        directorio = options['directorio'] or configuracion()['DIRECTORIO']
+        if not directorio or not os.path.isdir(directorio):
+            raise CommandError("No hay directorio de snapshots: usa --directorio o PERFIL_MEMORIA['DIRECTORIO']")
+
+        por_vista = defaultdict(list)
+        for ruta in sorted(glob.glob(os.path.join(directorio, '*.tracemalloc'))):
+            # nombre: <vista>-<time_ns>.tracemalloc
+            vista, _, marca = os.path.basename(ruta)[:-len('.tracemalloc')].rpartition('-')
+            por_vista[vista].append((int(marca), ruta))
+
+        if options['vista']:
+            por_vista = {options['vista']: por_vista.get(options['vista'], [])}
+        for vista, snapshots in sorted(por_vista.items()):
+            if len(snapshots) < 2:
+                self.stdout.write(f"{vista}: se necesitan al menos 2 snapshots ({len(snapshots)})")
+                continue
+            snapshots.sort()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{vista} ({len(snapshots)} snapshots)"))
+            self.comparar(snapshots[0][1], snapshots[-1][1], options['top'])
+
+    def comparar(self, viejo, nuevo, top):
+        anterior = tracemalloc.Snapshot.load(viejo)
+        actual = tracemalloc.Snapshot.load(nuevo)
+        for estadistica in actual.compare_to(anterior, 'lineno')[:top]:
+            self.stdout.write(f"  {estadistica}")
@@ -0,0 +1,59 @@
+"""
+Estresa el registro y el alta de perfil con payloads que chocan entre sí.
+
+Varios procesos mandan los mismos emails a ``registro/`` y después el mismo
+perfil universitario por usuario (ver ``usuarios.estres``). Informa
+throughput y códigos de respuesta por fase y falla si hubo algún 5xx o si en
+la BD quedó un email repetido o un usuario con más de un perfil.
+
+Corre contra la BD configurada, que tiene que ser compartida entre procesos
+(Postgres o SQLite en archivo). Los usuarios de prueba usan el dominio
+``--dominio`` y se borran al terminar salvo con ``--conservar``.
+
+Uso:
+    python manage.py estres_escrituras --procesos 8 --emails 50
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from usuarios.estres import DOMINIO, estresar
+
+
+class Command(BaseCommand):
+    help = "Registra y crea perfiles en paralelo con payloads repetidos y mide errores."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8, help="Procesos en paralelo (default 8).")
+        parser.add_argument('--emails', type=int, default=50,
+                            help="Emails distintos; cada proceso los manda todos (default 50).")
+        parser.add_argument('--hash-real', action='store_true',
+                            help="Hashear con el hasher configurado en lugar de MD5.")
+        parser.add_argument('--dominio', default=DOMINIO, help=f"Dominio de los emails (default {DOMINIO}).")
+        parser.add_argument('--conservar', action='store_true', help="No borrar los usuarios creados.")
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 2:
+            raise CommandError("--procesos debe ser al menos 2 para que haya choques")
+        if options['emails'] < 1:
+            raise CommandError("--emails debe ser al menos 1")
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError("La BD en memoria no se comparte entre procesos")
+
+        resultado = estresar(
+            procesos=options['procesos'], emails=options['emails'], hash_rapido=not options['hash_real'],
+            dominio=options['dominio'], conservar=options['conservar'],
+        )
+        for fase in ('registro', 'perfil'):
+            datos = resultado[fase]
+            estados = ', '.join(f'{codigo}: {n}' for codigo, n in datos['estados'].items())
+            self.stdout.write(
+                f"{fase:9} {datos['requests']} requests en {datos['segundos']}s "
+                f"({datos['requests_por_s']} req/s) | {estados} | 5xx {datos['tasa_error_pct']}%"
+            )
+        errores = resultado['registro']['errores_5xx'] + resultado['perfil']['errores_5xx']
+        for violacion in resultado['violaciones']:
+            self.stderr.write(f"  {violacion}")
+        if errores or resultado['violaciones']:
+            raise CommandError(f"{errores} respuestas 5xx y {len(resultado['violaciones'])} invariantes violadas")
+        self.stdout.write(self.style.SUCCESS("Sin 5xx y sin duplicados"))
@@ -0,0 +1,62 @@
+"""
+Mide el costo por request de la pila de middleware.
+
+Compara la pila completa (la que corría antes en todas las rutas) con la
+pila por ruta de ``MiddlewarePorRuta``. La vista es un stub que no hace
+nada, así que el tiempo medido es solo middleware.
+
+Uso:
+    python manage.py medir_middleware --requests 20000
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from usuarios.middleware import MiddlewarePorRuta, PilaMiddleware
+
+
+def vista_vacia(request):
+    return HttpResponse('{}', content_type='application/json')
+
+
+class Command(BaseCommand):
+    help = "Compara el overhead por request de la pila completa contra la pila por ruta."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Requests por medición.")
+        parser.add_argument('--ruta', default='/api/login/', help="Ruta a simular (default /api/login/).")
+
+    def medir(self, handler, request, n):
+        inicio = time.perf_counter()
+        for _ in range(n):
+            handler(request)
+        return (time.perf_counter() - inicio) / n * 1_000_000
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        if n < 1:
+            raise CommandError("--requests debe ser al menos 1")
+
+        externos = [m for m in settings.MIDDLEWARE if m != 'usuarios.middleware.MiddlewarePorRuta']
+        antes = PilaMiddleware(externos + settings.MIDDLEWARE_POR_DEFECTO, vista_vacia).handler
+        despues = PilaMiddleware(externos, MiddlewarePorRuta(vista_vacia)).handler
+
+        request = RequestFactory().get(options['ruta'], HTTP_AUTHORIZATION='Bearer x')
+        # el host de RequestFactory es 'testserver'
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            # calentamiento
+            self.medir(antes, request, min(n, 1000))
+            self.medir(despues, request, min(n, 1000))
+
+            us_antes = self.medir(antes, request, n)
+            us_despues = self.medir(despues, request, n)
+        self.stdout.write(f"{options['ruta']} ({n} requests)")
+        self.stdout.write(f"  pila completa:  {us_antes:8.2f} µs/request")
+        self.stdout.write(f"  pila por ruta:  {us_despues:8.2f} µs/request")
+        self.stdout.write(self.style.SUCCESS(
+            f"  ahorro:         {us_antes - us_despues:8.2f} µs/request ({(1 - us_despues / us_antes) * 100:.0f}%)"
+        ))
@@ -0,0 +1,55 @@
+"""
+Mide el costo por request de validar un registro.
+
+Valida el mismo payload válido muchas veces con ``RegistroUsuarioSerializer``
+y descuenta el tiempo de las consultas, que deberían ser cero: la unicidad
+del email la resuelve el insert.
+
+Uso:
+    python manage.py medir_validacion --requests 5000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from usuarios.serializers import RegistroUsuarioSerializer
+
+PAYLOAD = {
+    'nombre': "Juan",
+    'apellido': "Perez",
+    'edad': 20,
+    'genero': "M",
+    'email': "juan@medicion.test",
+    'password': "Abc123!@",
+}
+
+
+class Command(BaseCommand):
+    help = "Mide el tiempo de validar un payload de registro válido."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help="Validaciones a medir.")
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        if n < 1:
+            raise CommandError("--requests debe ser al menos 1")
+
+        # calentamiento
+        for _ in range(min(n, 100)):
+            RegistroUsuarioSerializer(data=PAYLOAD).is_valid()
+
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            for _ in range(n):
+                RegistroUsuarioSerializer(data=PAYLOAD).is_valid()
+            duracion = time.perf_counter() - inicio
+        consultas_s = sum(float(c['time']) for c in consultas.captured_queries)
+        self.stdout.write(f"validación de registro ({n} requests)")
+        self.stdout.write(f"  consultas:  {len(consultas.captured_queries)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"  tiempo:     {(duracion - consultas_s) / n * 1_000_000:8.2f} µs/request"
+        ))
@@ -0,0 +1,119 @@
+"""
+Mide el tiempo de arranque y el costo de import de cada módulo.
+
+Corre un intérprete nuevo con ``python -X importtime`` (en este proceso todo
+ya está importado) y reporta los módulos y paquetes más caros.
+
+Objetivos:
+    setup   solo ``django.setup()``: lo que paga cualquier ``manage.py``
+    urls    setup + URLconf y vistas: lo que paga el primer request
+    wsgi    la aplicación de ``WSGI_APPLICATION``, con su precalentamiento
+
+Uso:
+    python manage.py perfil_arranque --objetivo wsgi --top 30
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+SCRIPTS = {
+    'setup': (
+        "import django\n"
+        "django.setup()\n"
+    ),
+    'urls': (
+        "import django\n"
+        "django.setup()\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    'wsgi': (
+        "from django.core.servers.basehttp import get_internal_wsgi_application\n"
+        "get_internal_wsgi_application()\n"
+    ),
+}
+
+# el tiempo total se mide dentro del hijo, sin contar el arranque del intérprete
+PLANTILLA = (
+    "import json, sys, time\n"
+    "_inicio = time.perf_counter()\n"
+    "{script}"
+    "print(json.dumps({{'total_ms': (time.perf_counter() - _inicio) * 1000}}))\n"
+)
+
+
+def parsear_importtime(salida: str) -> list:
+    """
+    Returns:
+        list: (módulo, self µs, acumulado µs) de cada línea de ``-X importtime``.
+    """
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:'):
+            continue
+        partes = linea[len('import time:'):].split('|')
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            # encabezado
+            continue
+        modulos.append((partes[2].strip(), int(partes[0]), int(partes[1])))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = "Reporta el tiempo de import por módulo al arrancar Django."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objetivo', choices=list(SCRIPTS), default='urls')
+        parser.add_argument('--top', type=int, default=20, help="Cantidad de módulos a mostrar.")
+        parser.add_argument('--json', action='store_true', help="Salida en JSON.")
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError("--top debe ser al menos 1")
+
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(p for p in sys.path if p)}
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PLANTILLA.format(script=SCRIPTS[options['objetivo']])],
+            env=env, capture_output=True, text=True,
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+
+        total_ms = json.loads(proceso.stdout.strip().splitlines()[-1])['total_ms']
+        modulos = parsear_importtime(proceso.stderr)
+        paquetes = {}
+        for modulo, propio, _ in modulos:
+            paquete = modulo.split('.')[0]
+            paquetes[paquete] = paquetes.get(paquete, 0) + propio
+
+        top = options['top']
+        por_modulo = sorted(modulos, key=lambda m: m[1], reverse=True)[:top]
+        por_paquete = sorted(paquetes.items(), key=lambda p: p[1], reverse=True)[:top]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'objetivo': options['objetivo'],
+                'total_ms': round(total_ms, 1),
+                'modulos': len(modulos),
+                'import_ms': round(sum(m[1] for m in modulos) / 1000, 1),
+                'por_modulo': [
+                    {'modulo': m, 'propio_ms': p / 1000, 'acumulado_ms': a / 1000} for m, p, a in por_modulo
+                ],
+                'por_paquete': [{'paquete': p, 'propio_ms': t / 1000} for p, t in por_paquete],
+            }, indent=2))
+            return
+
+        self.stdout.write(
+            f"{options['objetivo']}: {total_ms:.1f} ms, {len(modulos)} módulos importados "
+            f"({sum(m[1] for m in modulos) / 1000:.1f} ms en imports)\n"
+        )
+        self.stdout.write(f"{'paquete':<40} {'propio ms':>10}")
+        for paquete, propio in por_paquete:
+            self.stdout.write(f"{paquete:<40} {propio / 1000:>10.1f}")
+        self.stdout.write(f"\n{'módulo':<60} {'propio ms':>10} {'acumulado ms':>13}")
+        for modulo, propio, acumulado in por_modulo:
+            self.stdout.write(f"{modulo:<60} {propio / 1000:>10.1f} {acumulado / 1000:>13.1f}")
@@ -0,0 +1,214 @@
+"""
+Mueve usuarios y perfiles a una nueva lista de shards.
+
+Cada usuario va a ``hacia[bucket % len(hacia)]`` según el bucket de su id
+(ver ``usuarios.sharding``). Usuarios y perfiles conservan su id, que es
+global. Cada bloque se lee con sus filas bloqueadas en el origen, se copia al
+destino y se borra del origen antes de soltar el bloqueo: lo que se quiera
+escribir en el origen mientras tanto (login, créditos, perfiles) espera y no
+se pierde. Si se corta después de confirmar la copia, el usuario queda en
+los dos shards con el origen intacto; la siguiente corrida pisa la copia del
+destino con la del origen y termina de moverlo. Mientras tanto las búsquedas
+lo encuentran por el respaldo de ``sharding``.
+
+En el feed de cambios el destino registra un alta y el origen un
+``movido`` por cada usuario y perfil (ver ``usuarios.cambios``).
+
+Al terminar escribe ``SHARDING['MAPA']`` con la nueva lista; desde ahí el
+router usa la nueva distribución (los procesos que ya corrían la ven en
+``sharding.REVISAR_MAPA_S``). Los usuarios que se registren durante la
+corrida quedan según la distribución anterior: volver a correrlo con el mismo
+``--hacia`` los mueve.
+
+Los usuarios con grupos o permisos propios no se mueven (los ids de grupos y
+permisos son de cada shard) y se listan al final. Por eso no se puede sacar
+de ``--hacia`` un shard que tenga alguno: quedarían fuera de
+``sharding.shards()`` y nadie los encontraría. El comando se niega antes de
+mover nada y, si alguno aparece durante la corrida, no escribe el mapa.
+
+Antes de correrlo los shards nuevos tienen que estar en ``DATABASES`` y
+migrados (``python manage.py migrate --database=<alias>``).
+
+Uso:
+    python manage.py rebalancear_shards --hacia default,shard1,shard2 --dry-run
+    python manage.py rebalancear_shards --hacia default,shard1,shard2 --chunk 1000
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from usuarios import cambios, catalogos, sharding
+from usuarios.models import Usuario, PerfilUniversitario, PerfilSecundaria, Universidad, Carrera, Instituto, Curso
+
+CHUNK_SIZE = 500
+
+CATALOGOS = [Universidad, Carrera, Instituto, Curso]
+PERFILES = [PerfilUniversitario, PerfilSecundaria]
+
+
+def _campos(modelo) -> list:
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _campos_sin_id(modelo) -> list:
+    return [campo for campo in _campos(modelo) if campo != 'id']
+
+
+class Command(BaseCommand):
+    help = "Redistribuye los usuarios entre los shards indicados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hacia', required=True,
+                            help="Aliases de DATABASES separados por coma, en orden.")
+        parser.add_argument('--chunk', type=int, default=CHUNK_SIZE,
+                            help=f"Usuarios leídos por bloque (default {CHUNK_SIZE}).")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta, no mueve nada.")
+
+    def handle(self, *args, **options):
+        if not sharding.activo():
+            raise CommandError("El sharding no está activo (SHARDING['ACTIVO']).")
+        if not sharding.configuracion()['MAPA']:
+            raise CommandError("Falta SHARDING['MAPA']: ahí se guarda la nueva distribución.")
+        if options['chunk'] < 1:
+            raise CommandError("--chunk debe ser al menos 1")
+        hacia = [alias.strip() for alias in options['hacia'].split(',') if alias.strip()]
+        desconocidos = [alias for alias in hacia if alias not in settings.DATABASES]
+        if not hacia or desconocidos:
+            raise CommandError(f"Aliases no definidos en DATABASES: {', '.join(desconocidos) or '(vacío)'}")
+        if len(set(hacia)) != len(hacia):
+            raise CommandError("--hacia tiene aliases repetidos")
+
+        retenidos = {
+            alias: len(self.con_grupos_o_permisos(alias))
+            for alias in sharding.shards() if alias not in hacia
+        }
+        retenidos = {alias: cantidad for alias, cantidad in retenidos.items() if cantidad}
+        if retenidos:
+            raise CommandError(
+                "No se puede sacar de --hacia un shard con usuarios que tienen grupos o permisos propios: "
+                + ', '.join(f'{alias} ({cantidad})' for alias, cantidad in retenidos.items())
+            )
+
+        dry_run = options['dry_run']
+        if not dry_run:
+            self.replicar_catalogos(hacia)
+
+        # se recorren también los destinos: pueden tener usuarios de una corrida anterior
+        origenes = list(dict.fromkeys(sharding.shards() + hacia))
+        movidos = {}
+        omitidos = []
+        for origen in origenes:
+            ultimo_pk = 0
+            while True:
+                ids = list(
+                    Usuario.objects.using(origen).filter(pk__gt=ultimo_pk).order_by('pk')
+                    .values_list('pk', flat=True)[:options['chunk']]
+                )
+                if not ids:
+                    break
+                ultimo_pk = ids[-1]
+                por_destino = sharding.agrupar(
+                    ids, lambda usuario_id: sharding.shard_de_bucket(sharding.bucket_de_id(usuario_id), hacia)
+                )
+                por_destino.pop(origen, None)
+                for destino, a_mover in por_destino.items():
+                    con_permisos = self.con_grupos_o_permisos(origen, a_mover)
+                    omitidos += [(usuario_id, origen) for usuario_id in con_permisos]
+                    a_mover = [usuario_id for usuario_id in a_mover if usuario_id not in con_permisos]
+                    if a_mover and not dry_run:
+                        self.mover(origen, destino, a_mover)
+                    movidos[(origen, destino)] = movidos.get((origen, destino), 0) + len(a_mover)
+
+        prefijo = "[dry-run] " if dry_run else ""
+        for (origen, destino), cantidad in sorted(movidos.items()):
+            self.stdout.write(f"{prefijo}{origen} -> {destino}: {cantidad} usuarios")
+        for usuario_id, origen in omitidos:
+            self.stdout.write(self.style.WARNING(
+                f"{prefijo}usuario {usuario_id} en {origen} no se movió: tiene grupos o permisos propios"
+            ))
+        # asignados a grupos o permisos durante la corrida en un shard que sale
+        huerfanos = [usuario_id for usuario_id, origen in omitidos if origen not in hacia]
+        if huerfanos and not dry_run:
+            raise CommandError(
+                f"{len(huerfanos)} usuarios con grupos o permisos quedarían fuera de --hacia; "
+                "no se escribió el mapa"
+            )
+        if not dry_run:
+            sharding.escribir_mapa(hacia)
+        self.stdout.write(self.style.SUCCESS(f"{prefijo}{sum(movidos.values())} usuarios movidos"))
+
+    def replicar_catalogos(self, hacia):
+        for modelo in CATALOGOS:
+            ultimo_pk = 0
+            while True:
+                filas = list(modelo.objects.using('default').filter(pk__gt=ultimo_pk).order_by('pk')[:CHUNK_SIZE])
+                if not filas:
+                    break
+                catalogos.replicar(modelo, filas, aliases=hacia)
+                ultimo_pk = filas[-1].pk
+
+    def con_grupos_o_permisos(self, alias, ids=None) -> set:
+        """Usuarios de ``ids`` (o de todo el shard) con grupos o permisos propios."""
+        grupos = Usuario.groups.through.objects.using(alias)
+        permisos = Usuario.user_permissions.through.objects.using(alias)
+        if ids is not None:
+            grupos = grupos.filter(usuario_id__in=ids)
+            permisos = permisos.filter(usuario_id__in=ids)
+        return set(grupos.values_list('usuario_id', flat=True)) | set(permisos.values_list('usuario_id', flat=True))
+
+    def mover(self, origen, destino, ids):
+        with sharding.modo_movimiento(), transaction.atomic(using=origen):
+            usuarios = [
+                Usuario(**datos)
+                for datos in Usuario.objects.using(origen).select_for_update().filter(pk__in=ids)
+                .values(*_campos(Usuario))
+            ]
+            ids = [usuario.pk for usuario in usuarios]
+            perfiles = {
+                modelo: [
+                    modelo(**datos)
+                    for datos in modelo.objects.using(origen).select_for_update().filter(usuario_id__in=ids)
+                    .values(*_campos(modelo))
+                ]
+                for modelo in PERFILES
+            }
+            ids_perfiles_origen = {modelo: [perfil.pk for perfil in filas] for modelo, filas in perfiles.items()}
+
+            with transaction.atomic(using=destino):
+                # update_conflicts: una corrida cortada pudo dejar una copia vieja; manda la del origen
+                Usuario.objects.using(destino).bulk_create(
+                    usuarios, update_conflicts=True, unique_fields=['id'], update_fields=_campos_sin_id(Usuario),
+                )
+                cambios.registrar(Usuario, ids, using=destino)
+                for modelo, filas in perfiles.items():
+                    self.copiar_perfiles(modelo, filas, ids, destino)
+
+            # el usuario y sus perfiles siguen existiendo en otro shard
+            cambios.registrar(Usuario, ids, operacion='M', using=origen)
+            for modelo, viejos in ids_perfiles_origen.items():
+                cambios.registrar(modelo, viejos, operacion='M', using=origen)
+            Usuario.objects.using(origen).filter(pk__in=ids).delete()
+
+    def copiar_perfiles(self, modelo, filas, ids_usuarios, destino):
+        pks = [perfil.pk for perfil in filas]
+        # copias de una corrida cortada que ya no están en el origen
+        sobrantes = list(
+            modelo.objects.using(destino).filter(usuario_id__in=ids_usuarios).exclude(pk__in=pks)
+            .values_list('pk', flat=True)
+        )
+        if sobrantes:
+            modelo.objects.using(destino).filter(pk__in=sobrantes).delete()
+            cambios.registrar(modelo, sobrantes, operacion='D', using=destino)
+        # perfiles creados antes de los ids globales: el id puede estar ocupado por el perfil de otro usuario
+        ocupados = set(
+            modelo.objects.using(destino).filter(pk__in=pks).exclude(usuario_id__in=ids_usuarios)
+            .values_list('pk', flat=True)
+        )
+        for perfil in filas:
+            if perfil.pk in ocupados:
+                perfil.pk = sharding.nuevo_id_perfil(modelo)
+        modelo.objects.using(destino).bulk_create(
+            filas, update_conflicts=True, unique_fields=['id'], update_fields=_campos_sin_id(modelo),
+        )
+        cambios.registrar(modelo, [perfil.pk for perfil in filas], using=destino)
@@ -0,0 +1,79 @@
+"""
+Reporte de estadísticas por cohorte de los perfiles.
+
+Uso:
+    python manage.py reporte_cohortes --tipo universitario --por universidad,genero
+    python manage.py reporte_cohortes --tipo secundaria --por instituto,edad --salida cohortes.csv
+    python manage.py reporte_cohortes --tipo universitario --por carrera --formato parquet --salida cohortes.parquet
+
+Necesita NumPy; la salida Parquet además necesita pyarrow.
+"""
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Calcula media, desviación, mínimo y máximo de las métricas de los perfiles por cohorte."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=['universitario', 'secundaria'], default='universitario')
+        parser.add_argument('--por', default='genero',
+                            help="Dimensiones separadas por coma: universidad, carrera, instituto, "
+                                 "curso, genero, edad.")
+        parser.add_argument('--salida', default='-', help="Archivo de salida ('-' para stdout).")
+        parser.add_argument('--formato', choices=['csv', 'parquet'], default='csv')
+        parser.add_argument('--chunk', type=int, default=None, help="Filas por bloque.")
+        parser.add_argument('--ancho-edad', type=int, default=None, help="Años por grupo de edad.")
+
+    def handle(self, *args, **options):
+        try:
+            from usuarios import cohortes
+        except ImportError:
+            raise CommandError("reporte_cohortes necesita NumPy: pip install numpy")
+
+        chunk = options['chunk'] or cohortes.CHUNK_SIZE
+        ancho_edad = options['ancho_edad'] or cohortes.ANCHO_EDAD
+        if chunk < 1 or ancho_edad < 1:
+            raise CommandError("--chunk y --ancho-edad deben ser al menos 1")
+        por = [dimension.strip() for dimension in options['por'].split(',') if dimension.strip()]
+
+        try:
+            columnas, filas = cohortes.reporte_cohortes(
+                options['tipo'], por, chunk_size=chunk, ancho_edad=ancho_edad,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['formato'] == 'parquet':
+            self.escribir_parquet(options['salida'], columnas, filas)
+        else:
+            self.escribir_csv(options['salida'], columnas, filas)
+
+        if options['salida'] != '-':
+            self.stdout.write(self.style.SUCCESS(f"{len(filas)} cohortes escritas en {options['salida']}"))
+
+    def escribir_csv(self, salida, columnas, filas):
+        if salida == '-':
+            self._csv(self.stdout, columnas, filas)
+            return
+        with open(salida, 'w', newline='', encoding='utf-8') as archivo:
+            self._csv(archivo, columnas, filas)
+
+    def _csv(self, archivo, columnas, filas):
+        escritor = csv.writer(archivo)
+        escritor.writerow(columnas)
+        for fila in filas:
+            escritor.writerow(['' if valor is None else valor for valor in fila])
+
+    def escribir_parquet(self, salida, columnas, filas):
+        if salida == '-':
+            raise CommandError("La salida Parquet necesita --salida")
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CommandError("La salida Parquet necesita pyarrow: pip install pyarrow")
+        tabla = pyarrow.table({columna: [fila[i] for fila in filas] for i, columna in enumerate(columnas)})
+        pyarrow.parquet.write_table(tabla, salida)
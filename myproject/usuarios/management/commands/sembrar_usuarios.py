@@ -0,0 +1,186 @@
+"""
+Genera usuarios sintéticos para pruebas de carga y escala.
+
+Uso:
+    python manage.py sembrar_usuarios --n 1000000
+
+Todos los registros cumplen las reglas de ``RegistroUsuarioSerializer`` y los
+``clean()`` de los perfiles. La contraseña compartida se hashea una sola vez
+y los datos salen de una semilla fija, así dos corridas con los mismos
+argumentos producen las mismas filas. Con sharding cada usuario y cada perfil
+reciben su id global y se insertan en el shard del usuario.
+"""
+
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from usuarios import catalogos, sharding
+from usuarios.cambios import registrar
+from usuarios.models import Usuario, PerfilUniversitario, PerfilSecundaria, Universidad, Carrera, Instituto, Curso
+from usuarios.serializers import MIN_AGE_REGISTRATION, MAX_AGE
+
+NOMBRES = [
+    'Juan', 'Ana', 'Luis', 'Maria', 'Carlos', 'Lucia', 'Pedro', 'Sofia', 'Jorge', 'Valentina',
+    'Andres', 'Camila', 'Diego', 'Isabella', 'Miguel', 'Daniela', 'Jose', 'Paula', 'David', 'Laura',
+]
+APELLIDOS = [
+    'Perez', 'Gomez', 'Rodriguez', 'Lopez', 'Martinez', 'Garcia', 'Sanchez', 'Ramirez', 'Torres',
+    'Flores', 'Rivera', 'Vargas', 'Castro', 'Morales', 'Ortiz', 'Herrera', 'Medina', 'Rojas',
+]
+UNIVERSIDADES = [
+    'Universidad Nacional', 'Universidad de los Andes', 'Universidad del Valle',
+    'Universidad de Antioquia', 'Universidad Javeriana', 'Universidad del Norte',
+]
+CARRERAS = [
+    'Ingeniería de Sistemas', 'Medicina', 'Derecho', 'Administración', 'Psicología',
+    'Arquitectura', 'Contaduría', 'Ingeniería Civil', 'Economía', 'Biología',
+]
+INSTITUTOS = [
+    'Colegio San José', 'Colegio ABC', 'Instituto Técnico Central', 'Liceo Nacional',
+    'Colegio Santa María', 'Instituto Pedagógico',
+]
+CURSOS = ['6°', '7°', '8°', '9°', '10°', '11°']
+GENEROS = [c[0] for c in Usuario.GENERO_CHOICES]
+
+
+class Command(BaseCommand):
+    help = "Llena la base de datos con usuarios y perfiles sintéticos válidos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n', type=int, required=True, help="Cantidad de usuarios a crear.")
+        parser.add_argument('--chunk', type=int, default=5000, help="Filas por bulk_create (default 5000).")
+        parser.add_argument('--seed', type=int, default=42, help="Semilla para datos reproducibles.")
+        parser.add_argument('--universitarios', type=float, default=0.5,
+                            help="Proporción de usuarios universitarios entre 0 y 1 (default 0.5).")
+        parser.add_argument('--password', default='Abc123!@', help="Contraseña compartida por todos.")
+        parser.add_argument('--dominio', default='sembrado.test', help="Dominio de los emails generados.")
+
+    def handle(self, *args, **options):
+        n = options['n']
+        chunk = options['chunk']
+        proporcion = options['universitarios']
+        dominio = options['dominio']
+
+        if n < 1:
+            raise CommandError("--n debe ser al menos 1")
+        if chunk < 1:
+            raise CommandError("--chunk debe ser al menos 1")
+        if not 0 <= proporcion <= 1:
+            raise CommandError("--universitarios debe estar entre 0 y 1")
+
+        # un solo hash para todos: hashear un millón de veces tomaría días
+        password = make_password(options['password'])
+        # ids de catálogo resueltos una vez
+        self.universidades = [catalogos.resolver(Universidad, n).pk for n in UNIVERSIDADES]
+        self.carreras = [catalogos.resolver(Carrera, n).pk for n in CARRERAS]
+        self.institutos = [catalogos.resolver(Instituto, n).pk for n in INSTITUTOS]
+        self.cursos = [catalogos.resolver(Curso, n).pk for n in CURSOS]
+        rng = random.Random(options['seed'])
+        # continuar la numeración si ya se sembró antes en el mismo dominio
+        inicio = sum(
+            Usuario.objects.using(alias).filter(email__endswith=f'@{dominio}').count() for alias in sharding.shards()
+        )
+
+        t0 = time.perf_counter()
+        creados = 0
+        while creados < n:
+            tamano = min(chunk, n - creados)
+            self.sembrar_chunk(rng, inicio + creados, tamano, password, proporcion, dominio)
+            creados += tamano
+            self.stdout.write(f"{creados}/{n} usuarios", ending='\r')
+            self.stdout.flush()
+
+        duracion = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{n} usuarios creados en {duracion:.1f}s ({n / duracion:.0f} usuarios/s)"
+        ))
+
+    def sembrar_chunk(self, rng, desde, tamano, password, proporcion, dominio):
+        usuarios = []
+        for i in range(desde, desde + tamano):
+            # listas disjuntas: nombre y apellido nunca son iguales (regla del serializer)
+            nombre = rng.choice(NOMBRES)
+            apellido = rng.choice(APELLIDOS)
+            usuarios.append(Usuario(
+                nombre=nombre,
+                apellido=apellido,
+                edad=rng.randint(MIN_AGE_REGISTRATION, min(MAX_AGE, 60)),
+                genero=rng.choice(GENEROS),
+                email=f'{nombre.lower()}.{apellido.lower()}.{i}@{dominio}',
+                password=password,
+                tipo_estudiante='U' if rng.random() < proporcion else 'C',
+            ))
+
+        if sharding.activo():
+            for usuario in usuarios:
+                usuario.pk = sharding.nuevo_id(usuario.email)
+        por_shard = sharding.agrupar(
+            usuarios, lambda usuario: sharding.shard_de_id(usuario.pk) if usuario.pk else 'default'
+        )
+        for alias, grupo in por_shard.items():
+            self.insertar(rng, alias, grupo)
+
+    def insertar(self, rng, alias, usuarios):
+        with transaction.atomic(using=alias):
+            usuarios = Usuario.objects.using(alias).bulk_create(usuarios)
+            if usuarios[0].pk is None:
+                # backends que no devuelven ids en bulk_create
+                ids = dict(Usuario.objects.using(alias).filter(
+                    email__in=[u.email for u in usuarios]
+                ).values_list('email', 'id'))
+                for usuario in usuarios:
+                    usuario.pk = ids[usuario.email]
+
+            universitarios = []
+            secundaria = []
+            for usuario in usuarios:
+                if usuario.tipo_estudiante == 'U':
+                    universitarios.append(self.perfil_universitario(rng, usuario))
+                else:
+                    secundaria.append(self.perfil_secundaria(rng, usuario))
+
+            if sharding.activo():
+                for perfil in universitarios + secundaria:
+                    perfil.pk = sharding.nuevo_id_perfil(type(perfil))
+            PerfilUniversitario.objects.using(alias).bulk_create(universitarios)
+            PerfilSecundaria.objects.using(alias).bulk_create(secundaria)
+            # bulk_create no dispara señales
+            ids_usuarios = [usuario.pk for usuario in usuarios]
+            registrar(Usuario, ids_usuarios, using=alias)
+            for modelo in (PerfilUniversitario, PerfilSecundaria):
+                registrar(
+                    modelo,
+                    modelo.objects.using(alias).filter(usuario_id__in=ids_usuarios).values_list('pk', flat=True),
+                    using=alias,
+                )
+
+    def perfil_universitario(self, rng, usuario):
+        total_semestres = rng.randint(8, 12)
+        semestre_actual = rng.randint(1, total_semestres)
+        creditos = rng.randint(140, 220)
+        return PerfilUniversitario(
+            usuario_id=usuario.pk,
+            universidad_id=rng.choice(self.universidades),
+            carrera_id=rng.choice(self.carreras),
+            total_semestres=total_semestres,
+            semestre_actual=semestre_actual,
+            creditos_para_graduarse=creditos,
+            creditos_aprobados=creditos * (semestre_actual - 1) // total_semestres,
+        )
+
+    def perfil_secundaria(self, rng, usuario):
+        total_de_periodos = rng.randint(3, 4)
+        total_de_materias = rng.randint(8, 14)
+        return PerfilSecundaria(
+            usuario_id=usuario.pk,
+            instituto_id=rng.choice(self.institutos),
+            curso_id=rng.choice(self.cursos),
+            total_de_periodos=total_de_periodos,
+            periodo_actual=rng.randint(1, total_de_periodos),
+            total_de_materias=total_de_materias,
+            total_de_materias_para_aprobacion=rng.randint(total_de_materias // 2, total_de_materias),
+        )
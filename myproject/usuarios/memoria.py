@@ -0,0 +1,189 @@
+"""
+Perfil de memoria muestreado por vista.
+
+``PerfilMemoriaMiddleware`` traza con ``tracemalloc`` una fracción de los
+requests y deja aquí, por vista, el pico y la memoria neta retenida, más los
+sitios (archivo:línea) que más memoria dejaron vivos al terminar el request.
+
+``tracemalloc`` mide todo el proceso, no un hilo: con workers de varios
+hilos las asignaciones de otros requests se cuentan en la muestra. Por eso
+solo se traza un request si es el único en curso en el proceso, y el reporte
+cuenta en ``muestras_concurrentes`` las muestras en que igual empezó otro
+request mientras se trazaba; esas cifras no son solo de la vista.
+
+Configuración en ``settings.PERFIL_MEMORIA``::
+
+    ACTIVO         False desactiva el middleware por completo (sin overhead)
+    MUESTREO       fracción de requests trazados, p. ej. 0.01
+    FRAMES         frames de traceback guardados por asignación
+    TOP            sitios guardados por muestra
+    DIRECTORIO     si se define, cada muestra guarda su snapshot ahí
+    MAX_SNAPSHOTS  snapshots guardados por vista: se conserva el primero
+                   (la base de ``diff_memoria``) y los más nuevos
+"""
+
+import glob
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+MAX_SITIOS = 50
+
+DEFAULTS = {
+    'ACTIVO': False,
+    'MUESTREO': 0.01,
+    'FRAMES': 10,
+    'TOP': 10,
+    'DIRECTORIO': None,
+    'MAX_SNAPSHOTS': 20,
+}
+
+
+def configuracion() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'PERFIL_MEMORIA', {})}
+
+
+_lock = threading.Lock()
+_vistas = {}
+
+
+def registrar_muestra(vista: str, pico: int, neto: int, sitios: list, concurrente: bool = False) -> None:
+    """
+    Acumula una muestra. ``sitios`` es una lista de (sitio, bytes);
+    ``concurrente`` indica que otro request corrió mientras se trazaba.
+    """
+    with _lock:
+        datos = _vistas.setdefault(vista, {
+            'muestras': 0, 'concurrentes': 0, 'pico_max': 0, 'pico_total': 0, 'neto_total': 0,
+            'sitios': Counter(),
+        })
+        datos['muestras'] += 1
+        datos['concurrentes'] += concurrente
+        datos['pico_max'] = max(datos['pico_max'], pico)
+        datos['pico_total'] += pico
+        datos['neto_total'] += neto
+        datos['sitios'].update(dict(sitios))
+        if len(datos['sitios']) > MAX_SITIOS:
+            datos['sitios'] = Counter(dict(datos['sitios'].most_common(MAX_SITIOS)))
+
+
+def obtener_reporte(top: int = 10) -> dict:
+    with _lock:
+        return {
+            vista: {
+                'muestras': datos['muestras'],
+                'muestras_concurrentes': datos['concurrentes'],
+                'pico_max_bytes': datos['pico_max'],
+                'pico_promedio_bytes': datos['pico_total'] // datos['muestras'],
+                'neto_promedio_bytes': datos['neto_total'] // datos['muestras'],
+                'sitios': [
+                    {'sitio': sitio, 'bytes': tamano}
+                    for sitio, tamano in datos['sitios'].most_common(top)
+                ],
+            }
+            for vista, datos in _vistas.items()
+        }
+
+
+def reiniciar() -> None:
+    with _lock:
+        _vistas.clear()
+
+
+# solo un request trazado a la vez: tracemalloc es global al proceso
+_trazando = threading.Lock()
+
+# requests en curso en el proceso y si alguno empezó durante la traza actual
+_en_curso_lock = threading.Lock()
+_en_curso = 0
+_concurrente = False
+
+
+@contextmanager
+def en_curso():
+    """Cuenta el request como en curso mientras dura el bloque ``with``."""
+    global _en_curso, _concurrente
+    with _en_curso_lock:
+        _en_curso += 1
+        if _trazando.locked():
+            _concurrente = True
+    try:
+        yield
+    finally:
+        with _en_curso_lock:
+            _en_curso -= 1
+
+
+def _rotar(directorio: str, prefijo: str, maximo: int) -> None:
+    # nombres <prefijo>-<time_ns>.tracemalloc: el primero queda como base, el resto rota
+    archivos = sorted(
+        glob.glob(os.path.join(glob.escape(directorio), f'{glob.escape(prefijo)}-*.tracemalloc')),
+        key=lambda ruta: int(ruta.rsplit('-', 1)[1].split('.')[0]),
+    )
+    for ruta in archivos[1:max(1, len(archivos) - maximo + 1)]:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def trazar(get_response, request, config):
+    """
+    Ejecuta el request con ``tracemalloc`` activo y registra la muestra.
+
+    Si otro hilo ya está trazando o hay otros requests en curso (ver
+    ``en_curso``), el request corre sin trazar.
+    """
+    global _concurrente
+    if not _trazando.acquire(blocking=False):
+        return get_response(request)
+    with _en_curso_lock:
+        solo = _en_curso <= 1
+        _concurrente = False
+    if not solo:
+        _trazando.release()
+        return get_response(request)
+    try:
+        # si alguien más ya usa tracemalloc (p. ej. -X tracemalloc) no lo tocamos
+        propio = not tracemalloc.is_tracing()
+        if propio:
+            tracemalloc.start(config['FRAMES'])
+        tracemalloc.reset_peak()
+        antes, _ = tracemalloc.get_traced_memory()
+        filtro = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        inicial = tracemalloc.take_snapshot().filter_traces(filtro) if not propio else None
+        try:
+            response = get_response(request)
+        finally:
+            despues, pico = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(filtro)
+            if propio:
+                tracemalloc.stop()
+
+        if inicial is not None:
+            estadisticas = [(e.traceback, e.size_diff) for e in snapshot.compare_to(inicial, 'lineno')]
+        else:
+            estadisticas = [(e.traceback, e.size) for e in snapshot.statistics('lineno')]
+        sitios = [
+            (f"{traza[0].filename}:{traza[0].lineno}", tamano)
+            for traza, tamano in estadisticas[:config['TOP']]
+            if tamano > 0
+        ]
+
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else request.path_info
+        registrar_muestra(vista, pico - antes, despues - antes, sitios, concurrente=_concurrente)
+
+        if config['DIRECTORIO']:
+            os.makedirs(config['DIRECTORIO'], exist_ok=True)
+            prefijo = vista.replace(':', '_').replace('/', '_')
+            snapshot.dump(os.path.join(config['DIRECTORIO'], f"{prefijo}-{time.time_ns()}.tracemalloc"))
+            _rotar(config['DIRECTORIO'], prefijo, config['MAX_SNAPSHOTS'])
+        return response
+    finally:
+        _trazando.release()
@@ -0,0 +1,152 @@
+"""
+Middleware del proyecto.
+
+``MiddlewarePorRuta`` elige la pila de middleware según la ruta. Las rutas
+de ``/api/`` se autentican solo con JWT, así que no necesitan sesión, CSRF,
+mensajes ni ``request.user`` de Django: corren una pila mínima y el resto
+(admin) la pila completa.
+
+Configuración en settings::
+
+    MIDDLEWARE_POR_RUTA = [('/api/', [...])]
+    MIDDLEWARE_POR_DEFECTO = [...]
+"""
+
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import consultas_lentas
+from .memoria import configuracion as configuracion_memoria, en_curso, trazar
+
+
+class PilaMiddleware:
+    """
+    Una cadena de middleware armada igual que ``BaseHandler.load_middleware``.
+
+    Como estos middleware no están en ``settings.MIDDLEWARE``, Django no
+    llama sus ``process_view``/``process_exception``/
+    ``process_template_response``; se guardan aquí para que
+    ``MiddlewarePorRuta`` los llame.
+    """
+
+    def __init__(self, rutas_middleware, get_response):
+        self.process_view = []
+        self.process_exception = []
+        self.process_template_response = []
+
+        handler = convert_exception_to_response(get_response)
+        for ruta in reversed(rutas_middleware):
+            fabrica = import_string(ruta)
+            try:
+                instancia = fabrica(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instancia, 'process_view'):
+                self.process_view.insert(0, instancia.process_view)
+            if hasattr(instancia, 'process_exception'):
+                self.process_exception.append(instancia.process_exception)
+            if hasattr(instancia, 'process_template_response'):
+                self.process_template_response.append(instancia.process_template_response)
+            handler = convert_exception_to_response(instancia)
+        self.handler = handler
+
+
+class MiddlewarePorRuta:
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.pilas = [
+            (prefijo, PilaMiddleware(rutas, get_response))
+            for prefijo, rutas in settings.MIDDLEWARE_POR_RUTA
+        ]
+        self.por_defecto = PilaMiddleware(settings.MIDDLEWARE_POR_DEFECTO, get_response)
+
+    def elegir_pila(self, request) -> PilaMiddleware:
+        for prefijo, pila in self.pilas:
+            if request.path_info.startswith(prefijo):
+                return pila
+        return self.por_defecto
+
+    def __call__(self, request):
+        pila = self.elegir_pila(request)
+        request._pila_middleware = pila
+        return pila.handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in request._pila_middleware.process_view:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        for process_exception in request._pila_middleware.process_exception:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for process_template_response in request._pila_middleware.process_template_response:
+            response = process_template_response(request, response)
+        return response
+
+
+class PerfilMemoriaMiddleware:
+    """
+    Traza con ``tracemalloc`` una muestra de los requests, ver ``memoria``.
+
+    Con ``PERFIL_MEMORIA['ACTIVO']`` en False lanza ``MiddlewareNotUsed`` y
+    Django lo saca de la cadena: no cuesta nada desactivado.
+    """
+
+    def __init__(self, get_response):
+        self.config = configuracion_memoria()
+        if not self.config['ACTIVO']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with en_curso():
+            if random.random() >= self.config['MUESTREO']:
+                return self.get_response(request)
+            return trazar(self.get_response, request, self.config)
+
+
+class ConsultasLentasMiddleware:
+    """
+    Mide las consultas de cada request y encola las lentas, ver ``consultas_lentas``.
+
+    Desactivado (``CONSULTAS_LENTAS['ACTIVO']`` en False) se saca de la cadena.
+    """
+
+    def __init__(self, get_response):
+        self.config = consultas_lentas.configuracion()
+        if not self.config['ACTIVO']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.wrapper = consultas_lentas.crear_wrapper(self.config['UMBRAL_MS'])
+        if self.config['SEGUNDO_PLANO']:
+            consultas_lentas.iniciar_trabajador(self.config)
+
+    def __call__(self, request):
+        token = consultas_lentas.vista_actual.set(request.path_info)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.wrapper))
+                return self.get_response(request)
+        finally:
+            consultas_lentas.vista_actual.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # ya con la URL resuelta, se usa el nombre de la vista
+        consultas_lentas.vista_actual.set(request.resolver_match.view_name)
+        return None
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_perfilsecundaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilsecundaria',
+            name='finalizado',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='perfiluniversitario',
+            name='finalizado',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def catalogo(nombre, verbose_name, verbose_name_plural):
+    return migrations.CreateModel(
+        name=nombre,
+        fields=[
+            ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('nombre', models.CharField(max_length=100)),
+            ('clave', models.CharField(max_length=100, unique=True)),
+        ],
+        options={
+            'verbose_name': verbose_name,
+            'verbose_name_plural': verbose_name_plural,
+            'abstract': False,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_perfiles_finalizado'),
+    ]
+
+    operations = [
+        catalogo('Universidad', 'Universidad', 'Universidades'),
+        catalogo('Carrera', 'Carrera', 'Carreras'),
+        catalogo('Instituto', 'Instituto', 'Institutos'),
+        catalogo('Curso', 'Curso', 'Cursos'),
+        # columnas temporales; 0009 borra las de texto y las renombra
+        migrations.AddField(
+            model_name='perfiluniversitario',
+            name='universidad_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='usuarios.universidad'),
+        ),
+        migrations.AddField(
+            model_name='perfiluniversitario',
+            name='carrera_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='usuarios.carrera'),
+        ),
+        migrations.AddField(
+            model_name='perfilsecundaria',
+            name='instituto',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.instituto'),
+        ),
+        migrations.AddField(
+            model_name='perfilsecundaria',
+            name='curso',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.curso'),
+        ),
+    ]
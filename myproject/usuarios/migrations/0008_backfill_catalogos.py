@@ -0,0 +1,90 @@
+"""
+Llena los catálogos con los nombres que ya están en los perfiles.
+
+Los nombres se agrupan por su forma normalizada (sin tildes, minúsculas,
+espacios simples) y se guarda la escritura más usada. Los perfiles se
+actualizan por bloques de ids, cada bloque en su propia transacción.
+"""
+
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import migrations, transaction
+from django.db.models import Count
+
+BATCH_SIZE = 5000
+
+# (modelo del perfil, campo de texto, campo FK, modelo del catálogo)
+CAMPOS = [
+    ('PerfilUniversitario', 'universidad', 'universidad_ref', 'Universidad'),
+    ('PerfilUniversitario', 'carrera', 'carrera_ref', 'Carrera'),
+    ('PerfilSecundaria', 'nombre_instituto', 'instituto', 'Instituto'),
+    ('PerfilSecundaria', 'curso_actual', 'curso', 'Curso'),
+]
+
+
+# copia congelada de usuarios.normalizacion.normalizar
+def normalizar(valor):
+    descompuesto = unicodedata.normalize('NFKD', valor)
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
+
+
+def llenar_catalogo(Perfil, Catalogo, campo_texto, db):
+    """Crea una fila de catálogo por nombre normalizado. Devuelve {texto: id}."""
+    escrituras = defaultdict(Counter)
+    for valor, cantidad in Perfil.objects.using(db).values_list(campo_texto).annotate(n=Count('pk')).order_by():
+        escrituras[normalizar(valor)][' '.join(valor.split())] += cantidad
+
+    ids_por_clave = dict(Catalogo.objects.using(db).values_list('clave', 'id'))
+    nuevos = [
+        Catalogo(clave=clave, nombre=conteo.most_common(1)[0][0])
+        for clave, conteo in escrituras.items()
+        if clave not in ids_por_clave
+    ]
+    Catalogo.objects.using(db).bulk_create(nuevos, batch_size=BATCH_SIZE)
+    ids_por_clave = dict(Catalogo.objects.using(db).values_list('clave', 'id'))
+
+    ids_por_texto = {}
+    for valor in Perfil.objects.using(db).values_list(campo_texto, flat=True).distinct().order_by():
+        ids_por_texto[valor] = ids_por_clave[normalizar(valor)]
+    return ids_por_texto
+
+
+def backfill(apps, schema_editor):
+    # la BD que se está migrando (con sharding, cada shard por separado)
+    db = schema_editor.connection.alias
+    for nombre_perfil, campo_texto, campo_fk, nombre_catalogo in CAMPOS:
+        Perfil = apps.get_model('usuarios', nombre_perfil)
+        Catalogo = apps.get_model('usuarios', nombre_catalogo)
+        ids_por_texto = llenar_catalogo(Perfil, Catalogo, campo_texto, db)
+
+        ultimo_pk = 0
+        while True:
+            filas = list(
+                Perfil.objects.using(db).filter(pk__gt=ultimo_pk).order_by('pk')
+                .values_list('pk', campo_texto)[:BATCH_SIZE]
+            )
+            if not filas:
+                break
+            pks_por_catalogo = defaultdict(list)
+            for pk, valor in filas:
+                pks_por_catalogo[ids_por_texto[valor]].append(pk)
+            with transaction.atomic(using=db):
+                for catalogo_id, pks in pks_por_catalogo.items():
+                    Perfil.objects.using(db).filter(pk__in=pks).update(**{f'{campo_fk}_id': catalogo_id})
+            ultimo_pk = filas[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # cada bloque se confirma solo, sin una transacción enorme sobre toda la tabla
+    atomic = False
+
+    dependencies = [
+        ('usuarios', '0007_catalogos'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
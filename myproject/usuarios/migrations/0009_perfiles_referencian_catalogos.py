@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_backfill_catalogos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='perfiluniversitario',
+            name='universidad',
+        ),
+        migrations.RemoveField(
+            model_name='perfiluniversitario',
+            name='carrera',
+        ),
+        migrations.RemoveField(
+            model_name='perfilsecundaria',
+            name='nombre_instituto',
+        ),
+        migrations.RemoveField(
+            model_name='perfilsecundaria',
+            name='curso_actual',
+        ),
+        migrations.RenameField(
+            model_name='perfiluniversitario',
+            old_name='universidad_ref',
+            new_name='universidad',
+        ),
+        migrations.RenameField(
+            model_name='perfiluniversitario',
+            old_name='carrera_ref',
+            new_name='carrera',
+        ),
+        migrations.AlterField(
+            model_name='perfiluniversitario',
+            name='universidad',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.universidad'),
+        ),
+        migrations.AlterField(
+            model_name='perfiluniversitario',
+            name='carrera',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.carrera'),
+        ),
+        migrations.AlterField(
+            model_name='perfilsecundaria',
+            name='instituto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.instituto'),
+        ),
+        migrations.AlterField(
+            model_name='perfilsecundaria',
+            name='curso',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='perfiles', to='usuarios.curso'),
+        ),
+    ]
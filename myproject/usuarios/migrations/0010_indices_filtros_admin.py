@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0009_perfiles_referencian_catalogos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='genero',
+            field=models.CharField(blank=True, choices=[('M', 'Masculino'), ('F', 'Femenino'), ('O', 'Otro'), ('P', 'Prefiero no decirlo')], db_index=True, default='P', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='is_active',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='tipo_estudiante',
+            field=models.CharField(choices=[('C', 'Colegio'), ('U', 'Universidad')], db_index=True, max_length=1, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0010_indices_filtros_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('U', 'Creado o modificado'), ('D', 'Borrado')], max_length=1)),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cambio',
+                'verbose_name_plural': 'Cambios',
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='usuarios_ca_modelo_bf74d9_idx')],
+            },
+        ),
+    ]
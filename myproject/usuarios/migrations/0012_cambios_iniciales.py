@@ -0,0 +1,56 @@
+"""
+Registra un cambio por cada usuario y perfil que ya existe.
+
+Así un consumidor del feed que empieza con ``desde=0`` recibe el estado
+completo. Los ids se leen por bloques y cada bloque se inserta en su propia
+transacción.
+"""
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+MODELOS = [
+    ('Usuario', 'usuario'),
+    ('PerfilUniversitario', 'perfil_universitario'),
+    ('PerfilSecundaria', 'perfil_secundaria'),
+]
+
+
+def registrar_existentes(apps, schema_editor):
+    # la BD que se está migrando (con sharding, cada shard por separado)
+    db = schema_editor.connection.alias
+    Cambio = apps.get_model('usuarios', 'Cambio')
+    for nombre_modelo, nombre in MODELOS:
+        Modelo = apps.get_model('usuarios', nombre_modelo)
+        ultimo_pk = 0
+        while True:
+            ids = list(
+                Modelo.objects.using(db).filter(pk__gt=ultimo_pk).order_by('pk')
+                .values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            with transaction.atomic(using=db):
+                Cambio.objects.using(db).bulk_create(
+                    [Cambio(modelo=nombre, objeto_id=objeto_id, operacion='U') for objeto_id in ids]
+                )
+            ultimo_pk = ids[-1]
+
+
+def borrar_cambios(apps, schema_editor):
+    apps.get_model('usuarios', 'Cambio').objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    # cada bloque se confirma solo, sin una transacción enorme sobre toda la tabla
+    atomic = False
+
+    dependencies = [
+        ('usuarios', '0011_cambio'),
+    ]
+
+    operations = [
+        migrations.RunPython(registrar_existentes, borrar_cambios),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_cambios_iniciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaId',
+            fields=[
+                ('nombre', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('siguiente', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Secuencia de ids',
+                'verbose_name_plural': 'Secuencias de ids',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_secuenciaid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cambio',
+            name='operacion',
+            field=models.CharField(choices=[('U', 'Creado o modificado'), ('D', 'Borrado'), ('M', 'Movido a otro shard')], max_length=1),
+        ),
+    ]
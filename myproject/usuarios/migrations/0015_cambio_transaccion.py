@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:20
+"""
+Orden del feed de cambios por transacción (ver ``usuarios.cambios``).
+
+Los cambios que ya existían quedan con ``transaccion = 0``: van antes que
+todos los nuevos y en orden de id, así un cursor numérico viejo (``desde=N``)
+sigue valiendo como ``0-N``.
+
+Agregar la columna con un default volátil (``pg_current_xact_id()``) haría
+que Postgres reescribiera toda la tabla bajo un lock exclusivo. Por eso va en
+pasos: la columna nula sin default (solo metadatos), el default para las filas
+nuevas, el relleno de las viejas en bloques de ``BLOQUE`` filas con su propia
+transacción cada uno, y al final ``NOT NULL``. Ese último paso recorre la
+tabla con lock exclusivo para validarla pero no la reescribe.
+"""
+
+import usuarios.models
+from django.db import migrations, models, transaction
+
+BLOQUE = 10_000
+
+
+def cambios_existentes_primero(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Cambio = apps.get_model('usuarios', 'Cambio')
+    pendientes = Cambio.objects.using(db).filter(transaccion__isnull=True)
+    while True:
+        with transaction.atomic(using=db):
+            ids = list(pendientes.order_by('pk').values_list('pk', flat=True)[:BLOQUE])
+            if not ids:
+                return
+            Cambio.objects.using(db).filter(pk__in=ids).update(transaccion=0)
+
+
+class Migration(migrations.Migration):
+
+    # el relleno confirma por bloques en lugar de en una sola transacción
+    atomic = False
+
+    dependencies = [
+        ('usuarios', '0014_cambio_movido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cambio',
+            name='transaccion',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='cambio',
+            name='transaccion',
+            field=models.BigIntegerField(null=True, db_default=usuarios.models.IdTransaccion()),
+        ),
+        migrations.RunPython(cambios_existentes_primero, migrations.RunPython.noop, atomic=False),
+        migrations.AlterField(
+            model_name='cambio',
+            name='transaccion',
+            field=models.BigIntegerField(db_default=usuarios.models.IdTransaccion()),
+        ),
+        migrations.AddIndex(
+            model_name='cambio',
+            index=models.Index(fields=['transaccion', 'id'], name='usuarios_ca_transac_f7a55e_idx'),
+        ),
+    ]
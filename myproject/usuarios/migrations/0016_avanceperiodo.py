@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0015_cambio_transaccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvancePeriodo',
+            fields=[
+                ('modelo', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('ultimo_pk', models.BigIntegerField(default=0)),
+                ('terminado', models.BooleanField(default=False)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Avance de periodo',
+                'verbose_name_plural': 'Avances de periodo',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0016_avanceperiodo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avanceperiodo',
+            name='corrida',
+            field=models.CharField(default='', max_length=32),
+        ),
+    ]
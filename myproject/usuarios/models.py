@@ -3,9 +3,28 @@ from django.contrib.auth.models import  PermissionsMixin ,AbstractBaseUser, Base
 #evitar valores absurdos del usuario
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .normalizacion import normalizar
+from . import sharding
+
+
+class ShardManagerMixin:
+    """
+    ``create()`` guarda la instancia ya armada, así el router ve a qué
+    usuario pertenece y la manda a su shard (``QuerySet.create`` solo pasa
+    el modelo y todo iría a ``default``).
+    """
+
+    def create(self, **kwargs):
+        if not sharding.activo() or self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
 
 # Primero el manager para manejar creación de usuarios
-class UsuarioManager(BaseUserManager):
+class UsuarioManager(ShardManagerMixin, BaseUserManager):
     # el extra fields perimite el ingreso de mas atributos pero solo tomara en cuanta los dos declarados
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -21,6 +40,43 @@ class UsuarioManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", True)
         return self.create_user(email, password, **extra_fields)
 
+    def get(self, *args, **kwargs):
+        """
+        Con sharding, las búsquedas por id o email van directo al shard del
+        usuario (login, JWT y ``ModelBackend`` pasan por aquí); cualquier
+        otra se pregunta a todos los shards.
+        """
+        if not sharding.activo() or self._db is not None or args:
+            return super().get(*args, **kwargs)
+        for campo in ('pk', 'id'):
+            if campo in kwargs:
+                shard = sharding.shard_de_id(kwargs[campo])
+                break
+        else:
+            if 'email' in kwargs:
+                shard = sharding.shard_de_email(kwargs['email'])
+            else:
+                encontrados = [
+                    usuario for alias in sharding.shards()
+                    for usuario in self.using(alias).filter(**kwargs)[:2]
+                ]
+                if len(encontrados) > 1:
+                    raise self.model.MultipleObjectsReturned("Más de un usuario cumple el filtro.")
+                if not encontrados:
+                    raise self.model.DoesNotExist("Usuario matching query does not exist.")
+                return encontrados[0]
+        return sharding.buscar(lambda alias: self.using(alias), shard, **kwargs)
+
+    def existe_email(self, email: str) -> bool:
+        """``filter(email=...).exists()`` en el shard del email (y en los demás si hay respaldo)."""
+        if not sharding.activo():
+            return self.filter(email=email).exists()
+        esperado = sharding.shard_de_email(email)
+        aliases = sharding.shards() if sharding.configuracion()['RESPALDO'] else [esperado]
+        # primero el esperado: casi siempre alcanza con una consulta
+        aliases = [esperado] + [alias for alias in aliases if alias != esperado]
+        return any(self.using(alias).filter(email=email).exists() for alias in aliases)
+
 
 class Usuario(AbstractBaseUser, PermissionsMixin):
     nombre = models.CharField(max_length=50)
@@ -46,7 +102,8 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         max_length=1,
         choices=GENERO_CHOICES,
         default='P',
-        blank=True
+        blank=True,
+        db_index=True
     )
 
     TIPO_ESTUDIANTE_CHOICES = [
@@ -58,11 +115,12 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         max_length=1,
         choices=TIPO_ESTUDIANTE_CHOICES,
         null=True,
-        blank=False
+        blank=False,
+        db_index=True
     )
 
     # activar y desactivar usuario
-    is_active = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True, db_index=True)
     is_staff = models.BooleanField(default=False)
 
     #cambiar el modelo de usario por defecto y coloca el que delcaro para las peticiones con bd
@@ -79,19 +137,102 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None and sharding.activo():
+            # el id dice en qué shard vive: se asigna antes de que el router elija la BD
+            self.pk = sharding.nuevo_id(self.email)
+            kwargs.setdefault('force_insert', True)
+        super().save(*args, **kwargs)
+
+# catalogos de nombres: cada nombre se guarda una vez y los perfiles lo referencian
+class Catalogo(models.Model):
+    nombre = models.CharField(max_length=100)
+    # nombre sin tildes ni mayusculas, evita duplicados como "U. Nacional" / "u. nacional"
+    clave = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self.clave:
+            self.clave = normalizar(self.nombre)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.nombre
+
+
+class Universidad(Catalogo):
+    class Meta:
+        verbose_name = "Universidad"
+        verbose_name_plural = "Universidades"
+
+
+class Carrera(Catalogo):
+    class Meta:
+        verbose_name = "Carrera"
+        verbose_name_plural = "Carreras"
+
+
+class Instituto(Catalogo):
+    class Meta:
+        verbose_name = "Instituto"
+        verbose_name_plural = "Institutos"
+
+
+class Curso(Catalogo):
+    class Meta:
+        verbose_name = "Curso"
+        verbose_name_plural = "Cursos"
+
+
+class PerfilManager(ShardManagerMixin, models.Manager):
+    pass
+
+
+class PerfilIdGlobalMixin:
+    """
+    Con sharding el perfil recibe un id global (``sharding.nuevo_id_perfil``):
+    no se repite entre shards y se conserva al mover al usuario de shard.
+    """
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None and sharding.activo():
+            self.pk = sharding.nuevo_id_perfil(type(self))
+            kwargs.setdefault('force_insert', True)
+        super().save(*args, **kwargs)
+
+
+class ValoresCargadosMixin:
+    """
+    Guarda en ``_cargado`` los valores con que se leyó la fila, para saber
+    qué cambió al guardar sin volver a consultarla (ver ``signals``).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._cargado = dict(zip(field_names, values))
+        return instancia
+
+
 # creacion de perfil universitario
-class PerfilUniversitario(models.Model):
+class PerfilUniversitario(PerfilIdGlobalMixin, ValoresCargadosMixin, models.Model):
     usuario = models.OneToOneField(
         Usuario,
         on_delete=models.CASCADE,
         related_name='perfil_universitario'
     )
-    universidad = models.CharField(max_length=100)
-    carrera = models.CharField(max_length=100)
+    universidad = models.ForeignKey(Universidad, on_delete=models.PROTECT, related_name='perfiles')
+    carrera = models.ForeignKey(Carrera, on_delete=models.PROTECT, related_name='perfiles')
     total_semestres = models.PositiveIntegerField()
     semestre_actual = models.PositiveIntegerField()
     creditos_para_graduarse = models.PositiveIntegerField()
     creditos_aprobados = models.PositiveIntegerField(default=0)
+    # se marca en avanzar_periodo cuando el estudiante ya cursó el último semestre
+    finalizado = models.BooleanField(default=False)
+
+    objects = PerfilManager()
 
     def clean(self):  # 👈 aquí
         if self.semestre_actual > self.total_semestres:
@@ -105,18 +246,22 @@ class PerfilUniversitario(models.Model):
         return f"{self.usuario.email} - {self.carrera}"
 
 # creeacion del perfil de secundaria
-class PerfilSecundaria(models.Model):
+class PerfilSecundaria(PerfilIdGlobalMixin, ValoresCargadosMixin, models.Model):
     usuario = models.OneToOneField(
         Usuario,
         on_delete=models.CASCADE,
         related_name='perfil_secundaria'
     )
-    nombre_instituto = models.CharField(max_length=100)
-    curso_actual = models.CharField(max_length=100)
+    instituto = models.ForeignKey(Instituto, on_delete=models.PROTECT, related_name='perfiles')
+    curso = models.ForeignKey(Curso, on_delete=models.PROTECT, related_name='perfiles')
     total_de_periodos = models.PositiveIntegerField()
     periodo_actual = models.PositiveIntegerField()
     total_de_materias = models.PositiveIntegerField()
     total_de_materias_para_aprobacion = models.PositiveIntegerField()
+    # se marca en avanzar_periodo cuando el estudiante ya cursó el último periodo
+    finalizado = models.BooleanField(default=False)
+
+    objects = PerfilManager()
 
     def clean(self):
         if self.periodo_actual > self.total_de_periodos:
@@ -127,5 +272,77 @@ class PerfilSecundaria(models.Model):
         verbose_name_plural = "Perfiles Secundaria"
 
     def __str__(self):
-        return f"{self.usuario.email} - {self.curso_actual}"
+        return f"{self.usuario.email} - {self.curso}"
+
+
+
+# registro de cambios para sincronizar sistemas externos, ver cambios.py
+class IdTransaccion(models.Func):
+    """
+    Id de la transacción que inserta la fila (``pg_current_xact_id()``) en
+    Postgres; 0 en los demás motores. Ver ``cambios``.
+    """
+    output_field = models.BigIntegerField()
+    allowed_default = True
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return '0', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return 'pg_current_xact_id()::text::bigint', []
+
+
+class Cambio(models.Model):
+    OPERACION_CHOICES = [
+        ('U', 'Creado o modificado'),
+        ('D', 'Borrado'),
+        ('M', 'Movido a otro shard'),
+    ]
+
+    # el feed se lee en orden (transaccion, id): el cursor es el último par leído
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.BigIntegerField()
+    operacion = models.CharField(max_length=1, choices=OPERACION_CHOICES)
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    transaccion = models.BigIntegerField(db_default=IdTransaccion())
+
+    class Meta:
+        verbose_name = "Cambio"
+        verbose_name_plural = "Cambios"
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id']),
+            models.Index(fields=['transaccion', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} {self.operacion}"
+
+
+# avance de avanzar_periodo; se guarda en la BD y la transacción de cada bloque que registra
+class AvancePeriodo(models.Model):
+    modelo = models.CharField(max_length=30, primary_key=True)
+    ultimo_pk = models.BigIntegerField(default=0)
+    terminado = models.BooleanField(default=False)
+    # filas de la misma corrida; las de otra quedaron de una corrida anterior
+    corrida = models.CharField(max_length=32, default='')
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Avance de periodo"
+        verbose_name_plural = "Avances de periodo"
 
+    def __str__(self):
+        return f"{self.modelo}: {self.ultimo_pk}"
+
+
+# contadores globales en la BD default; ver sharding.nuevo_id y nuevo_id_perfil
+class SecuenciaId(models.Model):
+    nombre = models.CharField(max_length=30, primary_key=True)
+    siguiente = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Secuencia de ids"
+        verbose_name_plural = "Secuencias de ids"
+
+    def __str__(self):
+        return f"{self.nombre}: {self.siguiente}"
@@ -0,0 +1,8 @@
+import unicodedata
+
+
+def normalizar(valor: str) -> str:
+    """Quita tildes, pasa a minúsculas y colapsa los espacios."""
+    descompuesto = unicodedata.normalize('NFKD', valor)
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
@@ -0,0 +1,94 @@
+"""
+Avance de periodo académico en bloque.
+
+Cada fin de periodo todos los estudiantes suben un semestre/periodo. Hacerlo
+fila por fila con ``save()`` no escala, así que aquí se hace con ``UPDATE``
+por rangos de id, manteniendo la regla de ``clean()`` (el actual nunca supera
+el total) como condición SQL.
+
+Con ``checkpoint`` el último id procesado se guarda en ``AvancePeriodo``
+dentro de la misma transacción que el bloque: si el proceso muere, el bloque
+y su avance quedan los dos o ninguno, y reanudar nunca avanza dos veces a
+nadie.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from . import cambios
+from .models import AvancePeriodo, PerfilUniversitario, PerfilSecundaria
+
+# modelo -> (campo del periodo actual, campo del total)
+CAMPOS_PERIODO = {
+    PerfilUniversitario: ('semestre_actual', 'total_semestres'),
+    PerfilSecundaria: ('periodo_actual', 'total_de_periodos'),
+}
+
+CHUNK_SIZE = 10_000
+
+
+def avanzar_periodo(modelo, queryset=None, chunk_size: int = CHUNK_SIZE, desde_pk: int = 0,
+                    dry_run: bool = False, al_terminar_chunk=None, using: str = 'default',
+                    checkpoint: str = None) -> dict:
+    """
+    Avanza un periodo a todos los perfiles no finalizados del modelo.
+
+    Los perfiles que ya están en su último periodo no se avanzan (eso
+    violaría ``clean()``); se marcan como ``finalizado``.
+
+    Args:
+        modelo: ``PerfilUniversitario`` o ``PerfilSecundaria``.
+        queryset: Restringe el avance a estos perfiles (acción del admin).
+        chunk_size: Filas por transacción.
+        desde_pk: Ignora los perfiles con id menor o igual (reanudar).
+        dry_run: Solo cuenta, no modifica nada.
+        al_terminar_chunk: Callback que recibe el último id procesado.
+        using: BD (shard) a procesar si no se pasa ``queryset``.
+        checkpoint: Clave de ``AvancePeriodo`` donde guardar el avance.
+
+    Returns:
+        dict: Cantidad de perfiles ``avanzados`` y ``finalizados``.
+    """
+    actual, total = CAMPOS_PERIODO[modelo]
+    if queryset is None:
+        queryset = modelo.objects.using(using)
+    pendientes = queryset.filter(finalizado=False)
+
+    resultado = {'avanzados': 0, 'finalizados': 0}
+    ultimo_pk = desde_pk
+    while True:
+        # id del último perfil del chunk, así los rangos no quedan vacíos con ids dispersos
+        ids = list(
+            pendientes.filter(pk__gt=ultimo_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        hasta_pk = ids[-1]
+        rango = pendientes.filter(pk__gt=ultimo_pk, pk__lte=hasta_pk)
+        en_ultimo_periodo = rango.filter(**{f'{actual}__gte': F(total)})
+        por_avanzar = rango.filter(**{f'{actual}__lt': F(total)})
+
+        if dry_run:
+            resultado['finalizados'] += en_ultimo_periodo.count()
+            resultado['avanzados'] += por_avanzar.count()
+        else:
+            with transaction.atomic(using=queryset.db):
+                # primero se marcan los que terminan, luego se avanza al resto
+                resultado['finalizados'] += en_ultimo_periodo.update(finalizado=True)
+                resultado['avanzados'] += por_avanzar.update(**{actual: F(actual) + 1})
+                # update() no dispara señales: el feed de cambios se alimenta aquí
+                cambios.registrar(modelo, ids, using=queryset.db)
+                if checkpoint:
+                    AvancePeriodo.objects.using(queryset.db).update_or_create(
+                        modelo=checkpoint, defaults={'ultimo_pk': hasta_pk}
+                    )
+
+        ultimo_pk = hasta_pk
+        if al_terminar_chunk:
+            al_terminar_chunk(ultimo_pk)
+
+    if checkpoint and not dry_run:
+        AvancePeriodo.objects.using(queryset.db).update_or_create(
+            modelo=checkpoint, defaults={'ultimo_pk': ultimo_pk, 'terminado': True}
+        )
+    return resultado
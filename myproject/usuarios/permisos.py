@@ -0,0 +1,92 @@
+"""
+Caché de permisos de ``Usuario`` compartida entre requests.
+
+``PermissionsMixin`` consulta grupos y ``user_permissions`` la primera vez
+que se revisa un permiso en cada request. Aquí el conjunto de permisos se
+guarda en la caché de Django con una clave que incluye dos versiones:
+
+- la del usuario, que sube cuando cambian sus grupos o permisos directos;
+- una global, que sube cuando cambian los permisos de algún grupo.
+
+La clave también lleva ``is_superuser``, que cambia el resultado de
+``ModelBackend`` sin tocar grupos ni permisos: quitarle el superusuario a
+alguien cambia la clave al instante, incluso con ``update()``. Los usuarios
+inactivos no llegan a la caché (ver ``backends``).
+
+Las versiones suben al confirmarse la transacción que hizo el cambio. Si
+subieran antes, un request concurrente podría guardar los permisos viejos,
+que todavía ve, bajo la versión nueva. Subir una versión deja las entradas
+viejas sin uso; expiran solas.
+
+Solo se cachea entre requests si la caché ``default`` la comparten todos los
+workers (Redis, Memcached, ...). Con una caché por proceso, como la
+``LocMemCache`` que Django usa por defecto, la versión que sube un worker no
+la ven los demás y seguirían sirviendo permisos revocados; en ese caso los
+permisos se calculan en cada request, como en ``ModelBackend``.
+"""
+
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'permisos'
+
+# backends de caché que cada proceso tiene por su cuenta
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_compartida() -> bool:
+    return settings.CACHES['default']['BACKEND'] not in CACHES_POR_PROCESO
+
+
+def _clave_version(usuario_id=None) -> str:
+    if usuario_id is None:
+        return f'{PREFIJO}:version'
+    return f'{PREFIJO}:version:{usuario_id}'
+
+
+def _subir(clave: str) -> None:
+    # add no pisa un valor existente; incr es atómico en los backends que lo soportan
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # la clave expiró entre add e incr
+        cache.set(clave, 1, timeout=None)
+
+
+def invalidar_usuario(usuario_id, using: str = None) -> None:
+    """Sube la versión del usuario cuando se confirme la transacción de ``using``."""
+    transaction.on_commit(partial(_subir, _clave_version(usuario_id)), using=using)
+
+
+def invalidar_todos(using: str = None) -> None:
+    transaction.on_commit(partial(_subir, _clave_version()), using=using)
+
+
+def clave_permisos(usuario_id, superusuario: bool = False) -> str:
+    versiones = cache.get_many([_clave_version(), _clave_version(usuario_id)])
+    return (
+        f'{PREFIJO}:{usuario_id}:{int(superusuario)}'
+        f':{versiones.get(_clave_version(), 0)}'
+        f':{versiones.get(_clave_version(usuario_id), 0)}'
+    )
+
+
+def obtener_permisos(usuario_id, calcular, superusuario: bool = False) -> set:
+    """
+    Devuelve los permisos cacheados del usuario o los calcula con ``calcular()``.
+    """
+    if not cache_compartida():
+        return calcular()
+    clave = clave_permisos(usuario_id, superusuario)
+    permisos = cache.get(clave)
+    if permisos is None:
+        permisos = calcular()
+        cache.set(clave, permisos, timeout=getattr(settings, 'PERMISOS_CACHE_TIMEOUT', 3600))
+    return permisos
@@ -0,0 +1,74 @@
+"""
+Router de bases de datos para el sharding de usuarios (ver ``sharding``).
+
+``Usuario`` y sus perfiles se leen y escriben en el shard del usuario cuando
+Django pasa la instancia como pista (``save()``, ``delete()``, accesos como
+``usuario.perfil_universitario``). Sin pista, las consultas van a
+``default``: las que tienen que ver todos los shards usan ``.using(alias)``
+por cada uno de ``sharding.shards()``. Con el sharding desactivado el router
+no opina y todo queda como antes.
+"""
+
+from . import sharding
+
+MODELOS_SHARDEADOS = {'usuario', 'perfiluniversitario', 'perfilsecundaria'}
+CATALOGOS = {'universidad', 'carrera', 'instituto', 'curso'}
+
+# apps con tablas en cualquier alias que no sea default: usuarios, grupos/permisos y catálogos
+APPS_EN_SHARDS = {'usuarios', 'auth', 'contenttypes'}
+SOLO_DEFAULT = {'secuenciaid'}
+
+
+def _nombre(modelo) -> str:
+    return modelo._meta.model_name
+
+
+def _shard_de_instancia(instancia):
+    nombre = _nombre(type(instancia))
+    if nombre not in MODELOS_SHARDEADOS:
+        return None
+    if instancia._state.db and not instancia._state.adding:
+        # ya salió de una BD: se queda ahí aunque el id apunte a otro shard
+        return instancia._state.db
+    if nombre == 'usuario':
+        if instancia.pk is not None:
+            return sharding.shard_de_id(instancia.pk)
+        return sharding.shard_de_email(instancia.email)
+    usuario = instancia._state.fields_cache.get('usuario')
+    if usuario is not None and usuario._state.db:
+        return usuario._state.db
+    if instancia.usuario_id is not None:
+        return sharding.shard_de_id(instancia.usuario_id)
+    return None
+
+
+class ShardRouter:
+
+    def _db_para(self, model, **hints):
+        if not sharding.activo() or _nombre(model) not in MODELOS_SHARDEADOS:
+            return None
+        instancia = hints.get('instance')
+        if instancia is None:
+            return None
+        return _shard_de_instancia(instancia)
+
+    def db_for_read(self, model, **hints):
+        return self._db_para(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_para(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not sharding.activo():
+            return None
+        if _nombre(type(obj1)) in CATALOGOS or _nombre(type(obj2)) in CATALOGOS:
+            # los catálogos están replicados con el mismo id en todos los shards
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding.activo() or db == 'default':
+            return None
+        if model_name in SOLO_DEFAULT:
+            return False
+        return app_label in APPS_EN_SHARDS
@@ -5,11 +5,16 @@ Contiene validaciones completas para el registro seguro de nuevos usuarios
 incluyendo validación de campos, contraseñas y reglas de negocio.
 """
 
-import re
+import string
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueValidator
+from rest_framework.settings import api_settings
 from django.contrib.auth.hashers import make_password
-from .models import Usuario, PerfilUniversitario
+from .models import Usuario, PerfilUniversitario, PerfilSecundaria, Catalogo, Universidad, Carrera, Instituto, Curso
+from .autocompletado import CAMPOS_AUTOCOMPLETADO, MAX_SUGERENCIAS
+from . import catalogos, sharding
+from .cambios import LIMITE as LIMITE_CAMBIOS, MAX_LIMITE as MAX_LIMITE_CAMBIOS
+from .listado import LIMITE as LIMITE_LISTADO, MAX_LIMITE as MAX_LIMITE_LISTADO
 
 # Constantes de validación
 MIN_PASSWORD_LENGTH = 8
@@ -18,14 +23,24 @@ MIN_AGE_REGISTRATION = 14
 MIN_AGE_UNRESTRICTED = 18
 MAX_AGE = 120
 
+EMAIL_REGISTRADO = "Este correo ya está registrado"
+
 SPECIAL_CHARS_PATTERN = r'[!@#$%^&*(),.?":{}|<>]'
 
 
+# caracteres de SPECIAL_CHARS_PATTERN, para revisarlos sin regex
+SPECIAL_CHARS = frozenset(SPECIAL_CHARS_PATTERN[1:-1])
+MAYUSCULAS = frozenset(string.ascii_uppercase)
+MINUSCULAS = frozenset(string.ascii_lowercase)
+
+
 # -> str indica que la función retorna texto
 def validar_texto(campo: str, value: str) -> str:
     """
     Valida que un campo de texto contenga solo letras y espacios.
 
+    Recorre el texto una sola vez y reporta todos los errores juntos.
+
     Args:
         campo: Nombre del campo para mensajes de error.
         value: Valor a validar.
@@ -41,17 +56,96 @@ def validar_texto(campo: str, value: str) -> str:
     if not value:
         raise serializers.ValidationError(f'El {campo} es obligatorio')
 
-    if any(char.isdigit() for char in value):
-        raise serializers.ValidationError(f'El {campo} no puede contener números')
-
-    if not all(char.isalpha() or char.isspace() for char in value):
-        raise serializers.ValidationError(
-            f'El {campo} solo puede contener letras y espacios'
-        )
+    con_numeros = False
+    otros = False
+    for char in set(value):
+        if char.isdigit():
+            con_numeros = True
+        elif not (char.isalpha() or char.isspace()):
+            otros = True
+
+    errores = []
+    if con_numeros:
+        errores.append(f'El {campo} no puede contener números')
+    if otros:
+        errores.append(f'El {campo} solo puede contener letras y espacios')
+    if errores:
+        raise serializers.ValidationError(errores)
 
     return ' '.join(word.capitalize() for word in value.split())
 
 
+def validar_password(value: str) -> str:
+    """
+    Valida la contraseña según estándares de seguridad.
+
+    Requisitos:
+    - Mínimo 8 caracteres, máximo 128
+    - Al menos un número
+    - Al menos una mayúscula
+    - Al menos una minúscula
+    - Al menos un carácter especial
+
+    Los caracteres se revisan en una sola pasada (como conjunto) y se
+    reportan todos los requisitos que faltan.
+    """
+    value = value.strip()
+
+    if not value:
+        raise serializers.ValidationError('El password es obligatorio')
+
+    errores = []
+    if len(value) < MIN_PASSWORD_LENGTH:
+        errores.append(f'La contraseña debe tener al menos {MIN_PASSWORD_LENGTH} caracteres')
+    if len(value) > MAX_PASSWORD_LENGTH:
+        errores.append(f'La contraseña debe tener máximo {MAX_PASSWORD_LENGTH} caracteres')
+
+    caracteres = set(value)
+    # \d de re acepta cualquier dígito decimal unicode, igual que isdecimal()
+    if not any(char.isdecimal() for char in caracteres):
+        errores.append('La contraseña debe contener al menos un número')
+    if caracteres.isdisjoint(MAYUSCULAS):
+        errores.append('La contraseña debe contener al menos una letra mayúscula')
+    if caracteres.isdisjoint(MINUSCULAS):
+        errores.append('La contraseña debe contener al menos una letra minúscula')
+    if caracteres.isdisjoint(SPECIAL_CHARS):
+        errores.append('La contraseña debe contener al menos un carácter especial')
+
+    if errores:
+        raise serializers.ValidationError(errores)
+    return value
+
+
+class CatalogoField(serializers.Field):
+    """
+    Campo que recibe y devuelve el nombre de una fila de catálogo.
+
+    El nombre se busca con la caché de ``catalogos``, así que validar un
+    nombre ya conocido no consulta la BD. Un nombre nuevo queda como
+    instancia sin guardar hasta ``crear_catalogos``, que corre en el
+    ``create()`` del serializer: validar nunca escribe en el catálogo.
+    """
+
+    def __init__(self, modelo, **kwargs):
+        self.modelo = modelo
+        self.texto = serializers.CharField(max_length=100)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return catalogos.buscar(self.modelo, self.texto.run_validation(data))
+
+    def to_representation(self, value):
+        return value.nombre
+
+
+def crear_catalogos(validated_data) -> dict:
+    """Crea las filas de catálogo nuevas que dejó ``CatalogoField``."""
+    for campo, valor in validated_data.items():
+        if isinstance(valor, Catalogo) and valor.pk is None:
+            validated_data[campo] = catalogos.resolver(type(valor), valor.nombre)
+    return validated_data
+
+
 class RegistroUsuarioSerializer(serializers.ModelSerializer):
     """
     Serializador para el registro de nuevos usuarios.
@@ -68,14 +162,9 @@ class RegistroUsuarioSerializer(serializers.ModelSerializer):
         }
     )
 
-    email = serializers.EmailField(
-        validators=[
-            UniqueValidator(
-                queryset=Usuario.objects.all(),
-                message="Este correo ya está registrado"
-            )
-        ]
-    )
+    # la unicidad la decide el índice único al insertar (ver RegistroView):
+    # validar no consulta la BD y dos registros simultáneos no pasan los dos
+    email = serializers.EmailField()
 
     password = serializers.CharField(write_only=True)
 
@@ -107,54 +196,8 @@ class RegistroUsuarioSerializer(serializers.ModelSerializer):
         return value
 
     def validate_password(self, value: str) -> str:
-        """
-        Valida la contraseña según estándares de seguridad.
-
-        Requisitos:
-        - Mínimo 8 caracteres, máximo 128
-        - Al menos un número
-        - Al menos una mayúscula
-        - Al menos una minúscula
-        - Al menos un carácter especial
-        - No ser una contraseña común
-        """
-        value = value.strip()
-
-        if not value:
-            raise serializers.ValidationError('El password es obligatorio')
-
-        if len(value) < MIN_PASSWORD_LENGTH:
-            raise serializers.ValidationError(
-                f'La contraseña debe tener al menos {MIN_PASSWORD_LENGTH} caracteres'
-            )
-
-        if len(value) > MAX_PASSWORD_LENGTH:
-            raise serializers.ValidationError(
-                f'La contraseña debe tener máximo {MAX_PASSWORD_LENGTH} caracteres'
-            )
-
-        if not re.search(r'\d', value):
-            raise serializers.ValidationError(
-                'La contraseña debe contener al menos un número'
-            )
-
-        if not re.search(r'[A-Z]', value):
-            raise serializers.ValidationError(
-                'La contraseña debe contener al menos una letra mayúscula'
-            )
-
-        if not re.search(r'[a-z]', value):
-            raise serializers.ValidationError(
-                'La contraseña debe contener al menos una letra minúscula'
-            )
-
-        if not re.search(SPECIAL_CHARS_PATTERN, value):
-            raise serializers.ValidationError(
-                'La contraseña debe contener al menos un carácter especial'
-            )
-
-
-        return value
+        """Valida la contraseña, ver ``validar_password``."""
+        return validar_password(value)
 
     # ========== Validador de objeto completo ==========
 
@@ -165,28 +208,26 @@ class RegistroUsuarioSerializer(serializers.ModelSerializer):
         - Edad mínima de 14 años
         - Aviso de restricciones para menores de 18
         - Nombre y apellido no pueden ser iguales
+
+        No consulta la BD: el email repetido lo detecta el insert.
         """
         edad = data.get('edad')
         nombre = data.get('nombre')
         apellido = data.get('apellido')
 
+        errores = {}
         if edad is None:
-            raise serializers.ValidationError({
-                'edad': "La edad es requerida para completar el registro"
-            })
-
-        if edad < MIN_AGE_REGISTRATION:
-            raise serializers.ValidationError({
-                'edad': f"Debes tener al menos {MIN_AGE_REGISTRATION} años para registrarte"
-            })
-
-        if edad < MIN_AGE_UNRESTRICTED:
+            errores['edad'] = ["La edad es requerida para completar el registro"]
+        elif edad < MIN_AGE_REGISTRATION:
+            errores['edad'] = [f"Debes tener al menos {MIN_AGE_REGISTRATION} años para registrarte"]
+        elif edad < MIN_AGE_UNRESTRICTED:
             data['aviso'] = "Puedes registrarte pero con ciertas restricciones de contenido"
 
         if nombre and apellido and nombre == apellido:
-            raise serializers.ValidationError(
-                "El nombre y el apellido no pueden ser iguales"
-            )
+            errores[api_settings.NON_FIELD_ERRORS_KEY] = ["El nombre y el apellido no pueden ser iguales"]
+
+        if errores:
+            raise serializers.ValidationError(errores)
 
         return data
 
@@ -200,8 +241,17 @@ class RegistroUsuarioSerializer(serializers.ModelSerializer):
         para proteger los datos del usuario.
         """
         validated_data.pop('aviso', None)  # ← aquí
+        email = validated_data['email']
+        alias = sharding.shard_de_email(email)
+        if sharding.activo() and sharding.configuracion()['RESPALDO']:
+            # los usuarios anteriores al sharding pueden estar en otro shard, fuera del alcance del índice único
+            if any(Usuario.objects.using(otro).filter(email=email).exists()
+                   for otro in sharding.shards() if otro != alias):
+                raise serializers.ValidationError({'email': [EMAIL_REGISTRADO]})
         validated_data['password'] = make_password(validated_data['password'])
-        return super().create(validated_data)
+        # savepoint: si el email ya existe el IntegrityError no invalida una transacción externa
+        with transaction.atomic(using=alias):
+            return super().create(validated_data)
 
 # validacion de los datos del login
 class LoginSerializer(serializers.Serializer):
@@ -217,6 +267,9 @@ class TipoEstudianteSerializer(serializers.ModelSerializer):
 
 # validaciond el perfil universitario
 class PerfilUniversitarioSerializer(serializers.ModelSerializer):
+    universidad = CatalogoField(Universidad)
+    carrera = CatalogoField(Carrera)
+
     class Meta:
         model = PerfilUniversitario
         fields = ['universidad', 'carrera', 'total_semestres', 'semestre_actual', 'creditos_para_graduarse']
@@ -225,7 +278,98 @@ class PerfilUniversitarioSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         if user.tipo_estudiante != 'U':
             raise serializers.ValidationError("Solo usuarios universitarios pueden crear este perfil.")
-        if hasattr(user, 'perfil_universitario'):
-            raise serializers.ValidationError("Este usuario ya tiene perfil universitario.")
+        # el perfil repetido lo detecta el índice único de usuario al insertar (ver la vista)
         return attrs
 
+    def create(self, validated_data):
+        with transaction.atomic(using=validated_data['usuario']._state.db or 'default'):
+            return super().create(crear_catalogos(validated_data))
+
+
+
+# validacion del perfil de secundaria
+class PerfilSecundariaSerializer(serializers.ModelSerializer):
+    nombre_instituto = CatalogoField(Instituto, source='instituto')
+    curso_actual = CatalogoField(Curso, source='curso')
+
+    class Meta:
+        model = PerfilSecundaria
+        fields = ['nombre_instituto', 'curso_actual', 'total_de_periodos', 'periodo_actual',
+                  'total_de_materias', 'total_de_materias_para_aprobacion']
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if user.tipo_estudiante != 'C':
+            raise serializers.ValidationError("Solo usuarios de colegio pueden crear este perfil.")
+        # el perfil repetido lo detecta el índice único de usuario al insertar (ver la vista)
+        return attrs
+
+    def create(self, validated_data):
+        with transaction.atomic(using=validated_data['usuario']._state.db or 'default'):
+            return super().create(crear_catalogos(validated_data))
+
+
+# parametros del autocompletado
+class AutocompletarSerializer(serializers.Serializer):
+    campo = serializers.ChoiceField(choices=list(CAMPOS_AUTOCOMPLETADO))
+    q = serializers.CharField(max_length=100, trim_whitespace=False)
+    limite = serializers.IntegerField(min_value=1, max_value=MAX_SUGERENCIAS, default=10)
+
+
+# consulta masiva de estado de usuarios (staff)
+MAX_CONSULTA_ESTADO = 5000
+
+
+class EstadoUsuariosSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), max_length=MAX_CONSULTA_ESTADO,
+                                required=False)
+    emails = serializers.ListField(child=serializers.EmailField(), max_length=MAX_CONSULTA_ESTADO,
+                                   required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('emails' in attrs):
+            raise serializers.ValidationError("Envía 'ids' o 'emails', no ambos.")
+        return attrs
+
+
+# carga masiva de créditos (staff)
+MAX_MOVIMIENTOS_CREDITOS = 5000
+
+
+class MovimientoCreditosSerializer(serializers.Serializer):
+    usuario = serializers.IntegerField(min_value=1, required=False)
+    email = serializers.EmailField(required=False)
+    delta = serializers.IntegerField()
+
+    def validate(self, attrs):
+        if ('usuario' in attrs) == ('email' in attrs):
+            raise serializers.ValidationError("Envía 'usuario' o 'email', no ambos.")
+        return attrs
+
+
+class CreditosSerializer(serializers.Serializer):
+    movimientos = serializers.ListField(child=MovimientoCreditosSerializer(), allow_empty=False,
+                                        max_length=MAX_MOVIMIENTOS_CREDITOS)
+
+
+# parametros del feed de cambios
+class CambiosSerializer(serializers.Serializer):
+    # '<transaccion>-<id>' tal como lo devuelve el feed; un número solo es un cursor anterior
+    desde = serializers.RegexField(r'^\d+(-\d+)?$', max_length=41, default='0',
+                                   error_messages={'invalid': "Cursor inválido."})
+    limite = serializers.IntegerField(min_value=1, max_value=MAX_LIMITE_CAMBIOS, default=LIMITE_CAMBIOS)
+    # con sharding cada shard tiene su feed y su cursor
+    shard = serializers.CharField(default='default')
+
+    def validate_shard(self, value):
+        if value not in sharding.shards():
+            raise serializers.ValidationError(f"Shard desconocido. Opciones: {', '.join(sharding.shards())}")
+        return value
+
+
+# parametros del listado de usuarios (staff)
+class ListadoUsuariosSerializer(serializers.Serializer):
+    desde = serializers.IntegerField(min_value=0, default=0)
+    limite = serializers.IntegerField(min_value=1, max_value=MAX_LIMITE_LISTADO, default=LIMITE_LISTADO)
+    tipo_estudiante = serializers.ChoiceField(choices=Usuario.TIPO_ESTUDIANTE_CHOICES, required=False)
+    activo = serializers.BooleanField(required=False, allow_null=True, default=None)
@@ -0,0 +1,276 @@
+"""
+Reparto de ``Usuario`` y sus perfiles entre varias bases de datos.
+
+Cada usuario cae en uno de ``BUCKETS`` buckets y cada bucket vive en un shard
+(un alias de ``DATABASES``): ``shards[bucket % len(shards)]``. El bucket de un
+usuario nuevo sale del hash de su email, y su id se arma para que
+``id % BUCKETS`` sea ese mismo bucket. Así tanto el login (por email) como la
+autenticación JWT (por id) van directo a un solo shard.
+
+Los ids de usuario y de perfil salen de contadores globales en ``default``
+(``SecuenciaId``) que se reservan por bloques, así no se repiten entre shards
+y un perfil conserva su id cuando su usuario cambia de shard. Los perfiles
+viven en el shard de su usuario.
+Los catálogos se replican con el mismo id en todos los shards, porque los
+perfiles los referencian con FK.
+
+Los usuarios creados antes de activar el sharding conservan su id; están en
+el shard de ``id % BUCKETS`` (ver ``rebalancear_shards``) pero su email puede
+caer en otro bucket, por eso las búsquedas por email que no encuentran nada
+en el shard esperado prueban en los demás (``RESPALDO``).
+
+Configuración en ``settings.SHARDING``::
+
+    ACTIVO    False: todo en ``default``, sin ruteo
+    SHARDS    aliases de ``DATABASES`` que guardan usuarios, en orden
+    BUCKETS   cantidad fija de buckets; no se puede cambiar con datos
+    MAPA      archivo JSON con los shards según los cuales están los datos
+              hoy; lo escribe ``rebalancear_shards``, tiene prioridad sobre
+              SHARDS y cada proceso lo relee cuando cambia
+    RESPALDO  buscar en todos los shards lo que no está en el esperado
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'ACTIVO': False,
+    'SHARDS': ['default'],
+    'BUCKETS': 1024,
+    'MAPA': None,
+    'RESPALDO': True,
+}
+
+# ids reservados por vez en SecuenciaId
+BLOQUE_IDS = 100
+
+# segundos entre revisiones del archivo MAPA en cada proceso
+REVISAR_MAPA_S = 1.0
+
+# True mientras rebalancear_shards mueve filas: las señales no lo toman como alta/borrado
+_moviendo = ContextVar('sharding_moviendo', default=False)
+
+# (última revisión, firma del archivo, shards leídos)
+_estado_mapa = (float('-inf'), None, None)
+
+_ids_lock = threading.Lock()
+# nombre del modelo -> ids reservados sin usar
+_ids_reservados = {}
+
+
+@lru_cache(maxsize=1)
+def configuracion() -> dict:
+    config = {**DEFAULTS, **getattr(settings, 'SHARDING', {})}
+    config['SHARDS'] = list(config['SHARDS'])
+    return config
+
+
+def _firma_mapa(ruta: str):
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    # os.replace cambia el inodo aunque el mtime coincida
+    return estado.st_ino, estado.st_mtime_ns, estado.st_size
+
+
+def _mapa() -> list:
+    """
+    Shards del archivo ``MAPA``, releído cuando cambia.
+
+    Cada proceso mira el archivo como mucho cada ``REVISAR_MAPA_S``: los
+    workers que ya estaban corriendo ven el mapa que escribe
+    ``rebalancear_shards`` sin reiniciarse.
+    """
+    global _estado_mapa
+    ruta = configuracion()['MAPA']
+    if not ruta:
+        return None
+    revisado, firma, aliases = _estado_mapa
+    ahora = time.monotonic()
+    if ahora - revisado < REVISAR_MAPA_S:
+        return aliases
+    nueva = _firma_mapa(ruta)
+    if nueva != firma:
+        aliases = None
+        if nueva is not None:
+            with open(ruta, encoding='utf-8') as archivo:
+                aliases = json.load(archivo)['shards']
+    # una sola asignación: otro hilo ve el estado viejo o el nuevo, nunca una mezcla
+    _estado_mapa = (ahora, nueva, aliases)
+    return aliases
+
+
+def _olvidar_mapa() -> None:
+    global _estado_mapa
+    _estado_mapa = (float('-inf'), None, None)
+
+
+@receiver(setting_changed)
+def limpiar_configuracion(*, setting, **kwargs):
+    if setting == 'SHARDING':
+        configuracion.cache_clear()
+        _olvidar_mapa()
+        # los ids reservados dependen de BUCKETS
+        with _ids_lock:
+            _ids_reservados.clear()
+
+
+def activo() -> bool:
+    return configuracion()['ACTIVO']
+
+
+def shards() -> list:
+    """Shards donde están hoy los datos (``['default']`` si no hay sharding)."""
+    if not activo():
+        return ['default']
+    return _mapa() or configuracion()['SHARDS']
+
+
+def escribir_mapa(aliases: list) -> None:
+    ruta = configuracion()['MAPA']
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump({'shards': aliases}, archivo)
+    os.replace(temporal, ruta)
+    _olvidar_mapa()
+
+
+def bucket_de_email(email: str) -> int:
+    digest = hashlib.blake2b(email.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % configuracion()['BUCKETS']
+
+
+def bucket_de_id(usuario_id: int) -> int:
+    return usuario_id % configuracion()['BUCKETS']
+
+
+def shard_de_bucket(bucket: int, aliases: list = None) -> str:
+    aliases = aliases or shards()
+    return aliases[bucket % len(aliases)]
+
+
+def shard_de_id(usuario_id: int) -> str:
+    if not activo():
+        return 'default'
+    return shard_de_bucket(bucket_de_id(int(usuario_id)))
+
+
+def shard_de_email(email: str) -> str:
+    if not activo():
+        return 'default'
+    return shard_de_bucket(bucket_de_email(email))
+
+
+def _reservar_bloque(modelo, escala: int) -> list:
+    from .models import SecuenciaId
+
+    nombre = modelo._meta.model_name
+    with transaction.atomic(using='default'):
+        secuencia = SecuenciaId.objects.using('default').select_for_update().filter(nombre=nombre).first()
+        if secuencia is None:
+            # arranca después del mayor id existente, para no chocar con filas previas
+            mayor = max(
+                (modelo.objects.using(alias).order_by('-pk').values_list('pk', flat=True).first() or 0)
+                for alias in shards()
+            )
+            secuencia = SecuenciaId.objects.using('default').create(nombre=nombre, siguiente=mayor // escala + 1)
+        inicio = secuencia.siguiente
+        secuencia.siguiente = inicio + BLOQUE_IDS
+        secuencia.save(using='default', update_fields=['siguiente'])
+    return list(range(inicio, inicio + BLOQUE_IDS))
+
+
+def _siguiente(modelo, escala: int = 1) -> int:
+    with _ids_lock:
+        reservados = _ids_reservados.setdefault(modelo._meta.model_name, [])
+        if not reservados:
+            reservados.extend(reversed(_reservar_bloque(modelo, escala)))
+        return reservados.pop()
+
+
+def nuevo_id(email: str) -> int:
+    """Id global para un usuario nuevo, en el bucket de su email."""
+    from .models import Usuario
+
+    buckets = configuracion()['BUCKETS']
+    return _siguiente(Usuario, buckets) * buckets + bucket_de_email(email)
+
+
+def nuevo_id_perfil(modelo) -> int:
+    """Id global para un perfil nuevo de ``modelo``."""
+    return _siguiente(modelo)
+
+
+def agrupar(valores, shard_de) -> dict:
+    """``{alias: [valores]}`` según ``shard_de(valor)``, conservando el orden."""
+    grupos = {}
+    for valor in valores:
+        grupos.setdefault(shard_de(valor), []).append(valor)
+    return grupos
+
+
+def buscar(queryset_de, shard_esperado: str, **filtros):
+    """
+    ``get(**filtros)`` en el shard esperado y, si no está y hay respaldo, en los demás.
+
+    Args:
+        queryset_de: Función que recibe un alias y devuelve el queryset base.
+    """
+    queryset = queryset_de(shard_esperado)
+    try:
+        return queryset.get(**filtros)
+    except queryset.model.DoesNotExist:
+        if not (activo() and configuracion()['RESPALDO']):
+            raise
+    for alias in shards():
+        if alias == shard_esperado:
+            continue
+        try:
+            return queryset_de(alias).get(**filtros)
+        except queryset.model.DoesNotExist:
+            pass
+    raise queryset.model.DoesNotExist(f"{queryset.model.__name__} no existe en ningún shard")
+
+
+def fan_out_ordenado(queryset_de, orden: str, limite: int) -> list:
+    """
+    Junta los primeros ``limite`` objetos de todos los shards ordenados por ``orden``.
+
+    Cada shard devuelve como mucho ``limite`` filas ya ordenadas y aquí se
+    mezclan con ``heapq.merge``, así que el costo no depende del tamaño de
+    las tablas.
+    """
+    campo = orden.lstrip('-')
+    por_shard = [list(queryset_de(alias).order_by(orden)[:limite]) for alias in shards()]
+    mezclados = heapq.merge(
+        *por_shard,
+        key=lambda objeto: objeto[campo] if isinstance(objeto, dict) else getattr(objeto, campo),
+        reverse=orden.startswith('-'),
+    )
+    return [objeto for objeto, _ in zip(mezclados, range(limite))]
+
+
+def moviendo() -> bool:
+    return _moviendo.get()
+
+
+@contextmanager
+def modo_movimiento():
+    token = _moviendo.set(True)
+    try:
+        yield
+    finally:
+        _moviendo.reset(token)
@@ -0,0 +1,116 @@
+from functools import partial
+
+from django.db import transaction
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .autocompletado import CAMPOS_AUTOCOMPLETADO, actualizar_valor
+from .models import Usuario, PerfilUniversitario, PerfilSecundaria
+from .permisos import invalidar_usuario, invalidar_todos
+from . import cambios, catalogos, sharding
+
+# campos indexados por modelo, para leer solo esos al guardar
+CAMPOS_POR_MODELO = {}
+for _modelo, _campo in CAMPOS_AUTOCOMPLETADO.values():
+    CAMPOS_POR_MODELO.setdefault(_modelo, []).append(_campo)
+
+
+# ========== Índice de autocompletado ==========
+
+def _nombres_catalogo(sender, instance) -> dict:
+    # por id y desde la caché de catálogos: sin cargar un catálogo por perfil en los borrados masivos
+    return {
+        campo: catalogos.nombre_de(sender._meta.get_field(campo).related_model, getattr(instance, f'{campo}_id'))
+        for campo in CAMPOS_POR_MODELO[sender]
+    }
+
+
+@receiver(pre_save, sender=PerfilUniversitario)
+@receiver(pre_save, sender=PerfilSecundaria)
+def recordar_valores_autocompletado(sender, instance, **kwargs):
+    if sharding.moviendo():
+        return
+    # contra los ids con que se leyó el perfil: sin otra consulta por cada save
+    cargado = getattr(instance, '_cargado', {})
+    instance._autocompletado_anterior = {
+        campo: catalogos.nombre_de(sender._meta.get_field(campo).related_model, cargado[f'{campo}_id'])
+        for campo in CAMPOS_POR_MODELO[sender]
+        if cargado.get(f'{campo}_id') is not None
+    }
+
+
+@receiver(post_save, sender=PerfilUniversitario)
+@receiver(post_save, sender=PerfilSecundaria)
+def actualizar_autocompletado(sender, instance, **kwargs):
+    if sharding.moviendo():
+        return
+    anterior = getattr(instance, '_autocompletado_anterior', {})
+    nuevo = _nombres_catalogo(sender, instance)
+    # el próximo save de esta instancia compara contra lo que se acaba de guardar
+    instance._cargado = {
+        **getattr(instance, '_cargado', {}),
+        **{f'{campo}_id': getattr(instance, f'{campo}_id') for campo in CAMPOS_POR_MODELO[sender]},
+    }
+    # solo si la transacción se confirma
+    transaction.on_commit(partial(actualizar_valor, sender, anterior, nuevo), using=kwargs['using'])
+
+
+@receiver(post_delete, sender=PerfilUniversitario)
+@receiver(post_delete, sender=PerfilSecundaria)
+def quitar_autocompletado(sender, instance, **kwargs):
+    if sharding.moviendo():
+        # rebalancear_shards: el perfil sigue existiendo en otro shard
+        return
+    anterior = _nombres_catalogo(sender, instance)
+    transaction.on_commit(partial(actualizar_valor, sender, anterior, {}), using=kwargs['using'])
+
+
+# ========== Caché de permisos ==========
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def invalidar_permisos_usuario(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidar_usuario(instance.pk, using=using)
+    elif pk_set:
+        # desde el lado del grupo/permiso: pk_set son ids de usuarios
+        for usuario_id in pk_set:
+            invalidar_usuario(usuario_id, using=using)
+    else:
+        # clear() desde el grupo/permiso no dice qué usuarios tocó
+        invalidar_todos(using=using)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidar_permisos_grupo(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        invalidar_todos(using=using)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidar_permisos_borrados(sender, using, **kwargs):
+    invalidar_todos(using=using)
+
+
+# ========== Feed de cambios ==========
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=PerfilUniversitario)
+@receiver(post_save, sender=PerfilSecundaria)
+def registrar_cambio(sender, instance, **kwargs):
+    # en la misma transacción (y BD) que el cambio: si se revierte, el cambio tampoco queda
+    cambios.registrar(sender, [instance.pk], using=kwargs['using'])
+
+
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=PerfilUniversitario)
+@receiver(post_delete, sender=PerfilSecundaria)
+def registrar_borrado(sender, instance, **kwargs):
+    if sharding.moviendo() or cambios.en_bloque():
+        # rebalancear_shards y los borrados masivos registran todo de una vez
+        return
+    cambios.registrar(sender, [instance.pk], operacion='D', using=kwargs['using'])
@@ -1,11 +1,59 @@
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth.hashers import make_password
 from .models import Usuario
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.exceptions import ValidationError
-from .models import PerfilUniversitario, PerfilSecundaria
+from .models import PerfilUniversitario, PerfilSecundaria, Universidad, Carrera, Instituto, Curso
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings, TransactionTestCase
+from django.conf import settings
+from . import sharding
+from . import coalescencia
+import asyncio
+import threading
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import CommandError
+from .hashers import MIN_ITERATIONS, PBKDF2CalibradoPasswordHasher
+from .periodos import avanzar_periodo
+from .creditos import sumar_creditos
+from .arranque import precalentar, post_worker_init
+from .cambios import compactar_cambios, obtener_cambios
+from . import cambios
+from . import archivo
+from .models import Cambio, AvancePeriodo
+from datetime import timedelta
+from django.utils import timezone
+from .serializers import RegistroUsuarioSerializer
+from .estres import estresar
+import time
+from .autocompletado import reiniciar_indices, sugerir
+from .catalogos import resolver, limpiar_cache
+from .admin import ConteoEstimadoPaginator, actualizar_por_chunks
+from .memoria import reiniciar as reiniciar_memoria
+from . import memoria
+from .middleware import PerfilMemoriaMiddleware
+from . import consultas_lentas
+from django.core.exceptions import MiddlewareNotUsed
+import csv
+import statistics
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+try:
+    import numpy
+except ImportError:
+    numpy = None
 class RegistroUsuarioTestCase(APITestCase):
 
     def setUp(self):
@@ -72,6 +120,47 @@ class RegistroUsuarioTestCase(APITestCase):
         self.client.post(self.url, self.datos_validos, format='json')
         response = self.client.post(self.url, self.datos_validos, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['email'], ["Este correo ya está registrado"])
+
+    def test_email_duplicado_lo_detecta_el_insert(self):
+        self.client.post(self.url, self.datos_validos, format='json')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(self.url, self.datos_validos, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        sentencias = [c['sql'].split()[0].upper() for c in consultas.captured_queries]
+        sentencias = [s for s in sentencias if s not in ('SAVEPOINT', 'RELEASE', 'ROLLBACK')]
+        # sin consulta previa: primero el INSERT y solo al fallar se confirma el motivo
+        self.assertEqual(sentencias, ['INSERT', 'SELECT'])
+
+    # ========== Orden y costo de la validación ==========
+
+    def test_password_reporta_todos_los_errores(self):
+        self.datos_validos['password'] = 'abc'
+        response = self.client.post(self.url, self.datos_validos, format='json')
+        self.assertEqual(response.data['password'], [
+            'La contraseña debe tener al menos 8 caracteres',
+            'La contraseña debe contener al menos un número',
+            'La contraseña debe contener al menos una letra mayúscula',
+            'La contraseña debe contener al menos un carácter especial',
+        ])
+
+    def test_payload_invalido_no_consulta_la_bd(self):
+        self.datos_validos['apellido'] = 'Juan'
+        serializer = RegistroUsuarioSerializer(data=self.datos_validos)
+        with self.assertNumQueries(0):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['non_field_errors'], ["El nombre y el apellido no pueden ser iguales"])
+
+    def test_payload_valido_no_consulta_la_bd(self):
+        # la unicidad la resuelve el insert; el tiempo se mide con medir_validacion
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.assertTrue(RegistroUsuarioSerializer(data=self.datos_validos).is_valid())
+
+    def test_medir_validacion(self):
+        out = StringIO()
+        call_command('medir_validacion', '--requests', '10', stdout=out)
+        self.assertIn('µs/request', out.getvalue())
 
     def test_nombre_igual_apellido(self):
         self.datos_validos['nombre'] = 'Juan'
@@ -181,8 +270,8 @@ class PerfilUniversitarioTestCase(APITestCase):
     def test_creacion_perfil_universitario_exitoso(self):
         perfil = PerfilUniversitario.objects.create(
             usuario=self.usuario,
-            universidad="Universidad Nacional",
-            carrera="Ingeniería",
+            universidad=resolver(Universidad, "Universidad Nacional"),
+            carrera=resolver(Carrera, "Ingeniería"),
             total_semestres=10,
             semestre_actual=5,
             creditos_para_graduarse=160,
@@ -194,8 +283,8 @@ class PerfilUniversitarioTestCase(APITestCase):
     def test_semestre_mayor_que_total(self):
         perfil = PerfilUniversitario(
             usuario=self.usuario,
-            universidad="Universidad Nacional",
-            carrera="Ingeniería",
+            universidad=resolver(Universidad, "Universidad Nacional"),
+            carrera=resolver(Carrera, "Ingeniería"),
             total_semestres=8,
             semestre_actual=10,
             creditos_para_graduarse=160,
@@ -220,8 +309,8 @@ class PerfilSecundariaTestCase(APITestCase):
     def test_creacion_perfil_secundaria_exitoso(self):
         perfil = PerfilSecundaria.objects.create(
             usuario=self.usuario,
-            nombre_instituto="Colegio ABC",
-            curso_actual="11°",
+            instituto=resolver(Instituto, "Colegio ABC"),
+            curso=resolver(Curso, "11°"),
             total_de_periodos=4,
             periodo_actual=2,
             total_de_materias=12,
@@ -233,8 +322,8 @@ class PerfilSecundariaTestCase(APITestCase):
     def test_periodo_mayor_que_total(self):
         perfil = PerfilSecundaria(
             usuario=self.usuario,
-            nombre_instituto="Colegio ABC",
-            curso_actual="11°",
+            instituto=resolver(Instituto, "Colegio ABC"),
+            curso=resolver(Curso, "11°"),
             total_de_periodos=3,
             periodo_actual=5,
             total_de_materias=12,
@@ -242,4 +331,1488 @@ class PerfilSecundariaTestCase(APITestCase):
         )
 
         with self.assertRaises(ValidationError):
-            perfil.full_clean()
\ No newline at end of file
+            perfil.full_clean()
+
+class RehashLoginTestCase(APITestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.config = os.path.join(self.directorio.name, 'hasher_config.json')
+        with open(self.config, 'w') as archivo:
+            json.dump({'iteraciones': 120_000}, archivo)
+
+        self.url = reverse('login')
+        self.hash_viejo = PBKDF2PasswordHasher().encode("Abc123!@", "saltsaltsalt", 110_000)
+        self.usuario = Usuario.objects.create(
+            nombre="Juan",
+            apellido="Perez",
+            edad=20,
+            genero="M",
+            email="juan@gmail.com",
+            password=self.hash_viejo
+        )
+
+    def test_login_rehashea_password_desactualizada(self):
+        with self.settings(PASSWORD_HASHER_CONFIG=self.config, REHASH_EN_SEGUNDO_PLANO=False):
+            response = self.client.post(self.url, {"email": "juan@gmail.com", "password": "Abc123!@"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.usuario.refresh_from_db()
+        self.assertNotEqual(self.usuario.password, self.hash_viejo)
+        # 120_000 en el archivo queda por debajo del mínimo
+        self.assertTrue(self.usuario.password.startswith(f'pbkdf2_sha256${MIN_ITERATIONS}$'))
+
+    def test_no_rehashea_a_menos_iteraciones(self):
+        hasher = PBKDF2CalibradoPasswordHasher()
+        mas_fuerte = f'pbkdf2_sha256${MIN_ITERATIONS * 2}${hasher.salt()}$hash'
+        igual = f'pbkdf2_sha256${MIN_ITERATIONS}${hasher.salt()}$hash'
+        with self.settings(PASSWORD_HASHER_CONFIG=self.config):
+            self.assertEqual(hasher.iterations, MIN_ITERATIONS)
+            self.assertFalse(hasher.must_update(mas_fuerte))
+            self.assertFalse(hasher.must_update(igual))
+            self.assertTrue(hasher.must_update(self.hash_viejo))
+
+    def test_login_fallido_no_rehashea(self):
+        with self.settings(PASSWORD_HASHER_CONFIG=self.config, REHASH_EN_SEGUNDO_PLANO=False):
+            response = self.client.post(self.url, {"email": "juan@gmail.com", "password": "Otra123!@"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.password, self.hash_viejo)
+
+    def test_calibrar_hash_escribe_configuracion(self):
+        salida = os.path.join(self.directorio.name, 'calibrado.json')
+        call_command('calibrar_hash', '--objetivo-ms', '1', '--repeticiones', '1', '--salida', salida, stdout=StringIO())
+        with open(salida) as archivo:
+            configuracion = json.load(archivo)
+        self.assertEqual(configuracion['algoritmo'], 'pbkdf2_sha256')
+        self.assertGreaterEqual(configuracion['iteraciones'], MIN_ITERATIONS)
+
+    def test_metricas_solo_staff(self):
+        response = self.client.get(reverse('metricas-hashers'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.client.force_authenticate(self.usuario)
+        response = self.client.get(reverse('metricas-hashers'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class SembrarUsuariosTestCase(APITestCase):
+
+    def test_sembrar_crea_usuarios_y_perfiles_validos(self):
+        call_command('sembrar_usuarios', '--n', '40', '--chunk', '15', stdout=StringIO())
+
+        self.assertEqual(Usuario.objects.count(), 40)
+        self.assertEqual(
+            PerfilUniversitario.objects.count(),
+            Usuario.objects.filter(tipo_estudiante='U').count()
+        )
+        self.assertEqual(
+            PerfilSecundaria.objects.count(),
+            Usuario.objects.filter(tipo_estudiante='C').count()
+        )
+        for perfil in PerfilUniversitario.objects.all():
+            perfil.full_clean()
+        for perfil in PerfilSecundaria.objects.all():
+            perfil.full_clean()
+
+    def test_sembrar_es_reproducible_y_continua_numeracion(self):
+        call_command('sembrar_usuarios', '--n', '10', '--dominio', 'a.test', stdout=StringIO())
+        call_command('sembrar_usuarios', '--n', '10', '--dominio', 'b.test', stdout=StringIO())
+        emails_a = [e.split('@')[0] for e in Usuario.objects.filter(email__endswith='@a.test').order_by('id').values_list('email', flat=True)]
+        emails_b = [e.split('@')[0] for e in Usuario.objects.filter(email__endswith='@b.test').order_by('id').values_list('email', flat=True)]
+        self.assertEqual(emails_a, emails_b)
+
+        call_command('sembrar_usuarios', '--n', '5', '--dominio', 'a.test', stdout=StringIO())
+        self.assertEqual(Usuario.objects.filter(email__endswith='@a.test').count(), 15)
+
+    def test_password_compartida_funciona(self):
+        call_command('sembrar_usuarios', '--n', '3', stdout=StringIO())
+        usuario = Usuario.objects.first()
+        response = self.client.post(reverse('login'), {"email": usuario.email, "password": "Abc123!@"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class AvanzarPeriodoTestCase(APITestCase):
+
+    def setUp(self):
+        self.perfiles = []
+        for i, (semestre, total) in enumerate([(1, 10), (9, 10), (10, 10), (3, 8)]):
+            usuario = Usuario.objects.create(
+                nombre="Juan", apellido="Perez", edad=20, genero="M",
+                email=f"juan{i}@gmail.com", password="x", tipo_estudiante='U'
+            )
+            self.perfiles.append(PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=total, semestre_actual=semestre,
+                creditos_para_graduarse=160, creditos_aprobados=0
+            ))
+
+    def test_avanza_y_marca_finalizados(self):
+        resultado = avanzar_periodo(PerfilUniversitario, chunk_size=3)
+        self.assertEqual(resultado, {'avanzados': 3, 'finalizados': 1})
+
+        semestres = [(p.semestre_actual, p.finalizado) for p in PerfilUniversitario.objects.order_by('pk')]
+        self.assertEqual(semestres, [(2, False), (10, False), (10, True), (4, False)])
+        for perfil in PerfilUniversitario.objects.all():
+            perfil.full_clean()
+
+    def test_dry_run_no_modifica(self):
+        out = StringIO()
+        call_command('avanzar_periodo', '--dry-run', stdout=out)
+        self.assertIn('universitario: 3 avanzados, 1 finalizados', out.getvalue())
+        self.assertEqual(PerfilUniversitario.objects.filter(finalizado=True).count(), 0)
+        self.assertFalse(AvancePeriodo.objects.exists())
+
+    def test_reanudar_desde_checkpoint(self):
+        AvancePeriodo.objects.create(modelo='universitario', ultimo_pk=self.perfiles[1].pk)
+
+        with self.assertRaises(CommandError):
+            call_command('avanzar_periodo', '--modelo', 'universitario', stdout=StringIO())
+
+        call_command('avanzar_periodo', '--modelo', 'universitario', '--reanudar', stdout=StringIO())
+        semestres = [p.semestre_actual for p in PerfilUniversitario.objects.order_by('pk')]
+        self.assertEqual(semestres, [1, 9, 10, 4])
+        self.assertTrue(AvancePeriodo.objects.get(modelo='universitario').terminado)
+        with self.assertRaises(CommandError):
+            call_command('avanzar_periodo', '--modelo', 'universitario', '--reanudar', stdout=StringIO())
+
+    def test_corte_despues_del_commit_no_avanza_dos_veces(self):
+        def cortar(ultimo_pk):
+            # el proceso muere apenas se confirma el primer bloque
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            avanzar_periodo(PerfilUniversitario, chunk_size=2, checkpoint='universitario', al_terminar_chunk=cortar)
+        call_command('avanzar_periodo', '--modelo', 'universitario', '--reanudar', '--chunk', '2',
+                     stdout=StringIO())
+        semestres = [p.semestre_actual for p in PerfilUniversitario.objects.order_by('pk')]
+        self.assertEqual(semestres, [2, 10, 10, 4])
+
+        # una corrida nueva vuelve a empezar desde el principio
+        call_command('avanzar_periodo', '--modelo', 'universitario', stdout=StringIO())
+        semestres = [p.semestre_actual for p in PerfilUniversitario.objects.order_by('pk')]
+        self.assertEqual(semestres, [3, 10, 10, 5])
+
+    def test_corte_entre_modelos_no_avanza_dos_veces(self):
+        from .management.commands import avanzar_periodo as comando
+        avanzar = comando.avanzar_periodo
+
+        def cortar_en_secundaria(modelo, **kwargs):
+            # el proceso muere después de terminar universitario y antes de empezar secundaria
+            if modelo is PerfilSecundaria:
+                raise KeyboardInterrupt
+            return avanzar(modelo, **kwargs)
+
+        with mock.patch.object(comando, 'avanzar_periodo', cortar_en_secundaria):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('avanzar_periodo', stdout=StringIO())
+        self.assertFalse(AvancePeriodo.objects.get(modelo='secundaria').terminado)
+
+        with self.assertRaises(CommandError):
+            call_command('avanzar_periodo', stdout=StringIO())
+        out = StringIO()
+        call_command('avanzar_periodo', '--reanudar', stdout=out)
+        self.assertIn('ya estaba terminado', out.getvalue())
+        semestres = [p.semestre_actual for p in PerfilUniversitario.objects.order_by('pk')]
+        self.assertEqual(semestres, [2, 10, 10, 4])
+        self.assertTrue(all(AvancePeriodo.objects.values_list('terminado', flat=True)))
+
+
+class AutocompletarTestCase(APITestCase):
+
+    def setUp(self):
+        reiniciar_indices()
+        self.addCleanup(reiniciar_indices)
+        self.addCleanup(limpiar_cache)
+        self.url = reverse('autocompletar')
+        self.usuario = Usuario.objects.create(
+            nombre="Juan", apellido="Perez", edad=20, genero="M",
+            email="juan@gmail.com", password="x", tipo_estudiante='U'
+        )
+        self.client.force_authenticate(self.usuario)
+        universidades = ["Universidad Nacional", "Universidad Nacional", "Universidad de los Andes", "Unión Central"]
+        for i, universidad in enumerate(universidades):
+            usuario = Usuario.objects.create(
+                nombre="Ana", apellido="Gomez", edad=20, genero="F",
+                email=f"ana{i}@gmail.com", password="x", tipo_estudiante='U'
+            )
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, universidad),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=10, semestre_actual=1, creditos_para_graduarse=160
+            )
+
+    def test_prefijo_ordenado_por_frecuencia(self):
+        response = self.client.get(self.url, {'campo': 'universidad', 'q': 'univ'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sugerencias'], ["Universidad Nacional", "Universidad de los Andes"])
+
+    def test_ignora_tildes_y_mayusculas(self):
+        response = self.client.get(self.url, {'campo': 'universidad', 'q': 'UNIÓN'})
+        self.assertEqual(response.data['sugerencias'], ["Unión Central"])
+        response = self.client.get(self.url, {'campo': 'carrera', 'q': 'ingenieria'})
+        self.assertEqual(response.data['sugerencias'], ["Ingeniería"])
+
+    def test_no_consulta_la_bd_y_se_actualiza_al_guardar(self):
+        self.client.get(self.url, {'campo': 'instituto', 'q': 'col'})
+        with self.assertNumQueries(0):
+            self.assertEqual(sugerir('instituto', 'col'), [])
+
+        otro = Usuario.objects.create(
+            nombre="Luis", apellido="Rojas", edad=15, genero="M",
+            email="luis@gmail.com", password="x", tipo_estudiante='C'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            PerfilSecundaria.objects.create(
+                usuario=otro, instituto=resolver(Instituto, "Colegio ABC"),
+                curso=resolver(Curso, "10°"),
+                total_de_periodos=4, periodo_actual=1, total_de_materias=12,
+                total_de_materias_para_aprobacion=10
+            )
+        self.assertEqual(sugerir('instituto', 'col'), ["Colegio ABC"])
+
+    def test_se_reconstruye_al_vencer(self):
+        self.assertEqual(sugerir('universidad', 'union'), ["Unión Central"])
+        # update() no dispara señales, como una escritura de otro worker
+        Universidad.objects.filter(clave="union central").update(nombre="Unión del Centro")
+        self.assertEqual(sugerir('universidad', 'union'), ["Unión Central"])
+        with self.settings(AUTOCOMPLETADO={'TTL_S': 0}):
+            self.assertEqual(sugerir('universidad', 'union'), ["Unión del Centro"])
+
+    def test_guardar_no_vuelve_a_leer_el_perfil(self):
+        sugerir('universidad', 'univ')
+        perfil = PerfilUniversitario.objects.get(universidad__nombre="Unión Central")
+        perfil.universidad = resolver(Universidad, "Universidad de los Andes")
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            perfil.save()
+        self.assertFalse([c for c in consultas.captured_queries
+                          if c['sql'].startswith('SELECT') and 'usuarios_perfiluniversitario' in c['sql']])
+        self.assertEqual(sugerir('universidad', 'univ'), ["Universidad de los Andes", "Universidad Nacional"])
+        self.assertEqual(sugerir('universidad', 'union'), [])
+
+    def test_campo_invalido(self):
+        response = self.client.get(self.url, {'campo': 'otro', 'q': 'a'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogosTestCase(APITestCase):
+
+    def setUp(self):
+        limpiar_cache()
+        self.addCleanup(limpiar_cache)
+        self.usuario = Usuario.objects.create(
+            nombre="Ana", apellido="Gomez", edad=16, genero="F",
+            email="ana@gmail.com", password="x", tipo_estudiante='C'
+        )
+        self.client.force_authenticate(self.usuario)
+
+    def test_perfil_secundaria_resuelve_nombres(self):
+        response = self.client.post(reverse('perfil-secundaria'), {
+            "nombre_instituto": "colegio  abc",
+            "curso_actual": "11°",
+            "total_de_periodos": 4,
+            "periodo_actual": 2,
+            "total_de_materias": 12,
+            "total_de_materias_para_aprobacion": 10
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        perfil = PerfilSecundaria.objects.get(usuario=self.usuario)
+        self.assertEqual(perfil.instituto.clave, "colegio abc")
+
+    def test_payload_rechazado_no_crea_catalogos(self):
+        # usuario de colegio pidiendo perfil universitario: 400
+        response = self.client.post(reverse('perfil-universitario'), {
+            "universidad": "Univ Fantasma XYZ",
+            "carrera": "Carrera Fantasma",
+            "total_semestres": 10,
+            "semestre_actual": 1,
+            "creditos_para_graduarse": 160
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Universidad.objects.filter(clave="univ fantasma xyz").exists())
+        self.assertFalse(Carrera.objects.exists())
+
+    def test_borrado_masivo_no_carga_un_catalogo_por_perfil(self):
+        for i in range(5):
+            usuario = Usuario.objects.create(nombre="Luis", email=f"luis{i}@gmail.com", password="x")
+            PerfilSecundaria.objects.create(
+                usuario=usuario, instituto=resolver(Instituto, "Colegio ABC"), curso=resolver(Curso, "9°"),
+                total_de_periodos=4, periodo_actual=1, total_de_materias=10, total_de_materias_para_aprobacion=6,
+            )
+        limpiar_cache()
+        with CaptureQueriesContext(connection) as consultas:
+            PerfilSecundaria.objects.all().delete()
+        catalogos_leidos = [c for c in consultas.captured_queries if 'usuarios_instituto' in c['sql']]
+        self.assertEqual(len(catalogos_leidos), 1)
+
+    def test_nombres_equivalentes_comparten_fila(self):
+        self.assertEqual(resolver(Universidad, "Universidad Nacional").pk, resolver(Universidad, "UNIVERSIDAD  nacional").pk)
+        self.assertEqual(Universidad.objects.count(), 1)
+
+    def test_cache_evita_consultas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            esperado = resolver(Carrera, "Ingeniería")
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver(Carrera, "ingenieria").pk, esperado.pk)
+
+
+class MiddlewarePorRutaTestCase(APITestCase):
+
+    def test_api_no_usa_sesion(self):
+        response = self.client.post(reverse('login'), {"email": "no@gmail.com", "password": "x"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertNotIn('X-Frame-Options', response)
+
+    def test_admin_usa_pila_completa(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_admin_sigue_validando_csrf(self):
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post('/admin/login/', {'username': 'a@gmail.com', 'password': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('medir_middleware', '--requests', '50', stdout=out)
+        self.assertIn('pila por ruta', out.getvalue())
+
+
+class PermisosCacheTestCase(APITestCase):
+
+    def setUp(self):
+        # una caché que ven todos los procesos, como Redis en producción
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio.name,
+        }})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.usuario = Usuario.objects.create(
+            nombre="Juan", apellido="Perez", edad=20, genero="M",
+            email="juan@gmail.com", password="x", is_staff=True
+        )
+        self.grupo = Group.objects.create(name="secretaria")
+        self.ver = Permission.objects.get(codename='view_usuario')
+        self.cambiar = Permission.objects.get(codename='change_usuario')
+        self.grupo.permissions.add(self.ver)
+        self.usuario.groups.add(self.grupo)
+
+    def usuario_nuevo(self):
+        # instancia nueva, como en otro request
+        return Usuario.objects.get(pk=self.usuario.pk)
+
+    def test_permisos_servidos_desde_cache(self):
+        self.assertTrue(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+        usuario = self.usuario_nuevo()
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario.has_perm('usuarios.view_usuario'))
+            self.assertFalse(usuario.has_perm('usuarios.change_usuario'))
+
+    def test_invalida_al_cambiar_permisos_directos(self):
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.user_permissions.add(self.cambiar)
+        self.assertTrue(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+
+    def test_invalida_al_cambiar_grupos(self):
+        self.assertTrue(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grupo.user_set.remove(self.usuario)
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+
+    def test_invalida_al_cambiar_permisos_del_grupo(self):
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grupo.permissions.add(self.cambiar)
+        self.assertTrue(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+
+    def test_invalida_recien_al_confirmar(self):
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+        with self.captureOnCommitCallbacks(execute=False) as pendientes:
+            self.usuario.user_permissions.add(self.cambiar)
+        # sin confirmar, la versión no sube
+        self.assertEqual(len(pendientes), 1)
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.change_usuario'))
+
+    def test_usuario_inactivo_sin_permisos(self):
+        self.assertTrue(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertFalse(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+
+    def test_quitar_superusuario(self):
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_superuser=True)
+        self.assertTrue(self.usuario_nuevo().get_all_permissions() >= {'usuarios.delete_usuario'})
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_superuser=False)
+        usuario = self.usuario_nuevo()
+        self.assertFalse(usuario.has_perm('usuarios.delete_usuario'))
+        self.assertEqual(usuario.get_all_permissions(), {'usuarios.view_usuario'})
+
+    def test_sin_cache_compartida_solo_cachea_en_el_request(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertTrue(self.usuario_nuevo().has_perm('usuarios.view_usuario'))
+            usuario = self.usuario_nuevo()
+            with self.assertNumQueries(2):
+                self.assertTrue(usuario.has_perm('usuarios.view_usuario'))
+            with self.assertNumQueries(0):
+                self.assertFalse(usuario.has_perm('usuarios.change_usuario'))
+
+
+class AdminTestCase(APITestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(email="admin@gmail.com", password="Abc123!@", nombre="Admin")
+        self.client.force_login(self.admin)
+
+    def crear_usuarios(self, cantidad, desde=0):
+        for i in range(desde, desde + cantidad):
+            usuario = Usuario.objects.create(
+                nombre="Juan", apellido="Perez", edad=20, genero="M",
+                email=f"juan{i}@gmail.com", password="x", tipo_estudiante='U'
+            )
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=10, semestre_actual=1, creditos_para_graduarse=160
+            )
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(consultas)
+
+    def test_changelists_no_hacen_consultas_por_fila(self):
+        urls = ['/admin/usuarios/usuario/', '/admin/usuarios/perfiluniversitario/']
+        self.crear_usuarios(3)
+        pocas = [self.contar_consultas(url) for url in urls]
+        self.crear_usuarios(10, desde=3)
+        self.assertEqual([self.contar_consultas(url) for url in urls], pocas)
+
+    def test_accion_desactivar_por_chunks(self):
+        self.crear_usuarios(5)
+        ids = list(Usuario.objects.exclude(pk=self.admin.pk).values_list('pk', flat=True))
+        response = self.client.post('/admin/usuarios/usuario/', {
+            'action': 'desactivar_usuarios',
+            '_selected_action': ids,
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 5)
+
+    def test_sin_alta_de_usuarios_desde_el_admin(self):
+        response = self.client.get('/admin/usuarios/usuario/add/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_paginador_cuenta_exacto_fuera_de_postgres(self):
+        self.crear_usuarios(3)
+        paginador = ConteoEstimadoPaginator(Usuario.objects.all(), 50)
+        self.assertEqual(paginador.count, 4)
+
+
+class EstadoUsuariosTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('estado-usuarios')
+        self.staff = Usuario.objects.create(
+            nombre="Admin", email="admin@gmail.com", password="x", is_staff=True
+        )
+        self.universitario = Usuario.objects.create(
+            nombre="Juan", email="juan@gmail.com", password="x", tipo_estudiante='U'
+        )
+        PerfilUniversitario.objects.create(
+            usuario=self.universitario, universidad=resolver(Universidad, "Universidad Nacional"),
+            carrera=resolver(Carrera, "Ingeniería"),
+            total_semestres=10, semestre_actual=1, creditos_para_graduarse=160
+        )
+        self.sin_tipo = Usuario.objects.create(nombre="Ana", email="ana@gmail.com", password="x")
+        self.client.force_authenticate(self.staff)
+
+    def test_por_ids_en_columnas(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {
+                "ids": [self.sin_tipo.pk, self.universitario.pk, 999999]
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'id': [self.sin_tipo.pk, self.universitario.pk],
+            'email': ["ana@gmail.com", "juan@gmail.com"],
+            'tipo_estudiante': [None, 'U'],
+            'perfil': [None, 'U'],
+            'no_encontrados': [999999],
+        })
+
+    def test_por_emails(self):
+        response = self.client.post(self.url, {"emails": ["juan@gmail.com", "nadie@gmail.com"]}, format='json')
+        self.assertEqual(response.data['id'], [self.universitario.pk])
+        self.assertEqual(response.data['no_encontrados'], ["nadie@gmail.com"])
+
+    def test_ids_y_emails_a_la_vez(self):
+        response = self.client.post(self.url, {"ids": [1], "emails": ["juan@gmail.com"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_solo_staff(self):
+        self.client.force_authenticate(self.universitario)
+        response = self.client.post(self.url, {"ids": [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ArchivarInactivosTestCase(APITestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.archivo = os.path.join(self.directorio.name, 'inactivos.ndjson.gz')
+
+        self.activo = Usuario.objects.create(nombre="Ana", email="ana@gmail.com", password="x")
+        self.grupo = Group.objects.create(name="egresados")
+        self.inactivos = []
+        for i in range(5):
+            usuario = Usuario.objects.create(
+                nombre="Juan", apellido="Perez", edad=20, email=f"juan{i}@gmail.com",
+                password="x", is_active=False, tipo_estudiante='U'
+            )
+            usuario.groups.add(self.grupo)
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=10, semestre_actual=3, creditos_para_graduarse=160
+            )
+            self.inactivos.append(usuario)
+
+    def test_archiva_borra_y_restaura(self):
+        call_command('archivar_inactivos', '--salida', self.archivo, '--chunk', '2', stdout=StringIO())
+
+        self.assertEqual(list(Usuario.objects.values_list('pk', flat=True)), [self.activo.pk])
+        self.assertEqual(PerfilUniversitario.objects.count(), 0)
+        with gzip.open(self.archivo, 'rt') as archivo:
+            self.assertEqual(len(archivo.readlines()), 5)
+
+        call_command('archivar_inactivos', '--restaurar', self.archivo, stdout=StringIO())
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 5)
+        perfil = PerfilUniversitario.objects.get(usuario=self.inactivos[0])
+        self.assertEqual(perfil.universidad.nombre, "Universidad Nacional")
+        self.assertEqual(perfil.semestre_actual, 3)
+        self.assertTrue(self.inactivos[0].groups.filter(pk=self.grupo.pk).exists())
+
+    def test_borrados_registrados_en_bloque(self):
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('archivar_inactivos', '--salida', self.archivo, '--chunk', '2', stdout=StringIO())
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "usuarios_cambio"')]
+        # un insert por modelo y bloque, no uno por fila
+        self.assertEqual(len(inserts), 6)
+        borrados = Cambio.objects.filter(operacion='D')
+        self.assertEqual(
+            sorted(borrados.filter(modelo='usuario').values_list('objeto_id', flat=True)),
+            [usuario.pk for usuario in self.inactivos],
+        )
+        self.assertEqual(borrados.filter(modelo='perfil_universitario').count(), 5)
+
+    def test_corrida_cortada_se_restaura_y_se_puede_continuar(self):
+        borrar = archivo._borrar_bloque
+        llamadas = []
+
+        def borrar_y_cortar(ids, db):
+            # el segundo bloque se escribe pero el proceso muere antes de borrarlo
+            llamadas.append(ids)
+            if len(llamadas) == 2:
+                raise RuntimeError("proceso cortado")
+            borrar(ids, db)
+
+        with mock.patch.object(archivo, '_borrar_bloque', borrar_y_cortar):
+            with self.assertRaises(RuntimeError):
+                call_command('archivar_inactivos', '--salida', self.archivo, '--chunk', '2', stdout=StringIO())
+        # y además quedó a medias el miembro de un tercer bloque
+        with open(self.archivo, 'ab') as crudo:
+            miembro = gzip.compress(b'{"usuario": {"id": 999999}}\n' * 50)
+            crudo.write(miembro[:len(miembro) // 2])
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 3)
+
+        out = StringIO()
+        call_command('archivar_inactivos', '--restaurar', self.archivo, stdout=out)
+        self.assertIn('2 restaurados, 2 ya existían', out.getvalue())
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 5)
+
+        # la siguiente corrida recorta la cola rota y el archivo queda legible entero
+        call_command('archivar_inactivos', '--salida', self.archivo, '--chunk', '2', stdout=StringIO())
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 0)
+        with gzip.open(self.archivo, 'rt') as lectura:
+            self.assertEqual(len(lectura.readlines()), 9)
+        call_command('archivar_inactivos', '--restaurar', self.archivo, stdout=StringIO())
+        self.assertEqual(Usuario.objects.filter(is_active=False).count(), 5)
+
+    def test_restaurar_dos_veces_no_duplica(self):
+        call_command('archivar_inactivos', '--salida', self.archivo, stdout=StringIO())
+        call_command('archivar_inactivos', '--restaurar', self.archivo, stdout=StringIO())
+        out = StringIO()
+        call_command('archivar_inactivos', '--restaurar', self.archivo, stdout=out)
+        self.assertIn('0 restaurados, 5 ya existían', out.getvalue())
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('archivar_inactivos', '--dry-run', '--salida', self.archivo, stdout=out)
+        self.assertIn('5 usuarios inactivos', out.getvalue())
+        self.assertEqual(Usuario.objects.count(), 6)
+        self.assertFalse(os.path.exists(self.archivo))
+
+
+class PerfilMemoriaTestCase(APITestCase):
+
+    def setUp(self):
+        reiniciar_memoria()
+        self.addCleanup(reiniciar_memoria)
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.staff = Usuario.objects.create(nombre="Admin", email="admin@gmail.com", password="x", is_staff=True)
+
+    def test_desactivado_no_entra_en_la_cadena(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            PerfilMemoriaMiddleware(lambda request: None)
+
+    def test_muestrea_por_vista_y_guarda_snapshots(self):
+        config = {'ACTIVO': True, 'MUESTREO': 1.0, 'DIRECTORIO': self.directorio.name}
+        with self.settings(PERFIL_MEMORIA=config):
+            for _ in range(2):
+                self.client.post(reverse('login'), {"email": "no@gmail.com", "password": "x"}, format='json')
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('metricas-memoria'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['login']['muestras'], 2)
+        self.assertGreater(response.data['login']['pico_max_bytes'], 0)
+
+        out = StringIO()
+        call_command('diff_memoria', '--directorio', self.directorio.name, stdout=out)
+        self.assertIn('login (2 snapshots)', out.getvalue())
+
+    def test_rota_los_snapshots_y_conserva_el_primero(self):
+        config = {'ACTIVO': True, 'MUESTREO': 1.0, 'DIRECTORIO': self.directorio.name, 'MAX_SNAPSHOTS': 2}
+        with self.settings(PERFIL_MEMORIA=config):
+            for i in range(4):
+                self.client.post(reverse('login'), {"email": "no@gmail.com", "password": "x"}, format='json')
+                if i == 0:
+                    primero = os.listdir(self.directorio.name)
+        archivos = os.listdir(self.directorio.name)
+        self.assertEqual(len(archivos), 2)
+        self.assertIn(primero[0], archivos)
+
+    def test_no_traza_con_otro_request_en_curso(self):
+        config = {**memoria.configuracion(), 'ACTIVO': True}
+        request = SimpleNamespace(path_info='/otra/', resolver_match=None)
+        with memoria.en_curso():
+            with memoria.en_curso():
+                memoria.trazar(lambda request: None, request, config)
+        self.assertEqual(memoria.obtener_reporte(), {})
+        with memoria.en_curso():
+            memoria.trazar(lambda request: None, request, config)
+        self.assertEqual(memoria.obtener_reporte()['/otra/']['muestras_concurrentes'], 0)
+
+
+class ConsultasLentasTestCase(APITestCase):
+
+    def setUp(self):
+        consultas_lentas.reiniciar()
+        self.addCleanup(consultas_lentas.reiniciar)
+        self.config = {'ACTIVO': True, 'UMBRAL_MS': 0, 'SEGUNDO_PLANO': False}
+
+    def test_huella_agrupa_valores_distintos(self):
+        a = consultas_lentas.huella('SELECT * FROM t WHERE id IN (%s, %s) AND x = 5')
+        b = consultas_lentas.huella('SELECT *  FROM t WHERE id IN (%s, %s, %s) AND x = 7')
+        self.assertEqual(a, b)
+
+    def test_registra_consulta_del_login_con_explain(self):
+        with self.settings(CONSULTAS_LENTAS=self.config):
+            self.client.post(reverse('login'), {"email": "no@gmail.com", "password": "x"}, format='json')
+            self.client.post(reverse('login'), {"email": "otro@gmail.com", "password": "x"}, format='json')
+            consultas_lentas.procesar_pendientes()
+
+        reporte = consultas_lentas.obtener_reporte()
+        login = [h for h in reporte['huellas'] if 'FROM "usuarios_usuario"' in h['sql']]
+        self.assertEqual(len(login), 1)
+        self.assertEqual(login[0]['cantidad'], 2)
+        self.assertEqual(login[0]['vistas'], ['login'])
+        self.assertTrue(login[0]['plan'])
+
+    def test_reporte_solo_staff(self):
+        response = self.client.get(reverse('consultas-lentas'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@unittest.skipUnless(numpy, "reporte_cohortes necesita NumPy")
+class ReporteCohortesTestCase(APITestCase):
+
+    def setUp(self):
+        self.datos = [
+            # (universidad, genero, edad, semestre, total, creditos, para_graduarse)
+            ("Universidad Nacional", "M", 19, 2, 10, 30, 160),
+            ("Universidad Nacional", "M", 22, 6, 10, 90, 160),
+            ("Universidad Nacional", "F", 21, 5, 10, 80, 160),
+            ("Universidad Nacional", "M", 23, 8, 10, 130, 160),
+            ("Universidad Central", "F", None, 1, 8, 0, 0),
+            ("Universidad Central", "F", 30, 4, 8, 60, 120),
+        ]
+        for i, (universidad, genero, edad, semestre, total, creditos, graduarse) in enumerate(self.datos):
+            usuario = Usuario.objects.create(
+                nombre="Juan", email=f"cohorte{i}@gmail.com", password="x",
+                genero=genero, edad=edad, tipo_estudiante='U'
+            )
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, universidad),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=total, semestre_actual=semestre,
+                creditos_para_graduarse=graduarse, creditos_aprobados=creditos
+            )
+        self.addCleanup(limpiar_cache)
+
+    def leer(self, *argumentos):
+        out = StringIO()
+        call_command('reporte_cohortes', *argumentos, stdout=out)
+        return list(csv.DictReader(StringIO(out.getvalue())))
+
+    def test_estadisticas_por_universidad_y_genero(self):
+        # chunk de 4: los grupos se combinan entre bloques
+        filas = self.leer('--por', 'universidad,genero', '--chunk', '4')
+        self.assertEqual(
+            [(f['universidad'], f['genero'], f['cantidad']) for f in filas],
+            [("Universidad Nacional", "Femenino", "1"), ("Universidad Nacional", "Masculino", "3"),
+             ("Universidad Central", "Femenino", "2")],
+        )
+        nacional_m = filas[1]
+        creditos = [30, 90, 130]
+        self.assertAlmostEqual(float(nacional_m['creditos_aprobados_media']), statistics.mean(creditos))
+        self.assertAlmostEqual(float(nacional_m['creditos_aprobados_desviacion']), statistics.pstdev(creditos))
+        self.assertEqual(float(nacional_m['creditos_aprobados_minimo']), 30)
+        self.assertEqual(float(nacional_m['creditos_aprobados_maximo']), 130)
+        self.assertAlmostEqual(float(nacional_m['avance_semestres_media']), statistics.mean([0.2, 0.6, 0.8]))
+
+        # creditos_para_graduarse = 0 no entra en la razón
+        central = filas[2]
+        self.assertEqual(float(central['avance_creditos_media']), 0.5)
+        self.assertEqual(float(central['avance_creditos_desviacion']), 0)
+
+    def test_grupos_de_edad(self):
+        filas = self.leer('--por', 'edad', '--chunk', '2')
+        self.assertEqual(
+            [(f['edad'], f['cantidad']) for f in filas],
+            [("", "1"), ("15-19", "1"), ("20-24", "3"), ("30-34", "1")],
+        )
+
+    def test_dimension_invalida(self):
+        with self.assertRaises(CommandError):
+            call_command('reporte_cohortes', '--tipo', 'secundaria', '--por', 'universidad', stdout=StringIO())
+
+
+class CreditosTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('creditos')
+        self.staff = Usuario.objects.create(
+            nombre="Admin", email="admin@gmail.com", password="x", is_staff=True
+        )
+        self.usuarios = []
+        for i, creditos in enumerate([10, 150, 5]):
+            usuario = Usuario.objects.create(
+                nombre="Juan", email=f"juan{i}@gmail.com", password="x", tipo_estudiante='U'
+            )
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Ingeniería"),
+                total_semestres=10, semestre_actual=1, creditos_para_graduarse=160,
+                creditos_aprobados=creditos
+            )
+            self.usuarios.append(usuario)
+        self.sin_perfil = Usuario.objects.create(nombre="Ana", email="ana@gmail.com", password="x")
+        self.client.force_authenticate(self.staff)
+
+    def creditos(self):
+        return list(PerfilUniversitario.objects.order_by('usuario_id').values_list('creditos_aprobados', flat=True))
+
+    def test_suma_recorta_y_rechaza(self):
+        response = self.client.post(self.url, {"movimientos": [
+            {"usuario": self.usuarios[0].pk, "delta": 20},
+            {"email": "juan1@GMAIL.COM", "delta": 20},
+            {"usuario": self.usuarios[2].pk, "delta": -8},
+            {"usuario": self.sin_perfil.pk, "delta": 5},
+            {"email": "nadie@gmail.com", "delta": 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.creditos(), [30, 160, 0])
+        self.assertEqual(response.data['aplicados'], 3)
+        self.assertEqual(
+            [(r['usuario'], r['aplicado']) for r in response.data['recortados']],
+            [(self.usuarios[1].pk, 10), (self.usuarios[2].pk, -5)],
+        )
+        self.assertEqual(response.data['rechazados'], [
+            {'usuario': self.sin_perfil.pk, 'motivo': "Usuario sin perfil universitario."},
+            {'email': "nadie@gmail.com", 'motivo': "Usuario sin perfil universitario."},
+        ])
+
+    def test_movimientos_del_mismo_usuario_se_suman(self):
+        response = self.client.post(self.url, {"movimientos": [
+            {"usuario": self.usuarios[0].pk, "delta": 5},
+            {"email": "juan0@gmail.com", "delta": 7},
+        ]}, format='json')
+        self.assertEqual(response.data['aplicados'], 1)
+        self.assertEqual(self.creditos()[0], 22)
+
+    def test_una_consulta_por_bloque(self):
+        movimientos = [{"usuario": usuario.pk, "delta": 1} for usuario in self.usuarios]
+        with CaptureQueriesContext(connection) as consultas:
+            sumar_creditos(movimientos, chunk_size=2)
+        updates = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.creditos(), [11, 151, 6])
+
+    def test_usuario_y_email_a_la_vez(self):
+        response = self.client.post(self.url, {"movimientos": [
+            {"usuario": self.usuarios[0].pk, "email": "juan0@gmail.com", "delta": 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_solo_staff(self):
+        self.client.force_authenticate(self.usuarios[0])
+        response = self.client.post(self.url, {"movimientos": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ArranqueTestCase(APITestCase):
+
+    def test_precalentar(self):
+        tiempos = precalentar()
+        self.assertEqual(set(tiempos), {'urls', 'hashers', 'conexiones'})
+        self.assertIsNotNone(connection.connection)
+        self.assertNotIn('conexiones', precalentar(conexiones=False))
+
+    def test_post_worker_init_abre_conexiones_solo_en_workers_sync(self):
+        for clase, conexiones in (('sync', True), ('gthread', False)):
+            worker = SimpleNamespace(cfg=SimpleNamespace(worker_class_str=clase))
+            with mock.patch('usuarios.arranque.precalentar') as precalentar_mock:
+                post_worker_init(worker)
+            precalentar_mock.assert_called_once_with(conexiones=conexiones)
+
+    def test_perfil_arranque(self):
+        out = StringIO()
+        call_command('perfil_arranque', '--objetivo', 'urls', '--top', '5', '--json', stdout=out)
+        reporte = json.loads(out.getvalue())
+        self.assertEqual(len(reporte['por_modulo']), 5)
+        self.assertIn('django', [p['paquete'] for p in reporte['por_paquete']])
+        self.assertGreater(reporte['total_ms'], 0)
+
+
+@override_settings(CAMBIOS={'MARGEN_S': 0})
+class CambiosTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('cambios')
+        self.staff = Usuario.objects.create(
+            nombre="Admin", email="admin@gmail.com", password="x", is_staff=True
+        )
+        self.usuario = Usuario.objects.create(
+            nombre="Juan", email="juan@gmail.com", password="x", tipo_estudiante='U'
+        )
+        self.perfil = PerfilUniversitario.objects.create(
+            usuario=self.usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+            carrera=resolver(Carrera, "Ingeniería"),
+            total_semestres=10, semestre_actual=1, creditos_para_graduarse=160
+        )
+        self.client.force_authenticate(self.staff)
+
+    def leer(self, desde=0, **params):
+        response = self.client.get(self.url, {'desde': desde, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_altas_en_orden_y_sin_password(self):
+        datos = self.leer()
+        self.assertEqual(
+            [(c['modelo'], c['id'], c['operacion']) for c in datos['cambios']],
+            [('usuario', self.staff.pk, 'upsert'), ('usuario', self.usuario.pk, 'upsert'),
+             ('perfil_universitario', self.perfil.pk, 'upsert')],
+        )
+        self.assertNotIn('password', datos['cambios'][0]['datos'])
+        self.assertEqual(datos['cambios'][2]['datos']['universidad'], "Universidad Nacional")
+        self.assertFalse(datos['hay_mas'])
+        self.assertEqual(self.leer(datos['cursor'])['cambios'], [])
+
+    def test_cursor_reanudable_y_borrados(self):
+        cursor = self.leer()['cursor']
+        self.usuario.nombre = "Pedro"
+        self.usuario.save()
+        avanzar_periodo(PerfilUniversitario)
+        staff_id = self.staff.pk
+        self.staff.delete()
+
+        primera = self.leer(cursor, limite=2)
+        self.assertTrue(primera['hay_mas'])
+        self.assertEqual(primera['cambios'][0]['datos']['nombre'], "Pedro")
+        self.assertEqual(primera['cambios'][1]['datos']['semestre_actual'], 2)
+
+        segunda = self.leer(primera['cursor'], limite=2)
+        self.assertEqual(segunda['cambios'], [{
+            'cursor': segunda['cursor'], 'modelo': 'usuario', 'id': staff_id,
+            'operacion': 'borrado', 'datos': None,
+        }])
+
+    def test_cambios_repetidos_se_entregan_una_vez(self):
+        cursor = self.leer()['cursor']
+        for semestre in (2, 3, 4):
+            self.perfil.semestre_actual = semestre
+            self.perfil.save()
+        datos = self.leer(cursor)
+        self.assertEqual(len(datos['cambios']), 1)
+        self.assertEqual(datos['cambios'][0]['datos']['semestre_actual'], 4)
+
+    def test_costo_no_depende_del_tamano_de_la_tabla(self):
+        cursor = self.leer()['cursor']
+        call_command('sembrar_usuarios', '--n', '50', stdout=StringIO())
+        cursor = self.leer(cursor, limite=1000)['cursor']
+        self.usuario.save()
+        # una consulta al feed y una por modelo con cambios
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'desde': cursor})
+
+    def test_cursor_numerico_anterior(self):
+        primero = Cambio.objects.order_by('pk').first()
+        datos = self.leer(primero.pk)
+        self.assertEqual([c['id'] for c in datos['cambios']], [self.usuario.pk, self.perfil.pk])
+        self.assertEqual(self.leer(datos['cursor'])['cambios'], [])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(self.url, {'desde': '1-x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_margen_oculta_cambios_recientes(self):
+        with self.settings(CAMBIOS={'MARGEN_S': 60}):
+            self.assertEqual(self.leer()['cambios'], [])
+
+    def test_compactar_conserva_el_ultimo_cambio(self):
+        self.usuario.save()
+        self.staff.delete()
+        Cambio.objects.update(fecha=timezone.now() - timedelta(days=60))
+        compactar_cambios(30)
+        self.assertEqual(
+            sorted(Cambio.objects.values_list('modelo', 'objeto_id', 'operacion')),
+            [('perfil_universitario', self.perfil.pk, 'U'), ('usuario', self.usuario.pk, 'U')],
+        )
+
+    def test_solo_staff(self):
+        self.client.force_authenticate(self.usuario)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ListadoUsuariosTestCase(APITestCase):
+
+    def setUp(self):
+        coalescencia.reiniciar()
+        self.url = reverse('listado-usuarios')
+        self.staff = Usuario.objects.create(nombre="Admin", email="admin@gmail.com", password="x", is_staff=True)
+        for i in range(5):
+            Usuario.objects.create(nombre="Juan", email=f"juan{i}@gmail.com", password="x",
+                                   tipo_estudiante='U' if i % 2 else 'C')
+        self.client.force_authenticate(self.staff)
+
+    def test_pagina_por_cursor(self):
+        vistos = []
+        desde = 0
+        while True:
+            response = self.client.get(self.url, {'desde': desde, 'limite': 2})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            vistos += [usuario['id'] for usuario in response.data['usuarios']]
+            desde = response.data['cursor']
+            if not response.data['hay_mas']:
+                break
+        self.assertEqual(vistos, sorted(Usuario.objects.values_list('pk', flat=True)))
+
+    def test_filtros(self):
+        response = self.client.get(self.url, {'tipo_estudiante': 'U', 'activo': 'true'})
+        self.assertEqual([u['email'] for u in response.data['usuarios']], ["juan1@gmail.com", "juan3@gmail.com"])
+
+    def test_solo_staff(self):
+        self.client.force_authenticate(Usuario.objects.get(email="juan0@gmail.com"))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+SHARDS_PRUEBA = ['default', 'shard1', 'shard2']
+
+
+@unittest.skipUnless(
+    all(alias in settings.DATABASES for alias in SHARDS_PRUEBA),
+    "Requiere los shards de prueba: --settings=myproject.settings_shards",
+)
+class ShardingTestCase(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.mapa = os.path.join(self.directorio.name, 'shards.json')
+        self.activar(SHARDS_PRUEBA)
+        limpiar_cache()
+        reiniciar_indices()
+        coalescencia.reiniciar()
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def activar(self, aliases):
+        configuracion = override_settings(
+            SHARDING={'ACTIVO': True, 'SHARDS': aliases, 'BUCKETS': 16, 'MAPA': self.mapa},
+            CAMBIOS={'MARGEN_S': 0},
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def registrar(self, email, tipo='U'):
+        response = self.client.post(reverse('registro'), {
+            'nombre': "Juan", 'apellido': "Perez", 'edad': 20, 'genero': 'M', 'email': email,
+            'password': "Abc123!@", 'password_confirm': "Abc123!@",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.client.post(reverse('tipo-estudiante'), {'tipo_estudiante': tipo}, format='json')
+        return Usuario.objects.get(email=email)
+
+    def donde_esta(self, usuario_id):
+        return [alias for alias in SHARDS_PRUEBA if Usuario.objects.using(alias).filter(pk=usuario_id).exists()]
+
+    def test_registro_va_al_shard_del_email(self):
+        emails = [f"estudiante{i}@gmail.com" for i in range(12)]
+        for email in emails:
+            usuario = self.registrar(email)
+            self.assertEqual(self.donde_esta(usuario.pk), [sharding.shard_de_email(email)])
+            self.assertEqual(sharding.bucket_de_id(usuario.pk), sharding.bucket_de_email(email))
+        # con 12 emails y 3 shards todos reciben alguno
+        self.assertEqual({sharding.shard_de_email(email) for email in emails}, set(SHARDS_PRUEBA))
+
+    def test_login_jwt_y_perfil_en_el_mismo_shard(self):
+        usuario = self.registrar("ana@gmail.com", tipo='C')
+        alias = sharding.shard_de_email("ana@gmail.com")
+        with self.assertRaises(Usuario.DoesNotExist):
+            Usuario.objects.using('default' if alias != 'default' else 'shard1').get(email="ana@gmail.com")
+
+        self.client.credentials()
+        response = self.client.post(reverse('login'), {'email': "ana@gmail.com", 'password': "Abc123!@"},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        response = self.client.post(reverse('perfil-secundaria'), {
+            'nombre_instituto': "Colegio ABC", 'curso_actual': "9°", 'total_de_periodos': 4,
+            'periodo_actual': 2, 'total_de_materias': 10, 'total_de_materias_para_aprobacion': 6,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        perfil = PerfilSecundaria.objects.using(alias).get(usuario_id=usuario.pk)
+        self.assertEqual(perfil.instituto.nombre, "Colegio ABC")
+        # el catálogo está en todos los shards con el mismo id
+        for otro in SHARDS_PRUEBA:
+            self.assertTrue(Instituto.objects.using(otro).filter(pk=perfil.instituto_id).exists())
+        self.assertEqual(Cambio.objects.using(alias).filter(modelo='perfil_secundaria').count(), 1)
+        self.assertEqual(sugerir('instituto', "cole"), ["Colegio ABC"])
+
+    def test_email_repetido_en_otro_shard(self):
+        self.registrar("ana@gmail.com")
+        self.client.credentials()
+        response = self.client.post(reverse('registro'), {
+            'nombre': "Ana", 'apellido': "Lopez", 'edad': 20, 'genero': 'F', 'email': "ana@gmail.com",
+            'password': "Abc123!@", 'password_confirm': "Abc123!@",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_respaldo_encuentra_usuarios_fuera_de_su_shard(self):
+        # como un usuario anterior al sharding: su id no dice dónde está
+        Usuario.objects.using('shard2').create(pk=1, nombre="Viejo", email="viejo@gmail.com", password="x")
+        self.assertEqual(sharding.shard_de_id(1), 'shard1')
+        self.assertEqual(Usuario.objects.get(pk=1).email, "viejo@gmail.com")
+        self.assertEqual(Usuario.objects.get(email="viejo@gmail.com").pk, 1)
+        self.assertEqual(Usuario.objects.get(nombre="Viejo").pk, 1)
+        self.assertTrue(Usuario.objects.existe_email("viejo@gmail.com"))
+
+    def test_rehash_escribe_en_el_shard_del_usuario(self):
+        hash_viejo = PBKDF2PasswordHasher().encode("Abc123!@", "saltsaltsalt", 110_000)
+        email = next(f"estudiante{i}@gmail.com" for i in range(20)
+                     if sharding.shard_de_email(f"estudiante{i}@gmail.com") != 'default')
+        usuario = Usuario.objects.create(nombre="Juan", email=email, password=hash_viejo)
+        self.assertNotEqual(usuario._state.db, 'default')
+        with self.settings(REHASH_EN_SEGUNDO_PLANO=False):
+            response = self.client.post(reverse('login'), {'email': email, 'password': "Abc123!@"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(Usuario.objects.using(usuario._state.db).get(pk=usuario.pk).password, hash_viejo)
+
+    def test_listado_y_estado_mezclan_shards(self):
+        ids = [self.registrar(f"estudiante{i}@gmail.com").pk for i in range(7)]
+        staff = Usuario.objects.create(nombre="Admin", email="admin@gmail.com", password="x", is_staff=True)
+        self.client.credentials()
+        self.client.force_authenticate(staff)
+
+        vistos = []
+        desde = 0
+        while True:
+            datos = self.client.get(reverse('listado-usuarios'), {'desde': desde, 'limite': 3}).data
+            vistos += [usuario['id'] for usuario in datos['usuarios']]
+            desde = datos['cursor']
+            if not datos['hay_mas']:
+                break
+        self.assertEqual(vistos, sorted(ids + [staff.pk]))
+
+        response = self.client.post(reverse('estado-usuarios'), {'ids': ids + [999999]}, format='json')
+        self.assertEqual(response.data['id'], ids)
+        self.assertEqual(response.data['no_encontrados'], [999999])
+
+    def test_creditos_por_shard(self):
+        usuarios = [self.registrar(f"estudiante{i}@gmail.com") for i in range(6)]
+        for usuario in usuarios:
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Medicina"), total_semestres=10, semestre_actual=1,
+                creditos_para_graduarse=160,
+            )
+        resultado = sumar_creditos(
+            [{'usuario': usuario.pk, 'delta': 10} for usuario in usuarios] + [{'email': "nadie@gmail.com", 'delta': 1}]
+        )
+        self.assertEqual(resultado['aplicados'], 6)
+        self.assertEqual(len(resultado['rechazados']), 1)
+        for usuario in usuarios:
+            usuario = Usuario.objects.get(pk=usuario.pk)
+            self.assertEqual(usuario.perfil_universitario.creditos_aprobados, 10)
+
+    def test_rebalancear(self):
+        # todo empieza en default y se reparte entre los tres
+        self.activar(['default'])
+        usuarios = [self.registrar(f"estudiante{i}@gmail.com") for i in range(9)]
+        for usuario in usuarios:
+            PerfilUniversitario.objects.create(
+                usuario=usuario, universidad=resolver(Universidad, "Universidad Nacional"),
+                carrera=resolver(Carrera, "Medicina"), total_semestres=10, semestre_actual=1,
+                creditos_para_graduarse=160,
+            )
+        self.assertEqual({alias for u in usuarios for alias in self.donde_esta(u.pk)}, {'default'})
+
+        salida = StringIO()
+        call_command('rebalancear_shards', '--hacia', ','.join(SHARDS_PRUEBA), '--dry-run', stdout=salida)
+        self.assertEqual({alias for u in usuarios for alias in self.donde_esta(u.pk)}, {'default'})
+        self.assertFalse(os.path.exists(self.mapa))
+
+        ids_perfiles = {u.pk: u.perfil_universitario.pk for u in usuarios}
+        call_command('rebalancear_shards', '--hacia', ','.join(SHARDS_PRUEBA), stdout=StringIO())
+        self.assertEqual(sharding.shards(), SHARDS_PRUEBA)
+        for usuario in usuarios:
+            alias = sharding.shard_de_id(usuario.pk)
+            self.assertEqual(self.donde_esta(usuario.pk), [alias])
+            perfil = Usuario.objects.get(email=usuario.email).perfil_universitario
+            self.assertEqual(perfil._state.db, alias)
+            # los ids de perfil son globales: el perfil movido conserva el suyo
+            self.assertEqual(perfil.pk, ids_perfiles[usuario.pk])
+            if alias != 'default':
+                self.assertTrue(Cambio.objects.using(alias).filter(modelo='usuario', objeto_id=usuario.pk).exists())
+                movidos = Cambio.objects.using('default').filter(operacion='M')
+                self.assertTrue(movidos.filter(modelo='usuario', objeto_id=usuario.pk).exists())
+                self.assertTrue(movidos.filter(modelo='perfil_universitario', objeto_id=perfil.pk).exists())
+        feed = obtener_cambios(limite=100, shard='default')['cambios']
+        self.assertNotIn('borrado', {cambio['operacion'] for cambio in feed})
+        self.assertIn('movido', {cambio['operacion'] for cambio in feed})
+        self.assertEqual(sum(PerfilUniversitario.objects.using(a).count() for a in SHARDS_PRUEBA), 9)
+
+        # repetirlo no mueve nada
+        salida = StringIO()
+        call_command('rebalancear_shards', '--hacia', ','.join(SHARDS_PRUEBA), stdout=salida)
+        self.assertIn("0 usuarios movidos", salida.getvalue())
+
+    def test_rebalancear_pisa_la_copia_de_una_corrida_cortada(self):
+        self.activar(['default'])
+        usuario = next(
+            u for u in (self.registrar(f"estudiante{i}@gmail.com") for i in range(20))
+            if sharding.shard_de_bucket(sharding.bucket_de_id(u.pk), SHARDS_PRUEBA) != 'default'
+        )
+        destino = sharding.shard_de_bucket(sharding.bucket_de_id(usuario.pk), SHARDS_PRUEBA)
+        # la corrida anterior copió y se cortó antes de borrar del origen; después el usuario cambió de nombre
+        Usuario.objects.using(destino).create(pk=usuario.pk, nombre="Viejo", email=usuario.email, password="x")
+        Usuario.objects.using('default').filter(pk=usuario.pk).update(nombre="Nuevo")
+
+        call_command('rebalancear_shards', '--hacia', ','.join(SHARDS_PRUEBA), stdout=StringIO())
+        self.assertEqual(self.donde_esta(usuario.pk), [destino])
+        self.assertEqual(Usuario.objects.using(destino).get(pk=usuario.pk).nombre, "Nuevo")
+
+    def test_acciones_del_admin_escriben_en_el_shard(self):
+        usuario = Usuario.objects.using('shard2').create(nombre="Juan", email="juan@gmail.com", password="x")
+        actualizar_por_chunks(Usuario.objects.using('shard2').filter(pk=usuario.pk), is_active=False)
+        self.assertFalse(Usuario.objects.using('shard2').get(pk=usuario.pk).is_active)
+        self.assertTrue(Cambio.objects.using('shard2').filter(modelo='usuario', objeto_id=usuario.pk).exists())
+        self.assertFalse(Cambio.objects.using('default').filter(modelo='usuario', objeto_id=usuario.pk).exists())
+
+    def test_no_saca_un_shard_con_usuarios_con_grupos(self):
+        usuario = Usuario.objects.using('shard2').create(nombre="Admin", email="admin@gmail.com", password="x")
+        grupo = Group.objects.using('shard2').create(name="secretaria")
+        Usuario.groups.through.objects.using('shard2').create(usuario_id=usuario.pk, group_id=grupo.pk)
+
+        with self.assertRaises(CommandError):
+            call_command('rebalancear_shards', '--hacia', 'default,shard1', stdout=StringIO())
+        self.assertEqual(sharding.shards(), SHARDS_PRUEBA)
+        self.assertEqual(self.donde_esta(usuario.pk), ['shard2'])
+
+    def test_otros_procesos_releen_el_mapa(self):
+        self.assertEqual(sharding.shards(), SHARDS_PRUEBA)
+        # como si otro proceso hubiera corrido rebalancear_shards
+        with open(self.mapa, 'w') as archivo:
+            json.dump({'shards': ['default']}, archivo)
+        with mock.patch.object(sharding, 'REVISAR_MAPA_S', 0):
+            self.assertEqual(sharding.shards(), ['default'])
+
+    def test_rebalancear_requiere_aliases_definidos(self):
+        with self.assertRaises(CommandError):
+            call_command('rebalancear_shards', '--hacia', 'default,shard9', stdout=StringIO())
+
+
+class CoalescenciaTestCase(APITestCase):
+
+    def setUp(self):
+        coalescencia.reiniciar()
+
+    def test_hilos_comparten_un_calculo(self):
+        vuelo = coalescencia.SingleFlight('prueba-hilos')
+        llamadas = []
+        barrera = threading.Barrier(8)
+        resultados = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return {'total': 42}
+
+        def pedir():
+            barrera.wait()
+            resultados.append(vuelo.hacer('clave', calcular))
+
+        hilos = [threading.Thread(target=pedir) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [{'total': 42}] * 8)
+        metricas = coalescencia.obtener_metricas()['prueba-hilos']
+        self.assertEqual((metricas['calculos'], metricas['coalescidos']), (1, 7))
+
+    def test_error_llega_a_todos_y_no_queda_pegado(self):
+        vuelo = coalescencia.SingleFlight('prueba-errores')
+        barrera = threading.Barrier(4)
+        errores = []
+
+        def fallar():
+            time.sleep(0.1)
+            raise ValueError("sin datos")
+
+        def pedir():
+            barrera.wait()
+            try:
+                vuelo.hacer('clave', fallar)
+            except ValueError as error:
+                errores.append(error)
+
+        hilos = [threading.Thread(target=pedir) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(errores), 4)
+        self.assertEqual(coalescencia.obtener_metricas()['prueba-errores']['errores'], 1)
+        # la siguiente llamada vuelve a calcular
+        self.assertEqual(vuelo.hacer('clave', lambda: 'ok'), 'ok')
+
+    def test_asyncio_comparte_un_calculo(self):
+        vuelo = coalescencia.SingleFlight('prueba-async')
+        llamadas = []
+
+        async def calcular():
+            llamadas.append(1)
+            await asyncio.sleep(0.05)
+            return 'listo'
+
+        async def principal():
+            return await asyncio.gather(*[vuelo.ahacer('clave', calcular) for _ in range(20)])
+
+        self.assertEqual(asyncio.run(principal()), ['listo'] * 20)
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(coalescencia.obtener_metricas()['prueba-async']['coalescidos'], 19)
+
+    def test_asyncio_cancelar_al_lider_no_cancela_a_los_demas(self):
+        vuelo = coalescencia.SingleFlight('prueba-async-cancelado')
+
+        async def calcular():
+            await asyncio.sleep(0.05)
+            return 'listo'
+
+        async def principal():
+            lider = asyncio.ensure_future(vuelo.ahacer('clave', calcular))
+            await asyncio.sleep(0)
+            seguidores = [asyncio.ensure_future(vuelo.ahacer('clave', calcular)) for _ in range(3)]
+            await asyncio.sleep(0)
+            # el cliente del primero se desconecta
+            lider.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await lider
+            return await asyncio.gather(*seguidores)
+
+        self.assertEqual(asyncio.run(principal()), ['listo'] * 3)
+        metricas = coalescencia.obtener_metricas()['prueba-async-cancelado']
+        self.assertEqual((metricas['calculos'], metricas['coalescidos']), (1, 3))
+
+    def test_stale_while_revalidate(self):
+        cache = coalescencia.CacheCorta('prueba-swr', ttl=0.3, obsoleto=5)
+        valores = iter([1, 2])
+        self.assertEqual(cache.obtener('clave', lambda: next(valores)), 1)
+        self.assertEqual(cache.obtener('clave', lambda: next(valores)), 1)
+        time.sleep(0.35)
+        # vencido pero dentro de la ventana: responde el viejo y renueva en segundo plano
+        self.assertEqual(cache.obtener('clave', lambda: next(valores)), 1)
+        limite = time.monotonic() + 2
+        while cache._buscar('clave') != (2, 'vigente') and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertEqual(cache.obtener('clave', lambda: next(valores)), 2)
+        metricas = coalescencia.obtener_metricas()['prueba-swr']
+        self.assertEqual((metricas['calculos'], metricas['aciertos'], metricas['obsoletos']), (2, 2, 1))
+
+    def test_asyncio_stale_while_revalidate(self):
+        cache = coalescencia.CacheCorta('prueba-swr-async', ttl=0.3, obsoleto=5)
+        valores = iter([1, 2])
+
+        async def calcular():
+            return next(valores)
+
+        async def principal():
+            primero = await cache.aobtener('clave', calcular)
+            await asyncio.sleep(0.35)
+            obsoleto = await cache.aobtener('clave', calcular)
+            # deja correr la renovación
+            await asyncio.sleep(0.01)
+            return primero, obsoleto, await cache.aobtener('clave', calcular)
+
+        self.assertEqual(asyncio.run(principal()), (1, 1, 2))
+
+    @override_settings(COALESCENCIA={'TTL_S': 60, 'OBSOLETO_S': 0})
+    def test_vista_responde_desde_la_cache(self):
+        staff = Usuario.objects.create(nombre="Admin", email="admin@gmail.com", password="x", is_staff=True)
+        self.client.force_authenticate(staff)
+        url = reverse('listado-usuarios')
+        primera = self.client.get(url, {'limite': 5})
+        Usuario.objects.create(nombre="Juan", email="juan@gmail.com", password="x")
+        with self.assertNumQueries(0):
+            segunda = self.client.get(url, {'limite': 5})
+        self.assertEqual(segunda.data, primera.data)
+        # otra query string es otra clave
+        self.assertEqual(len(self.client.get(url, {'limite': 6}).data['usuarios']), 2)
+        # los errores no se cachean
+        self.assertEqual(self.client.get(url, {'limite': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'limite': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        metricas = self.client.get(reverse('metricas-coalescencia')).data['listado-usuarios']
+        self.assertEqual((metricas['calculos'], metricas['aciertos']), (4, 1))
+
+    @override_settings(COALESCENCIA={'ACTIVO': False})
+    def test_desactivado(self):
+        staff = Usuario.objects.create(nombre="Admin", email="admin@gmail.com", password="x", is_staff=True)
+        self.client.force_authenticate(staff)
+        self.client.get(reverse('listado-usuarios'))
+        Usuario.objects.create(nombre="Juan", email="juan@gmail.com", password="x")
+        self.assertEqual(len(self.client.get(reverse('listado-usuarios')).data['usuarios']), 2)
+
+
+class ConflictosDeEscrituraTestCase(APITestCase):
+
+    def setUp(self):
+        limpiar_cache()
+        self.addCleanup(limpiar_cache)
+        self.usuario = Usuario.objects.create(
+            nombre="Juan", apellido="Perez", edad=20, genero="M",
+            email="juan@gmail.com", password="x", tipo_estudiante='U'
+        )
+        self.client.force_authenticate(self.usuario)
+        self.perfil = {
+            "universidad": "Universidad Nacional",
+            "carrera": "Ingeniería",
+            "total_semestres": 10,
+            "semestre_actual": 5,
+            "creditos_para_graduarse": 160
+        }
+
+    def test_perfil_universitario_exitoso(self):
+        response = self.client.post(reverse('perfil-universitario'), self.perfil, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(PerfilUniversitario.objects.filter(usuario=self.usuario).exists())
+
+    def test_perfil_universitario_repetido_es_409(self):
+        self.client.post(reverse('perfil-universitario'), self.perfil, format='json')
+        response = self.client.post(reverse('perfil-universitario'), self.perfil, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(PerfilUniversitario.objects.filter(usuario=self.usuario).count(), 1)
+
+    def test_perfil_secundaria_repetido_es_409(self):
+        Usuario.objects.filter(pk=self.usuario.pk).update(tipo_estudiante='C')
+        self.usuario.tipo_estudiante = 'C'
+        datos = {
+            "nombre_instituto": "Colegio ABC",
+            "curso_actual": "11°",
+            "total_de_periodos": 4,
+            "periodo_actual": 2,
+            "total_de_materias": 12,
+            "total_de_materias_para_aprobacion": 10
+        }
+        self.assertEqual(
+            self.client.post(reverse('perfil-secundaria'), datos, format='json').status_code,
+            status.HTTP_201_CREATED
+        )
+        response = self.client.post(reverse('perfil-secundaria'), datos, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "solo SQLite tiene BD en memoria")
+    def test_estres_requiere_bd_compartida(self):
+        if not connection.is_in_memory_db():
+            self.skipTest("la BD de pruebas no está en memoria")
+        with self.assertRaises(CommandError):
+            call_command('estres_escrituras', stdout=StringIO())
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', "necesita una BD compartida entre procesos (Postgres)")
+class EstresEscriturasTestCase(TransactionTestCase):
+
+    def test_choques_sin_5xx_ni_duplicados(self):
+        resultado = estresar(procesos=4, emails=10)
+        self.assertEqual(resultado['violaciones'], [])
+        self.assertEqual(resultado['registro']['estados'], {201: 10, 400: 30})
+        self.assertEqual(resultado['perfil']['estados'], {201: 10, 409: 30})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "el orden por transacción es de Postgres")
+class CambiosTransaccionLargaTestCase(TransactionTestCase):
+
+    def test_transaccion_lenta_no_queda_detras_del_cursor(self):
+        insertado = threading.Event()
+        confirmar = threading.Event()
+
+        def lenta():
+            with transaction.atomic():
+                cambios.registrar(Usuario, [1], operacion='D')
+                insertado.set()
+                confirmar.wait(10)
+            connection.close()
+
+        hilo = threading.Thread(target=lenta)
+        hilo.start()
+        insertado.wait(10)
+        # confirma antes que la transacción lenta aunque su id es mayor
+        cambios.registrar(Usuario, [2], operacion='D')
+        primera = obtener_cambios()
+        self.assertEqual(primera['cambios'], [])
+
+        confirmar.set()
+        hilo.join()
+        # el cursor no avanzó: la lenta se entrega ahora, antes que la rápida
+        ids = [cambio['id'] for cambio in obtener_cambios(primera['cursor'])['cambios']]
+        self.assertEqual(ids, [1, 2])
@@ -1,12 +1,23 @@
 # urls.py
 from django.urls import path
-from .views import RegistroView, LoginView ,TipoEstudianteView, PerfilUniversitarioView ,PerfilSecundariaView
+from .views import RegistroView, LoginView ,TipoEstudianteView, PerfilUniversitarioView ,PerfilSecundariaView, \
+    MetricasHashersView, AutocompletarView, EstadoUsuariosView, MetricasMemoriaView, \
+    ConsultasLentasView, CreditosView, CambiosView, ListadoUsuariosView, MetricasCoalescenciaView
 urlpatterns = [
     path('registro/', RegistroView.as_view(), name='registro'),
     path('login/', LoginView.as_view(), name='login'),
     path('tipo-estudiante/', TipoEstudianteView.as_view(), name='tipo-estudiante'),
     path('perfil-universitario/', PerfilUniversitarioView.as_view(), name='perfil-universitario'),
+    path('perfil-universitario/creditos/', CreditosView.as_view(), name='creditos'),
     path('perfil-secundaria/', PerfilSecundariaView.as_view(), name='perfil-secundaria'),  # ← aquí
+    path('metricas/hashers/', MetricasHashersView.as_view(), name='metricas-hashers'),
+    path('metricas/memoria/', MetricasMemoriaView.as_view(), name='metricas-memoria'),
+    path('metricas/coalescencia/', MetricasCoalescenciaView.as_view(), name='metricas-coalescencia'),
+    path('metricas/consultas-lentas/', ConsultasLentasView.as_view(), name='consultas-lentas'),
+    path('autocompletar/', AutocompletarView.as_view(), name='autocompletar'),
+    path('usuarios/', ListadoUsuariosView.as_view(), name='listado-usuarios'),
+    path('usuarios/estado/', EstadoUsuariosView.as_view(), name='estado-usuarios'),
+    path('cambios/', CambiosView.as_view(), name='cambios'),
 ]
 
 
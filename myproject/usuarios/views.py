@@ -2,19 +2,36 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny # para dar persimo para que se logue el que quiera
-from .serializers import (RegistroUsuarioSerializer, LoginSerializer, TipoEstudianteSerializer, PerfilUniversitario,\
-    PerfilUniversitarioSerializer , PerfilSecundariaSerializer)
+from .serializers import (EMAIL_REGISTRADO, RegistroUsuarioSerializer, LoginSerializer, TipoEstudianteSerializer, PerfilUniversitario,\
+    PerfilUniversitarioSerializer , PerfilSecundariaSerializer, AutocompletarSerializer, \
+    EstadoUsuariosSerializer, CreditosSerializer, CambiosSerializer, ListadoUsuariosSerializer)
 from rest_framework_simplejwt.tokens import RefreshToken # genera los tokens JWT
 from django.contrib.auth.hashers import check_password #compara la contraseña que llega con el hash guardado en la BD
-from .models import Usuario
-from rest_framework.permissions import AllowAny, IsAuthenticated # es el qeu valida el toquen
+from .models import Usuario, PerfilSecundaria
+from django.db import IntegrityError
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser # es el qeu valida el toquen
+from .hashers import programar_rehash, obtener_metricas
+from .autocompletado import sugerir
+from .estado import estado_usuarios
+from .creditos import sumar_creditos
+from .cambios import obtener_cambios
+from .listado import listar_usuarios
+from .memoria import obtener_reporte
+from . import consultas_lentas
+from . import coalescencia
 class RegistroView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
         serializer = RegistroUsuarioSerializer(data=request.data)
         if serializer.is_valid():
-            usuario = serializer.save()  # guarda y retorna el usuario
+            try:
+                usuario = serializer.save()  # guarda y retorna el usuario
+            except IntegrityError:
+                # el índice único de email decide entre dos registros simultáneos
+                if not Usuario.objects.existe_email(serializer.validated_data['email']):
+                    raise
+                return Response({'email': [EMAIL_REGISTRADO]}, status=status.HTTP_400_BAD_REQUEST)
             refresh = RefreshToken.for_user(usuario)  # genera los tokens
             return Response({
                 "mensaje": "Usuario registrado exitosamente",
@@ -44,7 +61,9 @@ class LoginView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
 
-            if not check_password(password, usuario.password):
+            # si el hash quedó con parámetros viejos se rehashea en segundo plano
+            if not check_password(password, usuario.password,
+                                  setter=lambda raw: programar_rehash(usuario, raw)):
                 return Response(
                     {"error": "Credenciales inválidas"},
                     status=status.HTTP_401_UNAUTHORIZED
@@ -58,6 +77,34 @@ class LoginView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# metricas de tiempo de hashing (solo staff)
+class MetricasHashersView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(obtener_metricas(), status=status.HTTP_200_OK)
+
+# perfil de memoria por vista (solo staff)
+class MetricasMemoriaView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(obtener_reporte(), status=status.HTTP_200_OK)
+
+# consultas lentas agrupadas por huella (solo staff)
+class ConsultasLentasView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(consultas_lentas.obtener_reporte(), status=status.HTTP_200_OK)
+
+# cálculos coalescidos y caché corta por vista (solo staff)
+class MetricasCoalescenciaView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(coalescencia.obtener_metricas(), status=status.HTTP_200_OK)
+
 # validacionde tipo de estudiente
 
 class TipoEstudianteView(APIView):
@@ -89,7 +136,17 @@ class PerfilUniversitarioView(APIView):
             context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save(usuario=request.user)
+            except IntegrityError:
+                # el índice único de usuario decide entre dos altas simultáneas
+                if not PerfilUniversitario.objects.using(request.user._state.db).filter(
+                        usuario=request.user).exists():
+                    raise
+                return Response(
+                    {"error": "Este usuario ya tiene perfil universitario."},
+                    status=status.HTTP_409_CONFLICT
+                )
             return Response(
                 {"mensaje": "Perfil universitario creado exitosamente"},
                 status=status.HTTP_201_CREATED
@@ -106,9 +163,78 @@ class PerfilSecundariaView(APIView):
             context={'request': request}
         )
         if serializer.is_valid():
-            serializer.save(usuario=request.user)
+            try:
+                serializer.save(usuario=request.user)
+            except IntegrityError:
+                if not PerfilSecundaria.objects.using(request.user._state.db).filter(
+                        usuario=request.user).exists():
+                    raise
+                return Response(
+                    {"error": "Este usuario ya tiene perfil de secundaria."},
+                    status=status.HTTP_409_CONFLICT
+                )
             return Response(
                 {"mensaje": "Perfil de secundaria creado exitosamente"},
                 status=status.HTTP_201_CREATED
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# sugerencias de universidad, carrera e instituto desde el indice en memoria
+class AutocompletarView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = AutocompletarSerializer(data=request.query_params)
+        if serializer.is_valid():
+            datos = serializer.validated_data
+            return Response(
+                {"sugerencias": sugerir(datos['campo'], datos['q'], datos['limite'])},
+                status=status.HTTP_200_OK
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# estado de muchos usuarios en una sola llamada (solo staff)
+class EstadoUsuariosView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = EstadoUsuariosSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(estado_usuarios(**serializer.validated_data), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# suma créditos aprobados a muchos perfiles en una transacción (staff)
+class CreditosView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = CreditosSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(sumar_creditos(serializer.validated_data['movimientos']), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# feed de cambios para sincronizar sistemas externos (staff)
+class CambiosView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = CambiosSerializer(data=request.query_params)
+        if serializer.is_valid():
+            return Response(obtener_cambios(**serializer.validated_data), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# listado paginado de usuarios de todos los shards (staff)
+class ListadoUsuariosView(APIView):
+    permission_classes = [IsAdminUser]
+
+    # varias pantallas de staff piden la misma página a la vez y cada una consulta todos los shards
+    @coalescencia.coalescer('listado-usuarios')
+    def get(self, request):
+        serializer = ListadoUsuariosSerializer(data=request.query_params)
+        if serializer.is_valid():
+            return Response(listar_usuarios(**serializer.validated_data), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)